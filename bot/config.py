@@ -27,4 +27,83 @@ MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "minioadmin")
 MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "minioadmin")
 MINIO_BUCKET     = os.getenv("MINIO_BUCKET", "docs")
 MINIO_SECURE     = os.getenv("MINIO_SECURE", "false").lower() in ("1","true","yes","on")
-PRESIGN_TTL_MIN = int(os.getenv("PRESIGN_TTL_MIN", "60"))
\ No newline at end of file
+PRESIGN_TTL_MIN = int(os.getenv("PRESIGN_TTL_MIN", "60"))
+
+# Общий дедлайн (сек) на сбор секций админ-панели и системной статистики
+STATS_DEADLINE_SEC = float(os.getenv("STATS_DEADLINE_SEC", "3"))
+
+# Размер пачки для автоматической архивации (каждая пачка — отдельная транзакция)
+AUTO_ARCHIVE_BATCH_SIZE = int(os.getenv("AUTO_ARCHIVE_BATCH_SIZE", "1000"))
+
+# Секционирование approval_history: сколько месяцев вперёд держать готовые секции
+HISTORY_PARTITIONS_AHEAD = int(os.getenv("HISTORY_PARTITIONS_AHEAD", "3"))
+# Сколько месяцев истории хранить в таблице (0 — хранить всё)
+HISTORY_RETENTION_MONTHS = int(os.getenv("HISTORY_RETENTION_MONTHS", "0"))
+# Удалять отсоединённые секции (иначе остаются отдельными таблицами для выгрузки)
+HISTORY_DROP_DETACHED = os.getenv("HISTORY_DROP_DETACHED", "false").lower() in ("1","true","yes","on")
+
+# Реплики PostgreSQL для тяжёлых чтений (статистика, глобальный поиск),
+# через запятую; пусто — все запросы идут в основную базу
+DATABASE_REPLICA_URLS = [u.strip() for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if u.strip()]
+# Допустимое отставание реплики (сек); при большем чтение уходит в основную базу.
+# Пользователю реплики нужна роль pg_monitor (статус потока WAL), иначе она считается недоступной
+REPLICA_MAX_LAG_SEC = float(os.getenv("REPLICA_MAX_LAG_SEC", "5"))
+# Как часто перепроверять отставание реплики (сек)
+REPLICA_LAG_CHECK_SEC = float(os.getenv("REPLICA_LAG_CHECK_SEC", "10"))
+
+# Применять недостающие миграции схемы при запуске (иначе — только проверка версии)
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "true").lower() in ("1","true","yes","on")
+# Сколько соединений с базой открыть заранее при запуске
+DB_WARM_CONNECTIONS = int(os.getenv("DB_WARM_CONNECTIONS", "2"))
+
+# Границы кэша в памяти процесса: число записей и примерный объём (МБ);
+# при превышении вытесняются давно не использованные записи (LRU)
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+CACHE_MAX_MB = int(os.getenv("CACHE_MAX_MB", "64"))
+# Хранилище кэша: memory — в процессе; redis — общий для всех экземпляров;
+# near — локальная копия горячих ключей (CACHE_NEAR_TTL сек) поверх redis
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").lower()
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+# Префикс ключей в общем Redis (разделяет несколько ботов на одном сервере)
+CACHE_NAMESPACE = os.getenv("CACHE_NAMESPACE", "docubot:")
+CACHE_NEAR_TTL = float(os.getenv("CACHE_NEAR_TTL", "5"))
+# Рассылать сбросы кэша другим экземплярам бота через LISTEN/NOTIFY базы
+# (нужно, если экземпляров несколько); раз в CACHE_COHERENCE_CHECK_SEC сек
+# без сообщений номер последнего сброса сверяется с базой
+CACHE_COHERENCE = os.getenv("CACHE_COHERENCE", "false").lower() in ("1","true","yes","on")
+CACHE_COHERENCE_CHECK_SEC = float(os.getenv("CACHE_COHERENCE_CHECK_SEC", "30"))
+# TTL статистики в кэше (сек): записи сбрасываются событиями об изменениях,
+# TTL нужен лишь для данных, зависящих от времени («за 30 дней»)
+STATS_CACHE_TTL = int(os.getenv("STATS_CACHE_TTL", "3600"))
+# Раз в сколько секунд писать в лог статистику кэша по пространствам имён (0 — не писать)
+CACHE_STATS_LOG_SEC = float(os.getenv("CACHE_STATS_LOG_SEC", "0"))
+# Stale-while-revalidate статистики: сколько секунд после TTL отдавать
+# устаревшее значение, пока оно пересчитывается в фоне
+STATS_STALE_TTL = int(os.getenv("STATS_STALE_TTL", "600"))
+# TTL статистики, зависящей от текущего времени (просрочки, дедлайны)
+STATS_TIME_TTL = int(os.getenv("STATS_TIME_TTL", "300"))
+# Планировщик обновления: раз в CACHE_REFRESH_INTERVAL сек пересчитывает
+# ключи, которым осталось меньше CACHE_REFRESH_AHEAD сек, если к ним
+# обращались за последние CACHE_HOT_SEC сек
+CACHE_REFRESH_INTERVAL = float(os.getenv("CACHE_REFRESH_INTERVAL", "30"))
+CACHE_REFRESH_AHEAD = float(os.getenv("CACHE_REFRESH_AHEAD", "60"))
+CACHE_HOT_SEC = float(os.getenv("CACHE_HOT_SEC", "1800"))
+# Прогревать статистику админ-панели при запуске, до начала приёма обновлений
+WARM_UP_STATS = os.getenv("WARM_UP_STATS", "true").lower() in ("1","true","yes","on")
+
+# Отказ в доступе пользователям не из whitelist: повторные обновления от
+# получившего отказ в течение RBAC_REJECT_WINDOW_SEC сек отбрасываются молча;
+# помнится не больше RBAC_REJECT_CACHE_SIZE таких ID
+RBAC_REJECT_WINDOW_SEC = float(os.getenv("RBAC_REJECT_WINDOW_SEC", "600"))
+RBAC_REJECT_CACHE_SIZE = int(os.getenv("RBAC_REJECT_CACHE_SIZE", "10000"))
+
+# Снимок кэша при остановке и восстановление при запуске (пустой путь — выкл.):
+# какие пространства имён сохранять и сколько секунд снимок годен
+CACHE_SNAPSHOT_PATH = os.getenv("CACHE_SNAPSHOT_PATH", "")
+CACHE_SNAPSHOT_NAMESPACES = [ns.strip() for ns in os.getenv("CACHE_SNAPSHOT_NAMESPACES", "stats,version").split(",") if ns.strip()]
+CACHE_SNAPSHOT_MAX_AGE_SEC = float(os.getenv("CACHE_SNAPSHOT_MAX_AGE_SEC", "3600"))
+
+# Кэш метаданных версий (название, ключ MinIO, тип, размер): без TTL,
+# ограничен числом записей и объёмом (МБ)
+VERSION_CACHE_MAX_ENTRIES = int(os.getenv("VERSION_CACHE_MAX_ENTRIES", "50000"))
+VERSION_CACHE_MAX_MB = int(os.getenv("VERSION_CACHE_MAX_MB", "16"))
@@ -1,9 +1,7 @@
-from pathlib import Path
-from sqlalchemy import text
+from bot.config import AUTO_MIGRATE
+from bot.db.migrate import ensure_schema
 from bot.db.session import engine
 
 def init_schema() -> None:
-    """Initialize database schema using existing engine from session.py"""
-    sql = Path(__file__).with_name("schema.sql").read_text(encoding="utf-8")
-    with engine.begin() as conn:
-        conn.execute(text(sql))
+    """Проверяет версию схемы и при необходимости применяет миграции (bot/db/migrate.py)"""
+    ensure_schema(engine, auto_migrate=AUTO_MIGRATE)
@@ -0,0 +1,242 @@
+"""
+Версионные миграции схемы
+
+Миграции лежат в bot/db/migrations/NNNN_название.sql и применяются по
+возрастанию номера. Применённые версии записываются в schema_migrations,
+поэтому при обычном запуске достаточно одного запроса: сравнить последнюю
+применённую версию с последней версией в каталоге.
+
+Миграции применяет один процесс: остальные экземпляры ждут advisory lock
+и после его получения видят, что версии уже записаны.
+
+Обычная миграция выполняется одной транзакцией вместе с записью версии.
+Миграция с первой строкой «-- migrate: no-transaction» выполняется
+покомандно в autocommit — так можно строить индексы CONCURRENTLY. Команды
+в таком файле разделяются «;» в конце строки, блоки $$ в нём не допускаются.
+
+    python -m bot.db.migrate           # применить недостающие миграции
+    python -m bot.db.migrate --status  # показать состояние
+"""
+import argparse
+import hashlib
+import logging
+import re
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import ProgrammingError
+
+MIGRATIONS_DIR = Path(__file__).with_name("migrations")
+NO_TRANSACTION_MARK = "-- migrate: no-transaction"
+# Ключ pg_advisory_lock для миграций (произвольная константа)
+MIGRATION_LOCK_KEY = 0x646F6375626F74
+LOCK_POLL_SEC = 1.0
+
+CREATE_VERSION_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+      version     INTEGER     PRIMARY KEY,
+      name        TEXT        NOT NULL,
+      checksum    CHAR(64)    NOT NULL,
+      applied_at  TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+"""
+
+INDEX_NAME_RE = re.compile(r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)", re.IGNORECASE)
+
+
+@dataclass
+class Migration:
+    version: int
+    name: str
+    path: Path
+
+    @property
+    def sql(self) -> str:
+        return self.path.read_text(encoding="utf-8")
+
+    @property
+    def checksum(self) -> str:
+        return hashlib.sha256(self.path.read_bytes()).hexdigest()
+
+    @property
+    def transactional(self) -> bool:
+        return not self.sql.lstrip().startswith(NO_TRANSACTION_MARK)
+
+    def statements(self) -> List[str]:
+        """Команды миграции без транзакции (по «;» в конце строки)"""
+        parts = re.split(r";\s*$", self.sql, flags=re.MULTILINE)
+        result = []
+        for part in parts:
+            body = "\n".join(line for line in part.splitlines() if not line.strip().startswith("--")).strip()
+            if body:
+                result.append(body)
+        return result
+
+
+def discover_migrations(directory: Path = MIGRATIONS_DIR) -> List[Migration]:
+    """Находит файлы миграций, упорядоченные по версии"""
+    migrations = []
+    for path in sorted(directory.glob("*.sql")):
+        number, _, name = path.stem.partition("_")
+        if not number.isdigit():
+            continue
+        migrations.append(Migration(int(number), name, path))
+
+    versions = [m.version for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"Повторяющиеся номера миграций в {directory}")
+    return migrations
+
+
+def current_version(engine: Engine) -> int:
+    """Последняя применённая версия схемы (0 — миграции ещё не применялись)"""
+    try:
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")).scalar_one()
+    except ProgrammingError:
+        # таблицы версий ещё нет
+        return 0
+
+
+def _applied(conn: Connection) -> dict:
+    rows = conn.execute(text("SELECT version, checksum FROM schema_migrations")).fetchall()
+    return {version: checksum.strip() for version, checksum in rows}
+
+
+def _record(conn: Connection, migration: Migration) -> None:
+    conn.execute(text("""
+        INSERT INTO schema_migrations (version, name, checksum) VALUES (:v, :n, :c)
+    """), {"v": migration.version, "n": migration.name, "c": migration.checksum})
+
+
+def _drop_invalid_indexes(conn: Connection, migration: Migration) -> None:
+    """
+    Удаляет невалидные индексы, оставшиеся от прерванной сборки CONCURRENTLY
+    этой же миграции: иначе IF NOT EXISTS молча пропустит их
+    """
+    names = INDEX_NAME_RE.findall(migration.sql)
+    if not names:
+        return
+    invalid = conn.execute(text("""
+        SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE NOT i.indisvalid AND c.relname = ANY(:names)
+    """), {"names": names}).scalars().all()
+    for name in invalid:
+        logging.warning(f"Пересоздаётся невалидный индекс {name}")
+        conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"'))
+
+
+def _apply(engine: Engine, migration: Migration) -> None:
+    if migration.transactional:
+        with engine.begin() as conn:
+            conn.execute(text(migration.sql))
+            _record(conn, migration)
+        return
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        _drop_invalid_indexes(conn, migration)
+        for statement in migration.statements():
+            conn.execute(text(statement))
+        _record(conn, migration)
+
+
+def _acquire_lock(conn: Connection) -> None:
+    """
+    Ждёт advisory lock короткими попытками: процесс, висящий в
+    pg_advisory_lock, держит открытую транзакцию, и CREATE INDEX
+    CONCURRENTLY у владельца блокировки ждал бы его бесконечно
+    """
+    while not conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY}).scalar_one():
+        time.sleep(LOCK_POLL_SEC)
+
+
+def migrate(engine: Engine, target: Optional[int] = None) -> List[int]:
+    """
+    Применяет недостающие миграции под advisory lock
+
+    Args:
+        engine: Engine основной базы
+        target: Версия, до которой применять (None — до последней)
+
+    Returns:
+        Номера применённых миграций
+    """
+    migrations = [m for m in discover_migrations() if target is None or m.version <= target]
+    applied_now: List[int] = []
+
+    # Блокировка уровня сессии держится на отдельном соединении всё время миграций
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as lock_conn:
+        _acquire_lock(lock_conn)
+        try:
+            lock_conn.execute(text(CREATE_VERSION_TABLE))
+            applied = _applied(lock_conn)
+
+            for migration in migrations:
+                if migration.version in applied:
+                    if applied[migration.version] != migration.checksum:
+                        logging.warning(
+                            f"Миграция {migration.path.name} изменена после применения (контрольная сумма не совпадает)"
+                        )
+                    continue
+
+                logging.info(f"Применяется миграция {migration.path.name}")
+                _apply(engine, migration)
+                applied_now.append(migration.version)
+        finally:
+            lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+
+    return applied_now
+
+
+def ensure_schema(engine: Engine, auto_migrate: bool = True) -> int:
+    """
+    Проверка схемы при запуске: один запрос, если база актуальна
+
+    Returns:
+        Текущая версия схемы
+    """
+    latest = max((m.version for m in discover_migrations()), default=0)
+    version = current_version(engine)
+    if version >= latest:
+        return version
+
+    if not auto_migrate:
+        raise RuntimeError(
+            f"Схема базы устарела (версия {version}, нужна {latest}): выполните python -m bot.db.migrate"
+        )
+
+    applied = migrate(engine)
+    if applied:
+        logging.info(f"Применены миграции: {', '.join(map(str, applied))}")
+    return current_version(engine)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Миграции схемы DocuBot")
+    parser.add_argument("--status", action="store_true", help="Показать применённые и ожидающие миграции")
+    parser.add_argument("--target", type=int, help="Применить миграции до указанной версии")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from bot.db.session import engine
+
+    if args.status:
+        applied = {}
+        if current_version(engine):
+            with engine.connect() as conn:
+                applied = _applied(conn)
+        for migration in discover_migrations():
+            mark = "applied" if migration.version in applied else "pending"
+            print(f"{migration.version:04d} {migration.name:<32} {mark}")
+        return
+
+    applied = migrate(engine, target=args.target)
+    print(f"applied: {applied or 'nothing'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,622 @@
+-- Базовая схема DocuBot (идемпотентна: накатывается и на пустую базу,
+-- и на базу, созданную прежним schema.sql)
+-- === ENUMS ===
+DO $$ BEGIN
+  CREATE TYPE doc_status AS ENUM ('draft','in_review','approved','rejected','archived');
+EXCEPTION WHEN duplicate_object THEN NULL; END $$;
+
+DO $$ BEGIN
+  CREATE TYPE doc_kind AS ENUM ('order','memo','request','other');
+EXCEPTION WHEN duplicate_object THEN NULL; END $$;
+
+-- === FILES ===
+CREATE TABLE IF NOT EXISTS files (
+  id            UUID PRIMARY KEY,
+  minio_key     TEXT        NOT NULL,
+  sha256        CHAR(64)    NOT NULL,
+  mime          TEXT        NOT NULL,
+  ext           TEXT        NOT NULL,
+  size_bytes    INTEGER     NOT NULL,
+  created_at    TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE UNIQUE INDEX IF NOT EXISTS ux_files_sha256 ON files(sha256);
+CREATE INDEX IF NOT EXISTS ix_files_created       ON files(created_at DESC);
+
+-- === DOCUMENTS ===
+CREATE TABLE IF NOT EXISTS documents (
+  id                 UUID PRIMARY KEY,
+  title              TEXT        NOT NULL,
+  kind               doc_kind    NOT NULL DEFAULT 'other',
+  owner_tg_id        BIGINT      NOT NULL,
+  status             doc_status  NOT NULL DEFAULT 'draft',
+  current_version_id UUID,
+  created_at         TIMESTAMPTZ NOT NULL DEFAULT now(),
+  updated_at         TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- auto-updated updated_at
+CREATE OR REPLACE FUNCTION set_updated_at() RETURNS TRIGGER AS $$
+BEGIN
+  NEW.updated_at = now();
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_documents_updated ON documents;
+CREATE TRIGGER trg_documents_updated
+BEFORE UPDATE ON documents
+FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+
+-- индексы для ускорения /my_docs и join'ов
+CREATE INDEX IF NOT EXISTS idx_documents_owner_created
+  ON documents(owner_tg_id, created_at DESC);
+
+CREATE INDEX IF NOT EXISTS idx_documents_current_version
+  ON documents(current_version_id);
+
+-- поиск по подстроке в названии (ILIKE '%q%'): триграммный GIN-индекс.
+-- Если расширение pg_trgm недоступно, схема применяется без него.
+DO $$ BEGIN
+  CREATE EXTENSION IF NOT EXISTS pg_trgm;
+EXCEPTION WHEN OTHERS THEN
+  RAISE NOTICE 'pg_trgm недоступно, поиск по названию без индекса: %', SQLERRM;
+END $$;
+
+DO $$ BEGIN
+  IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+    CREATE INDEX IF NOT EXISTS idx_documents_title_trgm
+      ON documents USING gin (title gin_trgm_ops);
+  END IF;
+END $$;
+
+-- === DOCUMENT VERSIONS ===
+CREATE TABLE IF NOT EXISTS document_versions (
+  id            UUID PRIMARY KEY,
+  document_id   UUID        NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+  file_id       UUID        NOT NULL REFERENCES files(id)     ON DELETE RESTRICT,
+  version_no    INTEGER     NOT NULL,
+  author_tg_id  BIGINT      NOT NULL,
+  note          TEXT,
+  created_at    TIMESTAMPTZ NOT NULL DEFAULT now(),
+  UNIQUE (document_id, version_no)
+);
+
+-- полезные индексы на внешние ключи и частые фильтры
+CREATE INDEX IF NOT EXISTS idx_versions_document_created
+  ON document_versions(document_id, created_at DESC);
+
+CREATE INDEX IF NOT EXISTS idx_versions_file_id
+  ON document_versions(file_id);
+
+CREATE INDEX IF NOT EXISTS idx_versions_author
+  ON document_versions(author_tg_id);
+
+-- счётчик версий документа: номер выдаётся UPDATE ... RETURNING под блокировкой строки
+DO $$ BEGIN
+  IF NOT EXISTS (
+    SELECT 1 FROM information_schema.columns
+     WHERE table_name = 'documents' AND column_name = 'last_version_no'
+  ) THEN
+    ALTER TABLE documents ADD COLUMN last_version_no INTEGER NOT NULL DEFAULT 0;
+    -- однократное заполнение для уже существующих документов
+    -- (служебное обновление, updated_at не трогаем)
+    ALTER TABLE documents DISABLE TRIGGER trg_documents_updated;
+    UPDATE documents d
+       SET last_version_no = v.max_no
+      FROM (SELECT document_id, MAX(version_no) AS max_no
+              FROM document_versions GROUP BY document_id) v
+     WHERE d.id = v.document_id;
+    ALTER TABLE documents ENABLE TRIGGER trg_documents_updated;
+  END IF;
+END $$;
+
+-- FK на current_version_id (idempotent)
+DO $$ BEGIN
+  ALTER TABLE documents
+    ADD CONSTRAINT fk_documents_current_version
+    FOREIGN KEY (current_version_id) REFERENCES document_versions(id) ON DELETE SET NULL;
+EXCEPTION WHEN duplicate_object THEN NULL; END $$;
+
+-- === WORKFLOW СОГЛАСОВАНИЯ ===
+-- Таблица этапов согласования
+CREATE TABLE IF NOT EXISTS approval_workflows (
+  id            UUID PRIMARY KEY,
+  document_id   UUID        NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+  step_order    INTEGER     NOT NULL,
+  approver_tg_id BIGINT     NOT NULL,
+  status        VARCHAR(20) NOT NULL DEFAULT 'pending', -- pending, approved, rejected, skipped
+  comment       TEXT,
+  created_at    TIMESTAMPTZ NOT NULL DEFAULT now(),
+  completed_at  TIMESTAMPTZ,
+  deadline      TIMESTAMPTZ,
+  UNIQUE (document_id, step_order)
+);
+
+-- Индексы для workflow
+CREATE INDEX IF NOT EXISTS idx_workflows_document 
+  ON approval_workflows(document_id, step_order);
+CREATE INDEX IF NOT EXISTS idx_workflows_approver 
+  ON approval_workflows(approver_tg_id, status);
+CREATE INDEX IF NOT EXISTS idx_workflows_deadline 
+  ON approval_workflows(deadline) WHERE status = 'pending';
+
+-- Таблица истории согласований
+-- Секционирована по месяцам created_at: вставка и сканы по периоду
+-- затрагивают только нужные секции, старые секции отсоединяются целиком.
+-- Переход со старой несекционированной таблицы: она переименовывается,
+-- данные переносятся ниже, после создания секций.
+DO $$ BEGIN
+  IF (SELECT relkind FROM pg_class WHERE oid = to_regclass('approval_history')) = 'r' THEN
+    ALTER TABLE approval_history RENAME TO approval_history_legacy;
+    ALTER TABLE approval_history_legacy DROP CONSTRAINT IF EXISTS approval_history_pkey;
+    DROP INDEX IF EXISTS idx_history_document;
+    DROP INDEX IF EXISTS idx_history_approver;
+  END IF;
+END $$;
+
+CREATE TABLE IF NOT EXISTS approval_history (
+  id            UUID        NOT NULL,
+  document_id   UUID        NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+  approver_tg_id BIGINT    NOT NULL,
+  action        VARCHAR(20) NOT NULL, -- approved, rejected, commented, delegated
+  comment       TEXT,
+  created_at    TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+-- страховочная секция: сюда попадают строки вне созданных месяцев
+CREATE TABLE IF NOT EXISTS approval_history_default
+  PARTITION OF approval_history DEFAULT;
+
+-- Создаёт месячные секции approval_history_pYYYYMM от месяца p_from
+-- до текущего месяца + p_months_ahead (идемпотентно)
+CREATE OR REPLACE FUNCTION approval_history_ensure_partitions(
+  p_from TIMESTAMPTZ DEFAULT now(),
+  p_months_ahead INTEGER DEFAULT 3
+) RETURNS INTEGER AS $$
+DECLARE
+  m        DATE := date_trunc('month', p_from AT TIME ZONE 'UTC')::date;
+  last_m   DATE := (date_trunc('month', now() AT TIME ZONE 'UTC') + make_interval(months => p_months_ahead))::date;
+  part     TEXT;
+  created  INTEGER := 0;
+BEGIN
+  WHILE m <= last_m LOOP
+    part := 'approval_history_p' || to_char(m, 'YYYYMM');
+    IF to_regclass(part) IS NULL THEN
+      IF EXISTS (
+        SELECT 1 FROM approval_history_default
+         WHERE created_at >= (m::timestamp AT TIME ZONE 'UTC')
+           AND created_at <  ((m + INTERVAL '1 month')::timestamp AT TIME ZONE 'UTC')
+      ) THEN
+        -- строки месяца уже лежат в DEFAULT: секцию создать нельзя без переноса
+        RAISE WARNING 'approval_history: строки за % в секции DEFAULT, секция % не создана', m, part;
+      ELSE
+        EXECUTE format(
+          'CREATE TABLE %I PARTITION OF approval_history FOR VALUES FROM (%L) TO (%L)',
+          part,
+          m::timestamp AT TIME ZONE 'UTC',
+          (m + INTERVAL '1 month')::timestamp AT TIME ZONE 'UTC'
+        );
+        created := created + 1;
+      END IF;
+    END IF;
+    m := (m + INTERVAL '1 month')::date;
+  END LOOP;
+  RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Политика хранения: отсоединяет месячные секции старше p_keep_months
+-- (по желанию удаляет их). Роллапы статистики при этом не уменьшаются —
+-- строки уходят без DELETE-триггеров.
+CREATE OR REPLACE FUNCTION approval_history_detach_partitions(
+  p_keep_months INTEGER,
+  p_drop BOOLEAN DEFAULT false
+) RETURNS SETOF TEXT AS $$
+DECLARE
+  cutoff DATE := (date_trunc('month', now() AT TIME ZONE 'UTC') - make_interval(months => p_keep_months))::date;
+  part   TEXT;
+BEGIN
+  FOR part IN
+    SELECT c.relname
+      FROM pg_inherits i
+      JOIN pg_class c ON c.oid = i.inhrelid
+     WHERE i.inhparent = 'approval_history'::regclass
+       AND c.relname ~ '^approval_history_p[0-9]{6}$'
+       AND to_date(right(c.relname, 6), 'YYYYMM') < cutoff
+     ORDER BY c.relname
+  LOOP
+    EXECUTE format('ALTER TABLE approval_history DETACH PARTITION %I', part);
+    IF p_drop THEN
+      EXECUTE format('DROP TABLE %I', part);
+    END IF;
+    RETURN NEXT part;
+  END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT approval_history_ensure_partitions();
+
+-- Перенос данных из старой таблицы (однократно)
+DO $$
+DECLARE
+  first_at TIMESTAMPTZ;
+BEGIN
+  IF to_regclass('approval_history_legacy') IS NOT NULL THEN
+    SELECT MIN(created_at) INTO first_at FROM approval_history_legacy;
+    PERFORM approval_history_ensure_partitions(COALESCE(first_at, now()));
+    INSERT INTO approval_history (id, document_id, approver_tg_id, action, comment, created_at)
+    SELECT id, document_id, approver_tg_id, action, comment, created_at
+      FROM approval_history_legacy;
+    DROP TABLE approval_history_legacy;
+  END IF;
+END $$;
+
+-- Индексы для истории (создаются на всех секциях)
+CREATE INDEX IF NOT EXISTS idx_history_document 
+  ON approval_history(document_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_history_approver 
+  ON approval_history(approver_tg_id, created_at DESC);
+-- BRIN для сканов по диапазону времени: история пишется по возрастанию created_at
+CREATE INDEX IF NOT EXISTS idx_history_created_brin
+  ON approval_history USING brin (created_at);
+
+-- Сведения об архивации хранятся в самом документе: списки архива
+-- и статистика не обращаются к approval_history
+DO $$ BEGIN
+  IF NOT EXISTS (
+    SELECT 1 FROM information_schema.columns
+     WHERE table_name = 'documents' AND column_name = 'archived_at'
+  ) THEN
+    ALTER TABLE documents
+      ADD COLUMN archived_at    TIMESTAMPTZ,
+      ADD COLUMN archived_by    BIGINT,
+      ADD COLUMN archive_reason TEXT;
+    -- однократное заполнение из последнего события архивации
+    -- (служебное обновление, updated_at не трогаем)
+    ALTER TABLE documents DISABLE TRIGGER trg_documents_updated;
+    UPDATE documents d
+       SET archived_at = h.created_at,
+           archived_by = h.approver_tg_id,
+           archive_reason = h.comment
+      FROM (SELECT DISTINCT ON (document_id) document_id, created_at, approver_tg_id, comment
+              FROM approval_history
+             WHERE action = 'archived'
+             ORDER BY document_id, created_at DESC) h
+     WHERE d.id = h.document_id AND d.status = 'archived';
+    UPDATE documents SET archived_at = updated_at
+     WHERE status = 'archived' AND archived_at IS NULL;
+    ALTER TABLE documents ENABLE TRIGGER trg_documents_updated;
+    -- роллап архивации теперь считается по documents.archived_at
+    IF to_regclass('stats_archive_monthly') IS NOT NULL THEN
+      TRUNCATE stats_archive_monthly;
+      INSERT INTO stats_archive_monthly (month, archived_count)
+      SELECT date_trunc('month', archived_at AT TIME ZONE 'UTC')::date, COUNT(*)
+        FROM documents WHERE status = 'archived' GROUP BY 1;
+    END IF;
+  END IF;
+END $$;
+
+-- Таблица делегирования полномочий
+CREATE TABLE IF NOT EXISTS approval_delegations (
+  id            UUID PRIMARY KEY,
+  delegator_tg_id BIGINT    NOT NULL,
+  delegate_tg_id  BIGINT    NOT NULL,
+  document_id   UUID        REFERENCES documents(id) ON DELETE CASCADE,
+  created_at    TIMESTAMPTZ NOT NULL DEFAULT now(),
+  expires_at    TIMESTAMPTZ,
+  is_active     BOOLEAN     NOT NULL DEFAULT true
+);
+
+-- Индексы для делегирования
+CREATE INDEX IF NOT EXISTS idx_delegations_delegator 
+  ON approval_delegations(delegator_tg_id, is_active);
+CREATE INDEX IF NOT EXISTS idx_delegations_delegate 
+  ON approval_delegations(delegate_tg_id, is_active);
+
+-- === РОЛЛАПЫ ДЛЯ СТАТИСТИКИ ===
+-- Счётчики поддерживаются триггерами в той же транзакции, что и изменения
+-- исходных таблиц, поэтому чтение статистики — это выборка по корзинам,
+-- а не полный скан documents / files / approval_workflows.
+-- Все временные корзины считаются в UTC.
+CREATE TABLE IF NOT EXISTS stats_document_counts (
+  status        doc_status  NOT NULL,
+  kind          doc_kind    NOT NULL,
+  doc_count     BIGINT      NOT NULL DEFAULT 0,
+  PRIMARY KEY (status, kind)
+);
+
+CREATE TABLE IF NOT EXISTS stats_document_daily (
+  day           DATE        PRIMARY KEY,
+  doc_count     BIGINT      NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS stats_owner_counts (
+  owner_tg_id   BIGINT      PRIMARY KEY,
+  doc_count     BIGINT      NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_stats_owner_doc_count
+  ON stats_owner_counts(doc_count DESC);
+
+-- действия согласования по документам владельца (для /my_stats)
+CREATE TABLE IF NOT EXISTS stats_owner_actions (
+  owner_tg_id   BIGINT      NOT NULL,
+  action        VARCHAR(20) NOT NULL,
+  action_count  BIGINT      NOT NULL DEFAULT 0,
+  PRIMARY KEY (owner_tg_id, action)
+);
+
+CREATE TABLE IF NOT EXISTS stats_version_monthly (
+  month         DATE        PRIMARY KEY,
+  version_count BIGINT      NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS stats_file_mime (
+  mime          TEXT        PRIMARY KEY,
+  file_count    BIGINT      NOT NULL DEFAULT 0,
+  total_bytes   BIGINT      NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS stats_file_monthly (
+  month         DATE        PRIMARY KEY,
+  file_count    BIGINT      NOT NULL DEFAULT 0,
+  total_bytes   BIGINT      NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS stats_workflow_counts (
+  status            VARCHAR(20)      PRIMARY KEY,
+  step_count        BIGINT           NOT NULL DEFAULT 0,
+  first_step_count  BIGINT           NOT NULL DEFAULT 0, -- этапы step_order = 1, т.е. число workflow
+  completed_count   BIGINT           NOT NULL DEFAULT 0,
+  completed_seconds DOUBLE PRECISION NOT NULL DEFAULT 0
+);
+
+-- архивные документы по месяцу архивации (documents.archived_at)
+CREATE TABLE IF NOT EXISTS stats_archive_monthly (
+  month          DATE       PRIMARY KEY,
+  archived_count BIGINT     NOT NULL DEFAULT 0
+);
+
+-- documents: статус/тип, владелец, день создания
+CREATE OR REPLACE FUNCTION stats_documents_trg() RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP = 'DELETE' OR (TG_OP = 'UPDATE' AND (OLD.status, OLD.kind) IS DISTINCT FROM (NEW.status, NEW.kind)) THEN
+    UPDATE stats_document_counts SET doc_count = doc_count - 1
+     WHERE status = OLD.status AND kind = OLD.kind;
+  END IF;
+  IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND (OLD.status, OLD.kind) IS DISTINCT FROM (NEW.status, NEW.kind)) THEN
+    INSERT INTO stats_document_counts AS c (status, kind, doc_count)
+    VALUES (NEW.status, NEW.kind, 1)
+    ON CONFLICT (status, kind) DO UPDATE SET doc_count = c.doc_count + 1;
+  END IF;
+
+  IF TG_OP = 'DELETE' OR (TG_OP = 'UPDATE' AND OLD.owner_tg_id IS DISTINCT FROM NEW.owner_tg_id) THEN
+    UPDATE stats_owner_counts SET doc_count = doc_count - 1
+     WHERE owner_tg_id = OLD.owner_tg_id;
+  END IF;
+  IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND OLD.owner_tg_id IS DISTINCT FROM NEW.owner_tg_id) THEN
+    INSERT INTO stats_owner_counts AS c (owner_tg_id, doc_count)
+    VALUES (NEW.owner_tg_id, 1)
+    ON CONFLICT (owner_tg_id) DO UPDATE SET doc_count = c.doc_count + 1;
+  END IF;
+
+  IF OLD.status = 'archived' AND OLD.archived_at IS NOT NULL
+     AND (TG_OP = 'DELETE' OR (OLD.status, OLD.archived_at) IS DISTINCT FROM (NEW.status, NEW.archived_at)) THEN
+    UPDATE stats_archive_monthly SET archived_count = archived_count - 1
+     WHERE month = date_trunc('month', OLD.archived_at AT TIME ZONE 'UTC')::date;
+  END IF;
+  IF NEW.status = 'archived' AND NEW.archived_at IS NOT NULL
+     AND (TG_OP = 'INSERT' OR (OLD.status, OLD.archived_at) IS DISTINCT FROM (NEW.status, NEW.archived_at)) THEN
+    INSERT INTO stats_archive_monthly AS c (month, archived_count)
+    VALUES (date_trunc('month', NEW.archived_at AT TIME ZONE 'UTC')::date, 1)
+    ON CONFLICT (month) DO UPDATE SET archived_count = c.archived_count + 1;
+  END IF;
+
+  IF TG_OP = 'DELETE' OR (TG_OP = 'UPDATE' AND OLD.created_at IS DISTINCT FROM NEW.created_at) THEN
+    UPDATE stats_document_daily SET doc_count = doc_count - 1
+     WHERE day = (OLD.created_at AT TIME ZONE 'UTC')::date;
+  END IF;
+  IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND OLD.created_at IS DISTINCT FROM NEW.created_at) THEN
+    INSERT INTO stats_document_daily AS c (day, doc_count)
+    VALUES ((NEW.created_at AT TIME ZONE 'UTC')::date, 1)
+    ON CONFLICT (day) DO UPDATE SET doc_count = c.doc_count + 1;
+  END IF;
+
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_documents_stats ON documents;
+CREATE TRIGGER trg_documents_stats
+AFTER INSERT OR UPDATE OR DELETE ON documents
+FOR EACH ROW EXECUTE FUNCTION stats_documents_trg();
+
+-- document_versions: число версий по месяцам
+CREATE OR REPLACE FUNCTION stats_versions_trg() RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    INSERT INTO stats_version_monthly AS c (month, version_count)
+    VALUES (date_trunc('month', NEW.created_at AT TIME ZONE 'UTC')::date, 1)
+    ON CONFLICT (month) DO UPDATE SET version_count = c.version_count + 1;
+  ELSIF TG_OP = 'DELETE' THEN
+    UPDATE stats_version_monthly SET version_count = version_count - 1
+     WHERE month = date_trunc('month', OLD.created_at AT TIME ZONE 'UTC')::date;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_versions_stats ON document_versions;
+CREATE TRIGGER trg_versions_stats
+AFTER INSERT OR DELETE ON document_versions
+FOR EACH ROW EXECUTE FUNCTION stats_versions_trg();
+
+-- files: MIME-тип и месяц загрузки
+CREATE OR REPLACE FUNCTION stats_files_trg() RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    UPDATE stats_file_mime
+       SET file_count = file_count - 1, total_bytes = total_bytes - OLD.size_bytes
+     WHERE mime = OLD.mime;
+    UPDATE stats_file_monthly
+       SET file_count = file_count - 1, total_bytes = total_bytes - OLD.size_bytes
+     WHERE month = date_trunc('month', OLD.created_at AT TIME ZONE 'UTC')::date;
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    INSERT INTO stats_file_mime AS c (mime, file_count, total_bytes)
+    VALUES (NEW.mime, 1, NEW.size_bytes)
+    ON CONFLICT (mime) DO UPDATE
+      SET file_count = c.file_count + 1, total_bytes = c.total_bytes + EXCLUDED.total_bytes;
+    INSERT INTO stats_file_monthly AS c (month, file_count, total_bytes)
+    VALUES (date_trunc('month', NEW.created_at AT TIME ZONE 'UTC')::date, 1, NEW.size_bytes)
+    ON CONFLICT (month) DO UPDATE
+      SET file_count = c.file_count + 1, total_bytes = c.total_bytes + EXCLUDED.total_bytes;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_files_stats ON files;
+CREATE TRIGGER trg_files_stats
+AFTER INSERT OR UPDATE OF mime, size_bytes, created_at OR DELETE ON files
+FOR EACH ROW EXECUTE FUNCTION stats_files_trg();
+
+-- approval_workflows: этапы по статусам и время согласования
+CREATE OR REPLACE FUNCTION stats_workflows_trg() RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    UPDATE stats_workflow_counts
+       SET step_count        = step_count - 1,
+           first_step_count  = first_step_count - (OLD.step_order = 1)::int,
+           completed_count   = completed_count - (OLD.completed_at IS NOT NULL)::int,
+           completed_seconds = completed_seconds
+                               - COALESCE(EXTRACT(EPOCH FROM (OLD.completed_at - OLD.created_at)), 0)
+     WHERE status = OLD.status;
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    INSERT INTO stats_workflow_counts AS c
+      (status, step_count, first_step_count, completed_count, completed_seconds)
+    VALUES (
+      NEW.status, 1, (NEW.step_order = 1)::int, (NEW.completed_at IS NOT NULL)::int,
+      COALESCE(EXTRACT(EPOCH FROM (NEW.completed_at - NEW.created_at)), 0)
+    )
+    ON CONFLICT (status) DO UPDATE
+      SET step_count        = c.step_count + 1,
+          first_step_count  = c.first_step_count + EXCLUDED.first_step_count,
+          completed_count   = c.completed_count + EXCLUDED.completed_count,
+          completed_seconds = c.completed_seconds + EXCLUDED.completed_seconds;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_workflows_stats ON approval_workflows;
+CREATE TRIGGER trg_workflows_stats
+AFTER INSERT OR UPDATE OF status, step_order, created_at, completed_at OR DELETE ON approval_workflows
+FOR EACH ROW EXECUTE FUNCTION stats_workflows_trg();
+
+-- approval_history: действия по документам владельца. Триггеры уровня
+-- оператора с таблицами переходов: пачка истории (массовое согласование,
+-- автоархивация) — один агрегированный upsert, а не строка за строкой.
+-- Архивация по месяцам считается триггером documents.
+DROP TRIGGER IF EXISTS trg_history_stats ON approval_history;
+
+CREATE OR REPLACE FUNCTION stats_history_insert_trg() RETURNS TRIGGER AS $$
+BEGIN
+  INSERT INTO stats_owner_actions AS c (owner_tg_id, action, action_count)
+  SELECT d.owner_tg_id, n.action, COUNT(*)
+    FROM new_rows n JOIN documents d ON d.id = n.document_id
+   GROUP BY d.owner_tg_id, n.action
+  ON CONFLICT (owner_tg_id, action) DO UPDATE SET action_count = c.action_count + EXCLUDED.action_count;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- при каскадном удалении документа его строки уже нет, счётчики владельца
+-- остаются как есть (исправляются stats_rebuild_rollups)
+CREATE OR REPLACE FUNCTION stats_history_delete_trg() RETURNS TRIGGER AS $$
+BEGIN
+  UPDATE stats_owner_actions c
+     SET action_count = c.action_count - o.cnt
+    FROM (SELECT d.owner_tg_id, o.action, COUNT(*) AS cnt
+            FROM old_rows o JOIN documents d ON d.id = o.document_id
+           GROUP BY d.owner_tg_id, o.action) o
+   WHERE c.owner_tg_id = o.owner_tg_id AND c.action = o.action;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP FUNCTION IF EXISTS stats_history_trg();
+
+DROP TRIGGER IF EXISTS trg_history_stats_insert ON approval_history;
+CREATE TRIGGER trg_history_stats_insert
+AFTER INSERT ON approval_history
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION stats_history_insert_trg();
+
+DROP TRIGGER IF EXISTS trg_history_stats_delete ON approval_history;
+CREATE TRIGGER trg_history_stats_delete
+AFTER DELETE ON approval_history
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION stats_history_delete_trg();
+
+-- Полный пересчёт роллапов из исходных таблиц (первичное заполнение и
+-- ручное восстановление при расхождении)
+CREATE OR REPLACE FUNCTION stats_rebuild_rollups() RETURNS void AS $$
+BEGIN
+  LOCK TABLE documents, document_versions, files, approval_workflows, approval_history
+    IN SHARE MODE;
+
+  TRUNCATE stats_document_counts, stats_document_daily, stats_owner_counts,
+           stats_owner_actions, stats_version_monthly, stats_file_mime,
+           stats_file_monthly, stats_workflow_counts, stats_archive_monthly;
+
+  INSERT INTO stats_document_counts (status, kind, doc_count)
+  SELECT status, kind, COUNT(*) FROM documents GROUP BY status, kind;
+
+  INSERT INTO stats_document_daily (day, doc_count)
+  SELECT (created_at AT TIME ZONE 'UTC')::date, COUNT(*) FROM documents GROUP BY 1;
+
+  INSERT INTO stats_owner_counts (owner_tg_id, doc_count)
+  SELECT owner_tg_id, COUNT(*) FROM documents GROUP BY owner_tg_id;
+
+  INSERT INTO stats_version_monthly (month, version_count)
+  SELECT date_trunc('month', created_at AT TIME ZONE 'UTC')::date, COUNT(*)
+    FROM document_versions GROUP BY 1;
+
+  INSERT INTO stats_file_mime (mime, file_count, total_bytes)
+  SELECT mime, COUNT(*), COALESCE(SUM(size_bytes), 0) FROM files GROUP BY mime;
+
+  INSERT INTO stats_file_monthly (month, file_count, total_bytes)
+  SELECT date_trunc('month', created_at AT TIME ZONE 'UTC')::date, COUNT(*), COALESCE(SUM(size_bytes), 0)
+    FROM files GROUP BY 1;
+
+  INSERT INTO stats_workflow_counts (status, step_count, first_step_count, completed_count, completed_seconds)
+  SELECT status,
+         COUNT(*),
+         COUNT(*) FILTER (WHERE step_order = 1),
+         COUNT(completed_at),
+         COALESCE(SUM(EXTRACT(EPOCH FROM (completed_at - created_at))), 0)
+    FROM approval_workflows GROUP BY status;
+
+  INSERT INTO stats_archive_monthly (month, archived_count)
+  SELECT date_trunc('month', archived_at AT TIME ZONE 'UTC')::date, COUNT(*)
+    FROM documents WHERE status = 'archived' AND archived_at IS NOT NULL GROUP BY 1;
+
+  INSERT INTO stats_owner_actions (owner_tg_id, action, action_count)
+  SELECT d.owner_tg_id, h.action, COUNT(*)
+    FROM approval_history h JOIN documents d ON d.id = h.document_id
+   GROUP BY d.owner_tg_id, h.action;
+END;
+$$ LANGUAGE plpgsql;
+
+-- первичное заполнение роллапов на уже существующих данных
+DO $$ BEGIN
+  IF (NOT EXISTS (SELECT 1 FROM stats_document_counts) AND EXISTS (SELECT 1 FROM documents))
+     OR (NOT EXISTS (SELECT 1 FROM stats_file_mime) AND EXISTS (SELECT 1 FROM files))
+     OR (NOT EXISTS (SELECT 1 FROM stats_workflow_counts) AND EXISTS (SELECT 1 FROM approval_workflows))
+     OR (NOT EXISTS (SELECT 1 FROM stats_owner_actions) AND EXISTS (SELECT 1 FROM approval_history))
+  THEN
+    PERFORM stats_rebuild_rollups();
+  END IF;
+END $$;
@@ -0,0 +1,17 @@
+-- migrate: no-transaction
+-- Индексы по documents строятся CONCURRENTLY, без блокировки записи
+-- на работающей базе. Каждая команда выполняется отдельно (autocommit).
+
+-- глобальный поиск и списки «свежие первыми» без фильтра по владельцу
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_documents_created
+  ON documents(created_at DESC);
+
+-- кандидаты на автоматическую архивацию (пачками по возрасту)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_documents_approved_created
+  ON documents(created_at, id) WHERE status = 'approved';
+
+-- архив пользователя и общий архив, свежие архивации первыми
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_documents_archived_owner
+  ON documents(owner_tg_id, archived_at DESC) WHERE status = 'archived';
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_documents_archived_at
+  ON documents(archived_at DESC) WHERE status = 'archived';
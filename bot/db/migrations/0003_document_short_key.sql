@@ -0,0 +1,15 @@
+-- Короткие ID документов
+-- Ключ — 32 hex-символа UUID, переставленные так, чтобы в начале стояли
+-- случайные биты: у UUIDv7 первые символы — время, и префиксы документов,
+-- созданных в одну минуту, совпадали бы. У прежних uuid4 ключ совпадает
+-- с самим UUID без дефисов, поэтому старые короткие ID остаются прежними.
+-- Перестановка обратима, поэтому ключ уникален. Та же функция — short_key
+-- в bot/db/ids.py.
+CREATE OR REPLACE FUNCTION document_short_key(p_id uuid) RETURNS text
+LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE AS $$
+  SELECT CASE
+    WHEN substr(p_id::text, 15, 1) = '7'
+      THEN substr(replace(p_id::text, '-', ''), 18) || left(replace(p_id::text, '-', ''), 17)
+    ELSE replace(p_id::text, '-', '')
+  END
+$$;
@@ -0,0 +1,6 @@
+-- migrate: no-transaction
+-- Поиск документа по префиксу короткого ID (/archive, /unarchive) —
+-- один проход по индексу: LIKE 'префикс%' в сортировке "C" сводится
+-- к диапазону ключей.
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_documents_short_key
+  ON documents ((document_short_key(id)) COLLATE "C");
@@ -0,0 +1,10 @@
+-- Счётчик сбросов кэша для согласованности экземпляров бота
+-- (bot/services/coherence.py). Каждое сообщение NOTIFY несёт новое
+-- значение epoch; экземпляр, заметивший пропуск номера, сбрасывает
+-- свой локальный кэш целиком.
+CREATE TABLE IF NOT EXISTS cache_epoch (
+  id    SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+  epoch BIGINT   NOT NULL DEFAULT 0
+);
+
+INSERT INTO cache_epoch (id, epoch) VALUES (1, 0) ON CONFLICT (id) DO NOTHING;
@@ -0,0 +1,125 @@
+-- Роллапы documents и approval_workflows считаются триггерами уровня
+-- оператора, как и роллап истории. Построчные триггеры блокировали общие
+-- строки счётчиков (status, kind) в порядке обработки строк: две пачечные
+-- записи (автоархивация, массовое согласование документов разных типов)
+-- могли заблокировать их в разном порядке и уйти во взаимоблокировку.
+-- Теперь изменения оператора сворачиваются в дельты по ключам и
+-- применяются в порядке ключа; ключи с нулевой дельтой (UPDATE, не
+-- менявший статус, тип, владельца...) не блокируются вовсе.
+--
+-- Таблицы переходов допустимы только у триггеров на одно событие, поэтому
+-- на каждую таблицу три триггера с общей функцией: изменения оператора
+-- читаются как (sign, строка) — -1 для старой версии строки, +1 для новой.
+
+DROP TRIGGER IF EXISTS trg_documents_stats ON documents;
+DROP TRIGGER IF EXISTS trg_workflows_stats ON approval_workflows;
+
+-- Изменения оператора в виде (sign, строка таблицы)
+CREATE OR REPLACE FUNCTION stats_transition_rows(op TEXT) RETURNS TEXT AS $$
+  SELECT CASE op
+    WHEN 'INSERT' THEN 'SELECT 1 AS sign, n.* FROM new_rows n'
+    WHEN 'DELETE' THEN 'SELECT -1 AS sign, o.* FROM old_rows o'
+    ELSE 'SELECT -1 AS sign, o.* FROM old_rows o UNION ALL SELECT 1, n.* FROM new_rows n'
+  END
+$$ LANGUAGE sql IMMUTABLE;
+
+-- documents: статус/тип, владелец, месяц архивации, день создания
+CREATE OR REPLACE FUNCTION stats_documents_trg() RETURNS TRIGGER AS $$
+DECLARE
+  changes TEXT := stats_transition_rows(TG_OP);
+BEGIN
+  EXECUTE format($q$
+    INSERT INTO stats_document_counts AS c (status, kind, doc_count)
+    SELECT status, kind, SUM(sign) FROM (%s) t
+     GROUP BY status, kind HAVING SUM(sign) <> 0
+     ORDER BY status, kind
+    ON CONFLICT (status, kind) DO UPDATE SET doc_count = c.doc_count + EXCLUDED.doc_count
+  $q$, changes);
+
+  EXECUTE format($q$
+    INSERT INTO stats_owner_counts AS c (owner_tg_id, doc_count)
+    SELECT owner_tg_id, SUM(sign) FROM (%s) t
+     GROUP BY owner_tg_id HAVING SUM(sign) <> 0
+     ORDER BY owner_tg_id
+    ON CONFLICT (owner_tg_id) DO UPDATE SET doc_count = c.doc_count + EXCLUDED.doc_count
+  $q$, changes);
+
+  EXECUTE format($q$
+    INSERT INTO stats_archive_monthly AS c (month, archived_count)
+    SELECT date_trunc('month', archived_at AT TIME ZONE 'UTC')::date AS month, SUM(sign) FROM (%s) t
+     WHERE status = 'archived' AND archived_at IS NOT NULL
+     GROUP BY 1 HAVING SUM(sign) <> 0
+     ORDER BY 1
+    ON CONFLICT (month) DO UPDATE SET archived_count = c.archived_count + EXCLUDED.archived_count
+  $q$, changes);
+
+  EXECUTE format($q$
+    INSERT INTO stats_document_daily AS c (day, doc_count)
+    SELECT (created_at AT TIME ZONE 'UTC')::date AS day, SUM(sign) FROM (%s) t
+     GROUP BY 1 HAVING SUM(sign) <> 0
+     ORDER BY 1
+    ON CONFLICT (day) DO UPDATE SET doc_count = c.doc_count + EXCLUDED.doc_count
+  $q$, changes);
+
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_documents_stats_insert
+AFTER INSERT ON documents
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION stats_documents_trg();
+
+CREATE TRIGGER trg_documents_stats_update
+AFTER UPDATE ON documents
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION stats_documents_trg();
+
+CREATE TRIGGER trg_documents_stats_delete
+AFTER DELETE ON documents
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION stats_documents_trg();
+
+-- approval_workflows: этапы по статусам и время согласования
+CREATE OR REPLACE FUNCTION stats_workflows_trg() RETURNS TRIGGER AS $$
+BEGIN
+  EXECUTE format($q$
+    INSERT INTO stats_workflow_counts AS c
+      (status, step_count, first_step_count, completed_count, completed_seconds)
+    SELECT status,
+           SUM(sign),
+           SUM(sign * (step_order = 1)::int),
+           SUM(sign * (completed_at IS NOT NULL)::int),
+           SUM(sign * COALESCE(EXTRACT(EPOCH FROM (completed_at - created_at)), 0))
+      FROM (%s) t
+     GROUP BY status
+    HAVING SUM(sign) <> 0
+        OR SUM(sign * (step_order = 1)::int) <> 0
+        OR SUM(sign * (completed_at IS NOT NULL)::int) <> 0
+        OR SUM(sign * COALESCE(EXTRACT(EPOCH FROM (completed_at - created_at)), 0)) <> 0
+     ORDER BY status
+    ON CONFLICT (status) DO UPDATE
+      SET step_count        = c.step_count + EXCLUDED.step_count,
+          first_step_count  = c.first_step_count + EXCLUDED.first_step_count,
+          completed_count   = c.completed_count + EXCLUDED.completed_count,
+          completed_seconds = c.completed_seconds + EXCLUDED.completed_seconds
+  $q$, stats_transition_rows(TG_OP));
+
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_workflows_stats_insert
+AFTER INSERT ON approval_workflows
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION stats_workflows_trg();
+
+CREATE TRIGGER trg_workflows_stats_update
+AFTER UPDATE ON approval_workflows
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION stats_workflows_trg();
+
+CREATE TRIGGER trg_workflows_stats_delete
+AFTER DELETE ON approval_workflows
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION stats_workflows_trg();
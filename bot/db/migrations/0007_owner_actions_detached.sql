@@ -0,0 +1,119 @@
+-- Действия по документам владельца (stats_owner_actions) считаются за всё
+-- время: отсоединение секций истории их не уменьшает. Полный пересчёт
+-- раньше брал только присоединённую историю и после политики хранения
+-- молча занижал счётчики. Теперь при отсоединении счётчики секции
+-- переносятся в stats_owner_actions_detached, а пересчёт складывает их с
+-- оставшейся историей.
+
+CREATE TABLE IF NOT EXISTS stats_owner_actions_detached (
+  owner_tg_id   BIGINT      NOT NULL,
+  action        VARCHAR(20) NOT NULL,
+  action_count  BIGINT      NOT NULL DEFAULT 0,
+  PRIMARY KEY (owner_tg_id, action)
+);
+
+-- Секции, отсоединённые до этой миграции, уже не прочитать: их вклад —
+-- разница между роллапом и присоединённой историей
+INSERT INTO stats_owner_actions_detached (owner_tg_id, action, action_count)
+SELECT r.owner_tg_id, r.action, r.action_count - COALESCE(h.cnt, 0)
+  FROM stats_owner_actions r
+  LEFT JOIN (SELECT d.owner_tg_id, h.action, COUNT(*) AS cnt
+               FROM approval_history h JOIN documents d ON d.id = h.document_id
+              GROUP BY d.owner_tg_id, h.action) h
+         ON h.owner_tg_id = r.owner_tg_id AND h.action = r.action
+ WHERE r.action_count > COALESCE(h.cnt, 0)
+ON CONFLICT (owner_tg_id, action) DO NOTHING;
+
+-- Политика хранения: отсоединяет месячные секции старше p_keep_months
+-- (по желанию удаляет их). Роллапы статистики при этом не уменьшаются —
+-- строки уходят без DELETE-триггеров, а счётчики действий секции
+-- сохраняются в stats_owner_actions_detached для пересчёта.
+CREATE OR REPLACE FUNCTION approval_history_detach_partitions(
+  p_keep_months INTEGER,
+  p_drop BOOLEAN DEFAULT false
+) RETURNS SETOF TEXT AS $$
+DECLARE
+  cutoff DATE := (date_trunc('month', now() AT TIME ZONE 'UTC') - make_interval(months => p_keep_months))::date;
+  part   TEXT;
+BEGIN
+  FOR part IN
+    SELECT c.relname
+      FROM pg_inherits i
+      JOIN pg_class c ON c.oid = i.inhrelid
+     WHERE i.inhparent = 'approval_history'::regclass
+       AND c.relname ~ '^approval_history_p[0-9]{6}$'
+       AND to_date(right(c.relname, 6), 'YYYYMM') < cutoff
+     ORDER BY c.relname
+  LOOP
+    EXECUTE format($q$
+      INSERT INTO stats_owner_actions_detached AS c (owner_tg_id, action, action_count)
+      SELECT d.owner_tg_id, h.action, COUNT(*)
+        FROM %I h JOIN documents d ON d.id = h.document_id
+       GROUP BY d.owner_tg_id, h.action
+       ORDER BY d.owner_tg_id, h.action
+      ON CONFLICT (owner_tg_id, action) DO UPDATE SET action_count = c.action_count + EXCLUDED.action_count
+    $q$, part);
+    EXECUTE format('ALTER TABLE approval_history DETACH PARTITION %I', part);
+    IF p_drop THEN
+      EXECUTE format('DROP TABLE %I', part);
+    END IF;
+    RETURN NEXT part;
+  END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Полный пересчёт роллапов из исходных таблиц (первичное заполнение и
+-- ручное восстановление при расхождении). Действия владельцев — по
+-- присоединённой истории плюс счётчики отсоединённых секций.
+CREATE OR REPLACE FUNCTION stats_rebuild_rollups() RETURNS void AS $$
+BEGIN
+  LOCK TABLE documents, document_versions, files, approval_workflows, approval_history
+    IN SHARE MODE;
+
+  TRUNCATE stats_document_counts, stats_document_daily, stats_owner_counts,
+           stats_owner_actions, stats_version_monthly, stats_file_mime,
+           stats_file_monthly, stats_workflow_counts, stats_archive_monthly;
+
+  INSERT INTO stats_document_counts (status, kind, doc_count)
+  SELECT status, kind, COUNT(*) FROM documents GROUP BY status, kind;
+
+  INSERT INTO stats_document_daily (day, doc_count)
+  SELECT (created_at AT TIME ZONE 'UTC')::date, COUNT(*) FROM documents GROUP BY 1;
+
+  INSERT INTO stats_owner_counts (owner_tg_id, doc_count)
+  SELECT owner_tg_id, COUNT(*) FROM documents GROUP BY owner_tg_id;
+
+  INSERT INTO stats_version_monthly (month, version_count)
+  SELECT date_trunc('month', created_at AT TIME ZONE 'UTC')::date, COUNT(*)
+    FROM document_versions GROUP BY 1;
+
+  INSERT INTO stats_file_mime (mime, file_count, total_bytes)
+  SELECT mime, COUNT(*), COALESCE(SUM(size_bytes), 0) FROM files GROUP BY mime;
+
+  INSERT INTO stats_file_monthly (month, file_count, total_bytes)
+  SELECT date_trunc('month', created_at AT TIME ZONE 'UTC')::date, COUNT(*), COALESCE(SUM(size_bytes), 0)
+    FROM files GROUP BY 1;
+
+  INSERT INTO stats_workflow_counts (status, step_count, first_step_count, completed_count, completed_seconds)
+  SELECT status,
+         COUNT(*),
+         COUNT(*) FILTER (WHERE step_order = 1),
+         COUNT(completed_at),
+         COALESCE(SUM(EXTRACT(EPOCH FROM (completed_at - created_at))), 0)
+    FROM approval_workflows GROUP BY status;
+
+  INSERT INTO stats_archive_monthly (month, archived_count)
+  SELECT date_trunc('month', archived_at AT TIME ZONE 'UTC')::date, COUNT(*)
+    FROM documents WHERE status = 'archived' AND archived_at IS NOT NULL GROUP BY 1;
+
+  INSERT INTO stats_owner_actions (owner_tg_id, action, action_count)
+  SELECT owner_tg_id, action, SUM(cnt)
+    FROM (SELECT d.owner_tg_id, h.action, COUNT(*) AS cnt
+            FROM approval_history h JOIN documents d ON d.id = h.document_id
+           GROUP BY d.owner_tg_id, h.action
+          UNION ALL
+          SELECT owner_tg_id, action, action_count
+            FROM stats_owner_actions_detached) a
+   GROUP BY owner_tg_id, action;
+END;
+$$ LANGUAGE plpgsql;
@@ -1,12 +1,149 @@
-from sqlalchemy import create_engine
-from bot.config import DATABASE_URL
+import itertools
+import logging
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional, TypeVar
 
-engine = create_engine(
-    DATABASE_URL,
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import DBAPIError
+
+from bot.config import DATABASE_URL, DATABASE_REPLICA_URLS, REPLICA_MAX_LAG_SEC, REPLICA_LAG_CHECK_SEC
+
+ENGINE_OPTIONS = dict(
     echo=False,
     future=True,
     pool_pre_ping=True,
     pool_size=5,
     max_overflow=10,
     pool_recycle=1800,
-)
\ No newline at end of file
+)
+
+# Основная база: все записи и чтения, которым нужны только что записанные данные
+engine = create_engine(DATABASE_URL, **ENGINE_OPTIONS)
+
+# Реплики: только чтение (статистика, глобальный поиск, статистика архива)
+replica_engines = [create_engine(url, **ENGINE_OPTIONS) for url in DATABASE_REPLICA_URLS]
+
+# Отставание реплики: 0, если всё полученное WAL применено, иначе возраст
+# последней применённой транзакции. На не-реплике (pg_is_in_recovery() =
+# false) — 0. Реплика без потока WAL от основной базы (связь потеряна,
+# приёмник перезапускается) — NULL, то есть недоступна: иначе её
+# pg_last_wal_receive_lsn() застывает, применение догоняет его и реплика
+# бесконечно сообщает нулевое отставание. Статус приёмника виден роли с
+# pg_read_all_stats (pg_monitor); без этой роли реплика считается недоступной.
+REPLICA_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN NOT EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming') THEN NULL
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+_replica_rr = itertools.cycle(range(len(replica_engines))) if replica_engines else None
+_replica_lag: Dict[int, tuple[float, Optional[float]]] = {}
+_replica_lock = threading.Lock()
+
+
+def _replica_lag_sec(index: int) -> Optional[float]:
+    """Отставание реплики в секундах (кэшируется), None — реплика недоступна"""
+    now = time.monotonic()
+    with _replica_lock:
+        checked_at, lag = _replica_lag.get(index, (0.0, None))
+        if index in _replica_lag and now - checked_at < REPLICA_LAG_CHECK_SEC:
+            return lag
+        # Остальные потоки до окончания проверки используют прежнее значение
+        _replica_lag[index] = (now, lag)
+    
+    try:
+        with replica_engines[index].connect() as conn:
+            lag = conn.execute(REPLICA_LAG_SQL).scalar_one()
+    except Exception as e:
+        logging.warning(f"Replica {index} is unavailable: {e}")
+        lag = None
+    else:
+        if lag is None:
+            logging.warning(f"Replica {index} is not streaming WAL from the primary")
+        else:
+            lag = float(lag)
+    
+    with _replica_lock:
+        _replica_lag[index] = (time.monotonic(), lag)
+    return lag
+
+
+def get_read_engine() -> Engine:
+    """
+    Engine для запросов только на чтение, допускающих небольшое отставание
+    
+    Реплики перебираются по кругу; реплика, отстающая больше
+    REPLICA_MAX_LAG_SEC или недоступная, пропускается. Если подходящих
+    реплик нет (или они не настроены) — возвращается основной engine.
+    """
+    if not replica_engines:
+        return engine
+    
+    for _ in range(len(replica_engines)):
+        index = next(_replica_rr)
+        lag = _replica_lag_sec(index)
+        if lag is not None and lag <= REPLICA_MAX_LAG_SEC:
+            return replica_engines[index]
+    
+    return engine
+
+
+# Повторы транзакции, прерванной взаимоблокировкой
+DEADLOCK_RETRIES = 3
+DEADLOCK_SQLSTATE = "40P01"
+
+T = TypeVar("T")
+
+
+def is_deadlock(error: DBAPIError) -> bool:
+    orig = error.orig
+    return (getattr(orig, "sqlstate", None) or getattr(orig, "pgcode", None)) == DEADLOCK_SQLSTATE
+
+
+def run_in_transaction(work: Callable[[Connection], T], retries: int = DEADLOCK_RETRIES) -> T:
+    """
+    Выполняет work(conn) в транзакции основной базы
+
+    При взаимоблокировке PostgreSQL откатывает одну из транзакций целиком,
+    поэтому её можно повторить: до retries раз, с небольшой случайной
+    паузой, чтобы конкуренты не сошлись снова. work не должна иметь
+    побочных эффектов вне транзакции.
+    """
+    for attempt in itertools.count(1):
+        try:
+            with engine.begin() as conn:
+                return work(conn)
+        except DBAPIError as e:
+            if attempt > retries or not is_deadlock(e):
+                raise
+            logging.warning(f"Deadlock, retrying transaction ({attempt}/{retries})")
+            time.sleep(random.uniform(0.05, 0.2) * attempt)
+
+
+def warm_up(connections: int = 2) -> None:
+    """
+    Заранее открывает соединения пула, чтобы первые запросы пользователей
+    не платили за подключение к базе
+
+    Args:
+        connections: Сколько соединений основной базы держать открытыми
+    """
+    opened = []
+    try:
+        for _ in range(max(1, min(connections, ENGINE_OPTIONS["pool_size"]))):
+            opened.append(engine.connect())
+        for index, replica in enumerate(replica_engines):
+            try:
+                opened.append(replica.connect())
+            except Exception as e:
+                # Недоступная реплика не мешает запуску: чтения уйдут в основную базу
+                logging.warning(f"Replica {index} is unavailable: {e}")
+    finally:
+        # Соединения возвращаются в пул открытыми
+        for conn in opened:
+            conn.close()
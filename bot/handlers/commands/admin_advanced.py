@@ -1,12 +1,24 @@
 """
 Расширенные админские команды
 """
+import asyncio
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.filters import Command
 from bot.rbac import Permission, WhitelistStore
 from bot.services.statistics import StatisticsService
 from bot.services.reminders import ReminderService
 from bot.services.archive import ArchiveService
+from bot.services.cache import get_cache_service
+from bot.services.version_cache import get_version_cache
+from bot.middlewares.rbac import get_rejected_users
+
+# Сколько просроченных документов показывать в /overdue_all (сообщение ограничено по длине)
+OVERDUE_LIST_LIMIT = 30
+
+
+def _stale_mark(stats: dict, section: str) -> str:
+    """Пометка для секции, отданной из устаревших данных"""
+    return " <i>(⚠️ данные устарели)</i>" if section in stats.get("stale_sections", []) else ""
 
 
 async def admin_panel_command(message: Message, current_user):
@@ -16,19 +28,16 @@ async def admin_panel_command(message: Message, current_user):
         return
     
     try:
-        # Получаем статистику системы
+        # Получаем статистику системы и напоминаний (секции параллельно)
         stats_service = StatisticsService()
-        stats = stats_service.get_comprehensive_stats()
-        
-        # Получаем статистику напоминаний
-        reminder_service = ReminderService()
-        reminder_stats = reminder_service.get_reminder_stats()
+        stats = await stats_service.gather_comprehensive_stats(include_reminders=True)
+        reminder_stats = stats["reminders"]
         
         text = "🛠️ <b>Админ-панель DocuBot</b>\n\n"
         
         # Общая статистика
         doc_stats = stats["documents"]
-        text += f"📊 <b>Общая статистика:</b>\n"
+        text += f"📊 <b>Общая статистика:</b>{_stale_mark(stats, 'documents')}{_stale_mark(stats, 'reminders')}\n"
         text += f"• Документов: {doc_stats['total_documents']}\n"
         text += f"• За 30 дней: {doc_stats['recent_documents']}\n"
         text += f"• Просрочено: {reminder_stats['overdue_count']}\n"
@@ -36,7 +45,7 @@ async def admin_panel_command(message: Message, current_user):
         
         # Пользователи
         user_stats = stats["users"]
-        text += f"👥 <b>Пользователи:</b>\n"
+        text += f"👥 <b>Пользователи:</b>{_stale_mark(stats, 'users')}\n"
         text += f"• Активных: {user_stats['active_users']}\n"
         role_dist = user_stats['role_distribution']
         text += f"• Сотрудников: {role_dist.get('employee', 0)}\n"
@@ -45,7 +54,7 @@ async def admin_panel_command(message: Message, current_user):
         
         # Хранилище
         storage_stats = stats["storage"]
-        text += f"💾 <b>Хранилище:</b>\n"
+        text += f"💾 <b>Хранилище:</b>{_stale_mark(stats, 'storage')}\n"
         text += f"• Файлов: {storage_stats['total_files']}\n"
         text += f"• Размер: {storage_stats['total_size_mb']:.1f} МБ\n\n"
         
@@ -53,6 +62,7 @@ async def admin_panel_command(message: Message, current_user):
         text += f"🔧 <b>Доступные команды:</b>\n"
         text += f"• <code>/users</code> - управление пользователями\n"
         text += f"• <code>/system_stats</code> - детальная статистика\n"
+        text += f"• <code>/cache_stats</code> - эффективность кэша\n"
         text += f"• <code>/overdue_all</code> - все просроченные документы\n"
         text += f"• <code>/archive_stats</code> - статистика архива\n"
         text += f"• <code>/auto_archive</code> - автоматическая архивация\n"
@@ -124,15 +134,16 @@ async def system_stats_command(message: Message, current_user):
     
     try:
         stats_service = StatisticsService()
-        stats = stats_service.get_comprehensive_stats()
+        stats = await stats_service.gather_comprehensive_stats()
         
         text = "📊 <b>Детальная статистика системы</b>\n\n"
         
         # Документы
         doc_stats = stats["documents"]
-        text += f"📄 <b>Документы:</b>\n"
+        text += f"📄 <b>Документы:</b>{_stale_mark(stats, 'documents')}\n"
         text += f"• Всего: {doc_stats['total_documents']}\n"
         text += f"• За 30 дней: {doc_stats['recent_documents']}\n"
+        text += f"• Версий: {doc_stats['total_versions']}\n"
         
         # Статусы документов
         status_dist = doc_stats['status_distribution']
@@ -161,7 +172,7 @@ async def system_stats_command(message: Message, current_user):
         
         # Workflow
         workflow_stats = stats["workflows"]
-        text += f"\n🔄 <b>Согласования:</b>\n"
+        text += f"\n🔄 <b>Согласования:</b>{_stale_mark(stats, 'workflows')}\n"
         text += f"• Всего workflow: {workflow_stats['total_workflows']}\n"
         text += f"• Просрочено: {workflow_stats['overdue_documents']}\n"
         text += f"• Среднее время: {workflow_stats['average_approval_time_hours']:.1f} ч\n"
@@ -180,7 +191,7 @@ async def system_stats_command(message: Message, current_user):
         
         # Хранилище
         storage_stats = stats["storage"]
-        text += f"\n💾 <b>Хранилище:</b>\n"
+        text += f"\n💾 <b>Хранилище:</b>{_stale_mark(stats, 'storage')}\n"
         text += f"• Файлов: {storage_stats['total_files']}\n"
         text += f"• Размер: {storage_stats['total_size_mb']:.1f} МБ\n"
         
@@ -210,6 +221,69 @@ async def system_stats_command(message: Message, current_user):
         await message.answer(f"❌ Ошибка получения статистики: {e}")
 
 
+def _format_cache_namespace(namespace: str, s: dict) -> str:
+    requests = s.get('hits', 0) + s.get('misses', 0)
+    text = f"<b>{namespace}</b>: попаданий {s.get('hit_rate', 0):.0%} ({s.get('hits', 0)}/{requests})"
+    if s.get('stale_hits'):
+        text += f", устаревших {s['stale_hits']}"
+    text += "\n"
+    if s.get('loads'):
+        text += f"  загрузок {s['loads']}, в среднем {s.get('load_avg_ms', 0):.1f} мс"
+        if 'load_max_ms' in s:
+            text += f", макс. {s['load_max_ms']:.0f} мс"
+        text += "\n"
+    if 'bytes' in s:
+        text += f"  ключей {s.get('entries', 0)}, {s['bytes'] / 1024:.0f} КБ\n"
+    evictions = {reason: n for reason, n in s.get('evictions', {}).items() if n}
+    if evictions:
+        text += "  удалено: " + ", ".join(f"{reason} {n}" for reason, n in sorted(evictions.items())) + "\n"
+    if s.get('invalidations'):
+        text += f"  устарело по событиям: {s['invalidations']}\n"
+    return text
+
+
+async def cache_stats_command(message: Message, current_user):
+    """Статистика кэша по пространствам имён ключей"""
+    if not current_user.has_permission(Permission.VIEW_STATISTICS):
+        await message.answer("❌ У вас нет прав на просмотр статистики.")
+        return
+    
+    try:
+        cache = get_cache_service()
+        stats = cache.get_stats()
+        namespaces = cache.get_namespace_stats()
+        
+        text = f"🗄️ <b>Кэш ({stats['backend']})</b>\n\n"
+        if 'memory_usage' in stats:
+            text += f"Всего: {stats.get('total_entries', 0)} ключей, {stats['memory_usage'] / 2**20:.1f} МБ\n\n"
+        for namespace, ns_stats in sorted(namespaces.items()):
+            text += _format_cache_namespace(namespace, ns_stats)
+        
+        version_stats = get_version_cache().get_stats()
+        hits, misses = version_stats['hits'], version_stats['misses']
+        text += "\n" + _format_cache_namespace("версии документов", {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+            'loads': version_stats['loads'],
+            'load_avg_ms': version_stats['load_avg_ms'],
+            'entries': version_stats['total_entries'],
+            'bytes': version_stats['memory_usage'],
+            **{k: v for k, v in version_stats['namespaces'].get('version', {}).items() if k == 'evictions'},
+        })
+        
+        rejected = get_rejected_users().get_stats()
+        text += "\n🚫 <b>Отказы в доступе:</b>\n"
+        text += f"• Ответов с отказом: {rejected['replied']}\n"
+        text += f"• Отброшено молча: {rejected['dropped']}\n"
+        text += f"• ID в негативном кэше: {rejected['tracked_ids']} из {rejected['max_size']}\n"
+        
+        await message.answer(text, parse_mode="HTML")
+        
+    except Exception as e:
+        await message.answer(f"❌ Ошибка получения статистики кэша: {e}")
+
+
 async def overdue_all_command(message: Message, current_user):
     """Показывает все просроченные документы в системе"""
     if not current_user.has_permission(Permission.VIEW_STATISTICS):
@@ -218,13 +292,19 @@ async def overdue_all_command(message: Message, current_user):
     
     try:
         reminder_service = ReminderService()
-        overdue_docs = reminder_service.get_overdue_documents()
+        overdue_docs = reminder_service.get_overdue_documents(limit=OVERDUE_LIST_LIMIT)
         
         if not overdue_docs:
             await message.answer("✅ В системе нет просроченных документов.")
             return
         
-        text = f"⚠️ <b>Все просроченные документы ({len(overdue_docs)}):</b>\n\n"
+        total = len(overdue_docs)
+        if total == OVERDUE_LIST_LIMIT:
+            total = reminder_service.get_reminder_summary().overdue_count
+        
+        text = f"⚠️ <b>Все просроченные документы ({total}):</b>\n\n"
+        if total > len(overdue_docs):
+            text += f"<i>Показаны {len(overdue_docs)} самых давних</i>\n\n"
         
         for i, doc in enumerate(overdue_docs, 1):
             title = doc.get("title", "Без названия")
@@ -272,7 +352,7 @@ async def user_stats_command(message: Message, current_user):
     
     try:
         stats_service = StatisticsService()
-        user_stats = stats_service.get_user_stats()
+        user_stats = await asyncio.to_thread(stats_service.get_user_stats)
         
         text = "👥 <b>Статистика пользователей</b>\n\n"
         
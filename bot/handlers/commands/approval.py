@@ -3,6 +3,7 @@
 """
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.filters import Command
+from bot.services.cache import UserCache, get_cache_service
 from bot.services.workflow import (
     get_pending_approvals, 
     approve_document, 
@@ -21,9 +22,14 @@ async def pending_approvals_command(message: Message, current_user):
     
     approvals = get_pending_approvals(current_user.telegram_id)
     
+    # Новый список — новая выборка для массовых действий; «согласовать
+    # все» действует только на показанные этапы
+    user_cache = UserCache(get_cache_service())
     if not approvals:
+        user_cache.clear_approval_selection(current_user.telegram_id)
         await message.answer("✅ У вас нет документов, ожидающих согласования.")
         return
+    user_cache.set_approval_selection(current_user.telegram_id, [str(a["workflow_id"]) for a in approvals])
     
     await message.answer(f"📋 <b>Документы для согласования ({len(approvals)}):</b>")
     
@@ -61,10 +67,38 @@ async def pending_approvals_command(message: Message, current_user):
                     text="📄 Подробнее", 
                     callback_data=f"details:{approval['document_id']}"
                 )
+            ],
+            [
+                InlineKeyboardButton(
+                    text="☑️ Выбрать", 
+                    callback_data=f"sel:{approval['workflow_id']}"
+                )
             ]
         ])
         
         await message.answer(text, reply_markup=keyboard, parse_mode="HTML")
+    
+    # Массовые действия над отмеченными (или всеми) документами
+    if len(approvals) > 1:
+        await message.answer(
+            "📦 <b>Массовые действия</b>\n\n"
+            "Отметьте документы кнопкой «☑️ Выбрать» или согласуйте весь список выше.",
+            reply_markup=get_bulk_actions_keyboard(),
+            parse_mode="HTML"
+        )
+
+
+def get_bulk_actions_keyboard() -> InlineKeyboardMarkup:
+    """Клавиатура массовых действий для списка согласований"""
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [
+            InlineKeyboardButton(text="✅ Согласовать выбранные", callback_data="bulk:approve"),
+            InlineKeyboardButton(text="❌ Отклонить выбранные", callback_data="bulk:reject")
+        ],
+        [
+            InlineKeyboardButton(text="✅ Согласовать весь список", callback_data="bulk:approve_all")
+        ]
+    ])
 
 
 async def approval_history_command(message: Message, current_user):
@@ -2,14 +2,19 @@
 Обработчики callback кнопок для системы согласования
 """
 from aiogram.types import CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+from bot.services.cache import UserCache, get_cache_service
 from bot.services.workflow import (
     approve_document, 
     reject_document,
+    decide_documents_bulk,
     get_approval_history,
     get_document_workflow
 )
 from bot.rbac import Permission
 
+# Выборка живёт в кэше и может истечь или быть вытеснена
+SELECTION_EXPIRED_TEXT = "Список устарел. Откройте /pending заново и отметьте документы ещё раз."
+
 
 async def handle_approve_callback(call: CallbackQuery, current_user):
     """Обработчик кнопки 'Согласовать'"""
@@ -84,6 +89,97 @@ async def handle_reject_callback(call: CallbackQuery, current_user):
         await call.answer("❌ Ошибка при отклонении", show_alert=True)
 
 
+async def handle_select_callback(call: CallbackQuery, current_user):
+    """Обработчик кнопки '☑️ Выбрать' - отметка документа для массовых действий"""
+    if not current_user.has_permission(Permission.APPROVE_DOCUMENTS):
+        await call.answer("❌ У вас нет прав на согласование документов.", show_alert=True)
+        return
+    
+    try:
+        _, workflow_id = call.data.split(":", 1)
+    except ValueError:
+        await call.answer("❌ Некорректная ссылка", show_alert=True)
+        return
+    
+    user_cache = UserCache(get_cache_service())
+    selection = user_cache.get_approval_selection(current_user.telegram_id)
+    if selection is None or workflow_id not in selection["shown"]:
+        await call.answer(SELECTION_EXPIRED_TEXT, show_alert=True)
+        return
+    
+    selected = set(selection["selected"])
+    if workflow_id in selected:
+        selected.discard(workflow_id)
+        button_text = "☑️ Выбрать"
+    else:
+        selected.add(workflow_id)
+        button_text = "✔️ Выбрано"
+    user_cache.set_approval_selection(current_user.telegram_id, selection["shown"], selected)
+    
+    # Обновляем только кнопку выбора в клавиатуре документа
+    keyboard = call.message.reply_markup
+    if keyboard:
+        rows = [
+            [
+                InlineKeyboardButton(text=button_text, callback_data=button.callback_data)
+                if button.callback_data == call.data else button
+                for button in row
+            ]
+            for row in keyboard.inline_keyboard
+        ]
+        await call.message.edit_reply_markup(reply_markup=InlineKeyboardMarkup(inline_keyboard=rows))
+    
+    await call.answer(f"Выбрано документов: {len(selected)}")
+
+
+async def handle_bulk_callback(call: CallbackQuery, current_user):
+    """
+    Обработчик массовых действий: согласовать/отклонить выбранные или
+    согласовать весь показанный список (этапы, пришедшие после показа
+    списка, не затрагиваются)
+    """
+    _, action = call.data.split(":", 1)
+    decision = "rejected" if action == "reject" else "approved"
+    
+    permission = Permission.REJECT_DOCUMENTS if decision == "rejected" else Permission.APPROVE_DOCUMENTS
+    if not current_user.has_permission(permission):
+        await call.answer("❌ У вас нет прав на это действие.", show_alert=True)
+        return
+    
+    user_cache = UserCache(get_cache_service())
+    selection = user_cache.get_approval_selection(current_user.telegram_id)
+    if selection is None:
+        await call.answer(SELECTION_EXPIRED_TEXT, show_alert=True)
+        return
+    
+    workflow_ids = list(selection["shown"] if action == "approve_all" else selection["selected"])
+    if not workflow_ids:
+        await call.answer("Нет выбранных документов. Отметьте их кнопкой «☑️ Выбрать».", show_alert=True)
+        return
+    
+    from bot.rbac import WhitelistStore
+    
+    store = WhitelistStore("access/whitelist.csv")
+    comment = "Отклонено пользователем" if decision == "rejected" else "Согласовано пользователем"
+    processed = await decide_documents_bulk(
+        [str(workflow_id) for workflow_id in workflow_ids],
+        current_user.telegram_id,
+        decision,
+        comment,
+        bot=call.bot,
+        whitelist_store=store
+    )
+    user_cache.clear_approval_selection(current_user.telegram_id)
+    
+    verb = "Согласовано" if decision == "approved" else "Отклонено"
+    await call.answer(f"{verb}: {processed}")
+    await call.message.edit_text(
+        f"{'✅' if decision == 'approved' else '❌'} <b>{verb} документов: {processed}</b>\n\n"
+        "Авторы получат по одному уведомлению со списком документов.",
+        parse_mode="HTML"
+    )
+
+
 async def handle_history_callback(call: CallbackQuery, current_user):
     """Обработчик кнопки 'История'"""
     if not current_user.has_permission(Permission.VIEW_DOCUMENTS):
@@ -1,13 +1,42 @@
 """
 Команды для работы с архивом документов
 """
+import asyncio
+import html
+import time
+from typing import Optional
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.filters import Command
+from bot.db.ids import short_id
 from bot.services.archive import ArchiveService
+from bot.services.repo import find_document_ids
 from bot.rbac import Permission
 from datetime import datetime
 
 
+async def resolve_document_id(message: Message, ref: str) -> Optional[str]:
+    """
+    Полный ID документа по введённому пользователем (префикс короткого ID
+    или полный UUID); при неудаче отвечает пользователю и возвращает None
+    """
+    document_ids = find_document_ids(ref)
+    if not document_ids:
+        await message.answer(
+            f"❌ Документ <code>{html.escape(ref)}</code> не найден.\n"
+            "Укажите ID из ответа бота (не короче 4 символов).",
+            parse_mode="HTML"
+        )
+        return None
+    if len(document_ids) > 1:
+        await message.answer(
+            f"⚠️ ID <code>{html.escape(ref)}</code> подходит к нескольким документам.\n"
+            "Укажите больше символов ID.",
+            parse_mode="HTML"
+        )
+        return None
+    return document_ids[0]
+
+
 async def archive_command(message: Message, current_user):
     """Команда архивации документа"""
     try:
@@ -27,7 +56,9 @@ async def archive_command(message: Message, current_user):
             )
             return
         
-        document_id = args[0]
+        document_id = await resolve_document_id(message, args[0])
+        if not document_id:
+            return
         reason = " ".join(args[1:]) if len(args) > 1 else None
         
         archive_service = ArchiveService()
@@ -42,7 +73,7 @@ async def archive_command(message: Message, current_user):
         if success:
             await message.answer(
                 f"✅ <b>Документ заархивирован</b>\n\n"
-                f"🆔 ID: <code>{document_id}</code>\n"
+                f"🆔 ID: <code>{short_id(document_id)}</code>\n"
                 f"📦 Статус: Архивирован\n"
                 f"💬 Причина: {reason or 'Не указана'}",
                 parse_mode="HTML"
@@ -82,7 +113,9 @@ async def unarchive_command(message: Message, current_user):
             )
             return
         
-        document_id = args[0]
+        document_id = await resolve_document_id(message, args[0])
+        if not document_id:
+            return
         
         archive_service = ArchiveService()
         
@@ -95,7 +128,7 @@ async def unarchive_command(message: Message, current_user):
         if success:
             await message.answer(
                 f"✅ <b>Документ разархивирован</b>\n\n"
-                f"🆔 ID: <code>{document_id}</code>\n"
+                f"🆔 ID: <code>{short_id(document_id)}</code>\n"
                 f"📦 Статус: Одобрен",
                 parse_mode="HTML"
             )
@@ -233,11 +266,41 @@ async def auto_archive_command(message: Message, current_user):
                 return
         
         archive_service = ArchiveService()
+        status_message = await message.answer("⏳ Автоматическая архивация запущена...")
         
-        # Выполняем автоматическую архивацию
-        archived_count = archive_service.auto_archive_old_documents(days_threshold)
+        loop = asyncio.get_running_loop()
+        # «запущена» только что отправлено: первое обновление — через 3 с
+        last_report = time.monotonic()
+        progress_edits = []
         
-        await message.answer(
+        def report_progress(archived_total: int, batch_no: int) -> None:
+            # Вызывается из рабочего потока; обновляем сообщение не чаще раза в 3 с
+            nonlocal last_report
+            if time.monotonic() - last_report < 3:
+                return
+            last_report = time.monotonic()
+            progress_edits.append(asyncio.run_coroutine_threadsafe(
+                status_message.edit_text(
+                    f"⏳ Архивация: {archived_total} документов (пачек: {batch_no})..."
+                ),
+                loop
+            ))
+        
+        # Выполняем автоматическую архивацию пачками в отдельном потоке
+        archived_count = await asyncio.to_thread(
+            archive_service.auto_archive_old_documents,
+            days_threshold,
+            progress_callback=report_progress
+        )
+        
+        # Итог должен лечь после всех промежуточных правок, иначе его
+        # может перезаписать запоздавший «⏳ Архивация...»
+        await asyncio.gather(
+            *(asyncio.wrap_future(edit) for edit in progress_edits),
+            return_exceptions=True
+        )
+        
+        await status_message.edit_text(
             f"✅ <b>Автоматическая архивация завершена</b>\n\n"
             f"📦 Заархивировано документов: {archived_count}\n"
             f"📅 Порог: старше {days_threshold} дней\n"
@@ -1,5 +1,6 @@
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 from bot.services.repo import list_user_documents
+from bot.services.version_cache import get_version_cache
 
 
 async def my_docs_command(message: Message, current_user):
@@ -9,6 +10,9 @@ async def my_docs_command(message: Message, current_user):
         await message.answer("У вас пока нет документов.")
         return
 
+    # Метаданные версий уже прочитаны: кнопки «скачать» обойдутся без запроса
+    get_version_cache().prime(docs)
+
     # Формируем единое сообщение со списком документов
     text = "📄 <b>Ваши документы:</b>\n\n"
     keyboard_buttons = []
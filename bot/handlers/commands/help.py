@@ -61,6 +61,7 @@ async def help_command(message: Message, current_user):
             text += "• <code>/admin</code> - главная админ-панель\n"
             text += "• <code>/users</code> - управление пользователями\n"
             text += "• <code>/system_stats</code> - системная статистика\n"
+            text += "• <code>/cache_stats</code> - статистика кэша\n"
             text += "• <code>/overdue_all</code> - все просроченные\n"
             text += "• <code>/user_stats</code> - статистика пользователей\n"
             text += "• <code>/reload_whitelist</code> - перезагрузить whitelist\n"
@@ -156,6 +157,7 @@ async def commands_command(message: Message, current_user):
                 "/admin - главная админ-панель",
                 "/users - управление пользователями",
                 "/system_stats - системная статистика",
+                "/cache_stats - статистика кэша",
                 "/overdue_all - все просроченные",
                 "/user_stats - статистика пользователей",
                 "/reload_whitelist - перезагрузить whitelist",
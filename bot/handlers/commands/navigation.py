@@ -178,10 +178,4 @@ async def handle_reload_whitelist_button(message: Message, current_user):
         await message.answer("❌ Ошибка: store не инициализирован")
         return
     
-    # Принудительно обновляем глобальный store
-    import bot.main
-    if hasattr(bot.main, 'store'):
-        bot.main.store.cache.clear()
-        bot.main.store.reload()
-    
     await reload_whitelist_command(message, current_user, store)
@@ -14,7 +14,7 @@ async def stats_command(message: Message, current_user):
     
     try:
         stats_service = StatisticsService()
-        stats = stats_service.get_comprehensive_stats()
+        stats = await stats_service.gather_comprehensive_stats()
         
         # Формируем сообщение
         text = "📊 <b>Статистика системы DocuBot</b>\n\n"
@@ -24,6 +24,7 @@ async def stats_command(message: Message, current_user):
         text += f"📄 <b>Документы:</b>\n"
         text += f"• Всего: {doc_stats['total_documents']}\n"
         text += f"• За 30 дней: {doc_stats['recent_documents']}\n"
+        text += f"• Версий: {doc_stats['total_versions']}\n"
         
         # Статусы документов
         status_dist = doc_stats['status_distribution']
@@ -61,6 +62,9 @@ async def stats_command(message: Message, current_user):
         text += f"• Файлов: {storage_stats['total_files']}\n"
         text += f"• Размер: {storage_stats['total_size_mb']:.1f} МБ\n"
         
+        if stats["stale_sections"]:
+            text += f"\n⚠️ <i>Устаревшие данные: {', '.join(stats['stale_sections'])}</i>\n"
+        
         await message.answer(text, parse_mode="HTML")
         
     except Exception as e:
@@ -72,33 +76,16 @@ async def my_stats_command(message: Message, current_user):
     try:
         stats_service = StatisticsService()
         
-        # Получаем статистику пользователя
-        from bot.services.repo import list_user_documents
-        from bot.services.workflow import get_approval_history
-        
-        # Документы пользователя
-        user_docs = list_user_documents(message.from_user.id, limit=1000)
-        
-        # Статистика по статусам
-        status_counts = {}
-        for doc in user_docs:
-            status = doc.get('status', 'unknown')
-            status_counts[status] = status_counts.get(status, 0) + 1
-        
-        # История согласований
-        approval_history = []
-        for doc in user_docs:
-            if doc.get('document_id'):
-                history = get_approval_history(doc['document_id'])
-                approval_history.extend(history)
+        # Документы по статусам и действия согласования — одним запросом
+        owner_stats = stats_service.get_owner_stats(message.from_user.id)
         
         # Формируем сообщение
         text = f"📊 <b>Ваша статистика</b>\n\n"
         text += f"👤 <b>Пользователь:</b> {current_user.full_name}\n"
         text += f"🎭 <b>Роль:</b> {current_user.role.value}\n\n"
         
-        text += f"📄 <b>Документы ({len(user_docs)}):</b>\n"
-        for status, count in status_counts.items():
+        text += f"📄 <b>Документы ({owner_stats.total_documents}):</b>\n"
+        for status, count in owner_stats.status_counts.items():
             status_emoji = {
                 'draft': '📝',
                 'in_review': '🔄', 
@@ -108,20 +95,15 @@ async def my_stats_command(message: Message, current_user):
             }.get(status, '❓')
             text += f"• {status_emoji} {status}: {count}\n"
         
-        if approval_history:
-            text += f"\n🔄 <b>Согласования ({len(approval_history)}):</b>\n"
-            # Группируем по действиям
-            action_counts = {}
-            for item in approval_history:
-                action = item.get('action', 'unknown')
-                action_counts[action] = action_counts.get(action, 0) + 1
-            
-            for action, count in action_counts.items():
+        if owner_stats.total_actions:
+            text += f"\n🔄 <b>Согласования ({owner_stats.total_actions}):</b>\n"
+            for action, count in owner_stats.action_counts.items():
                 action_emoji = {
                     'approved': '✅',
                     'rejected': '❌',
                     'commented': '💬',
-                    'delegated': '🔄'
+                    'delegated': '🔄',
+                    'archived': '📦'
                 }.get(action, '❓')
                 text += f"• {action_emoji} {action}: {count}\n"
         
@@ -1,7 +1,12 @@
+import time
+
+_IMPORT_STARTED = time.perf_counter()
+
 import asyncio
 import logging
 from io import BytesIO
 from pathlib import Path
+from typing import Optional
 
 from aiogram import Bot, Dispatcher, F, types
 from aiogram.client.default import DefaultBotProperties
@@ -9,11 +14,14 @@ from aiogram.filters import CommandStart, Command
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, BufferedInputFile
 
 from bot import config
-from bot.config import BOT_TOKEN, WHITELIST_PATH, MAX_FILE_MB, ALLOWED_MIME, ALLOWED_EXT
+from bot.config import BOT_TOKEN, WHITELIST_PATH, MAX_FILE_MB, ALLOWED_MIME, ALLOWED_EXT, DB_WARM_CONNECTIONS, CACHE_COHERENCE, WARM_UP_STATS, CACHE_STATS_LOG_SEC, CACHE_SNAPSHOT_PATH
+from bot.db.ids import short_id
 from bot.db.init_schema import init_schema
+from bot.db.session import warm_up
 from bot.middlewares.rbac import RBACMiddleware
 from bot.rbac import WhitelistStore, Role
-from bot.services.repo import get_version_info_by_id, ensure_file, create_document, add_version
+from bot.services.repo import ensure_file, create_document, add_version
+from bot.services.version_cache import get_version_info
 from bot.services.storage import get_object_bytes, upload_bytes, presigned_get_url, ensure_bucket
 
 # Импорты из handlers
@@ -26,7 +34,8 @@ from bot.handlers.commands.approval import (
 )
 from bot.handlers.commands.approval_callbacks import (
     handle_approve_callback, handle_reject_callback, 
-    handle_history_callback, handle_details_callback
+    handle_history_callback, handle_details_callback,
+    handle_select_callback, handle_bulk_callback
 )
 
 # Новые импорты для расширенного функционала
@@ -45,7 +54,7 @@ from bot.handlers.commands.reminders import (
 )
 from bot.handlers.commands.admin_advanced import (
     admin_panel_command, users_command, system_stats_command,
-    overdue_all_command, user_stats_command
+    overdue_all_command, user_stats_command, cache_stats_command
 )
 from bot.handlers.commands.help import (
     help_command, commands_command, keep_command, cleanup_command, keyboard_command
@@ -60,34 +69,54 @@ from bot.handlers.commands.navigation import (
     handle_admin_archive_button, handle_reload_whitelist_button
 )
 from bot.services.cleanup import get_cleanup_service
-from bot.services.cache import init_cache_service, cleanup_cache_periodically
+from bot.services.cache import (
+    init_cache_service, cleanup_cache_periodically, refresh_hot_keys_periodically, log_cache_stats_periodically
+)
+from bot.services.coherence import start_cache_coherence
+from bot.services.history import maintain_history_partitions_periodically
+from bot.services.statistics import StatisticsService
+from bot.services.snapshot import save_cache_snapshot, restore_cache_snapshot
+from bot.startup import StartupTimer
 from bot.utils import bytes_to_human, short_type
 
 logging.basicConfig(level=logging.INFO)
 
-bot = Bot(
-    token=BOT_TOKEN,
-    default=DefaultBotProperties(parse_mode="HTML")  # важно для 3.7+
-)
-
-init_schema()
 dp = Dispatcher()
 
-# === RBAC ===
-store = WhitelistStore(WHITELIST_PATH)
-
-# Подключаем проверку для сообщений и колбеков
-dp.message.middleware(RBACMiddleware(store))
-dp.callback_query.middleware(RBACMiddleware(store))
+# Создаются в main(): импорт модуля не обращается к сети, базе и файлам
+bot: Optional[Bot] = None
+store: Optional[WhitelistStore] = None
 
 # === КЛАВИАТУРЫ ===
 # Клавиатуры вынесены в bot/handlers/keyboards/main.py
 
 
+def create_bot() -> Bot:
+    """Создаёт клиент Telegram"""
+    return Bot(
+        token=BOT_TOKEN,
+        default=DefaultBotProperties(parse_mode="HTML")  # важно для 3.7+
+    )
+
+
+def setup_rbac() -> WhitelistStore:
+    """Загружает whitelist и подключает проверку доступа для сообщений и колбеков"""
+    whitelist = WhitelistStore(WHITELIST_PATH)
+    whitelist.listen_remote_reloads()
+    dp.message.middleware(RBACMiddleware(whitelist))
+    dp.callback_query.middleware(RBACMiddleware(whitelist))
+    return whitelist
+
+
+def warm_up_database() -> None:
+    """Проверяет версию схемы и заранее открывает соединения пула"""
+    init_schema()
+    warm_up(DB_WARM_CONNECTIONS)
+
+
 async def on_startup() -> None:
-    """Инициализация при запуске бота"""
+    """Инициализация сервисов (соединения уже прогреты в main)"""
     logging.info("Инициализация бота...")
-    ensure_bucket()
     
     # Инициализируем сервис очистки сообщений
     cleanup_service = get_cleanup_service(bot)
@@ -99,6 +128,17 @@ async def on_startup() -> None:
     
     # Запускаем периодическую очистку кэша
     asyncio.create_task(cleanup_cache_periodically(interval=60))
+    # и заблаговременное обновление востребованной статистики
+    asyncio.create_task(refresh_hot_keys_periodically())
+    if CACHE_STATS_LOG_SEC > 0:
+        asyncio.create_task(log_cache_stats_periodically(CACHE_STATS_LOG_SEC))
+    
+    # Сбросы кэша между экземплярами бота
+    if CACHE_COHERENCE:
+        start_cache_coherence()
+    
+    # Секции истории согласований: будущие месяцы и политика хранения
+    asyncio.create_task(maintain_history_partitions_periodically())
     
     logging.info("Бот готов к работе!")
 
@@ -252,7 +292,7 @@ async def on_doc(message: Message):
     await message.answer(
         "✅ <b>Документ успешно сохранен!</b>\n\n"
         f"📄 <b>Название:</b> {doc.file_name}\n"
-        f"🆔 <b>ID документа:</b> <code>{doc_id[:8]}</code>\n"
+        f"🆔 <b>ID документа:</b> <code>{short_id(doc_id)}</code>\n"
         f"📊 <b>Версия:</b> v{ver_no}\n"
         f"📁 <b>Тип:</b> {simple_type}\n"
         f"💾 <b>Размер:</b> {human_size}\n"
@@ -291,7 +331,7 @@ async def on_download_btn(call: types.CallbackQuery):
         await call.answer("Некорректная ссылка", show_alert=True)
         return
 
-    info = get_version_info_by_id(version_id)     # <-- передаём строковый UUID
+    info = get_version_info(version_id)     # <-- передаём строковый UUID; кэш без TTL
     if not info:
         await call.answer("Документ не найден", show_alert=True)
         return
@@ -313,6 +353,14 @@ async def on_approve_callback(call: types.CallbackQuery, current_user):
 async def on_reject_callback(call: types.CallbackQuery, current_user):
     await handle_reject_callback(call, current_user)
 
+@dp.callback_query(F.data.startswith("sel:"))
+async def on_select_callback(call: types.CallbackQuery, current_user):
+    await handle_select_callback(call, current_user)
+
+@dp.callback_query(F.data.startswith("bulk:"))
+async def on_bulk_callback(call: types.CallbackQuery, current_user):
+    await handle_bulk_callback(call, current_user)
+
 @dp.callback_query(F.data.startswith("history:"))
 async def on_history_callback(call: types.CallbackQuery, current_user):
     await handle_history_callback(call, current_user)
@@ -410,6 +458,10 @@ async def users_handler(message: Message, current_user):
 async def system_stats_handler(message: Message, current_user):
     await system_stats_command(message, current_user)
 
+@dp.message(Command("cache_stats"))
+async def cache_stats_handler(message: Message, current_user):
+    await cache_stats_command(message, current_user)
+
 @dp.message(Command("overdue_all"))
 async def overdue_all_handler(message: Message, current_user):
     await overdue_all_command(message, current_user)
@@ -539,14 +591,44 @@ async def fallback(message: Message, current_user):
 
 async def main():
     """Основная функция запуска бота с обработкой конфликтов"""
+    global bot, store
+    timer = StartupTimer(_IMPORT_STARTED)
+    timer.mark("import", _IMPORT_STARTED)
     try:
-        # Проверяем конфликты перед запуском
-        if not await check_bot_conflicts():
+        with timer.phase("whitelist"):
+            store = setup_rbac()
+        bot = create_bot()
+        
+        # База, MinIO и Telegram независимы — подключаемся одновременно;
+        # заодно проверяем конфликты с другими экземплярами бота
+        warmed = await timer.run_parallel("warm-up", {
+            "db": asyncio.to_thread(warm_up_database),
+            "minio": asyncio.to_thread(ensure_bucket),
+            "telegram": check_bot_conflicts(),
+        })
+        if not warmed["telegram"]:
             logging.error("Не удалось запустить бота из-за конфликтов")
             return
         
         # Инициализация перед запуском
-        await on_startup()
+        with timer.phase("services"):
+            await on_startup()
+        
+        # Кэш, сохранённый при прошлой остановке (если данные не менялись)
+        if CACHE_SNAPSHOT_PATH:
+            with timer.phase("snapshot"):
+                try:
+                    await asyncio.to_thread(restore_cache_snapshot)
+                except Exception as e:
+                    logging.error(f"Не удалось восстановить снимок кэша: {e}")
+        
+        # Статистика админ-панели считается до приёма обновлений
+        if WARM_UP_STATS:
+            with timer.phase("stats"):
+                not_ready = await StatisticsService().warm_up()
+            if not_ready:
+                logging.warning(f"Статистика досчитывается в фоне: {', '.join(not_ready)}")
+        timer.log()
         
         # Запуск бота с обработкой конфликтов
         await dp.start_polling(
@@ -554,6 +636,13 @@ async def main():
             allowed_updates=dp.resolve_used_update_types(),
             drop_pending_updates=True  # Игнорируем накопившиеся обновления
         )
+        
+        # Штатная остановка: сохраняем прогретый кэш для следующего запуска
+        if CACHE_SNAPSHOT_PATH:
+            try:
+                await asyncio.to_thread(save_cache_snapshot)
+            except Exception as e:
+                logging.error(f"Не удалось сохранить снимок кэша: {e}")
     except Exception as e:
         logging.error(f"Ошибка при запуске бота: {e}")
         if "Conflict" in str(e):
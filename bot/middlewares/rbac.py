@@ -1,12 +1,90 @@
 from aiogram import BaseMiddleware
+from collections import OrderedDict
+import threading
+import time
 from typing import Callable, Dict, Any, Awaitable, Optional
 
+from bot.config import RBAC_REJECT_CACHE_SIZE, RBAC_REJECT_WINDOW_SEC
 from bot.rbac import WhitelistStore, UserEntry
+from bot.services import events
+
+
+class RejectedUsers:
+    """
+    Ограниченный негативный кэш: ID, которым уже отказано в доступе
+
+    Первому обращению отвечаем отказом, повторные в течение window секунд
+    отбрасываются молча — без поиска в whitelist и без запроса к Telegram.
+    Хранится не больше max_size ID (вытесняются давние). Перезагрузка
+    whitelist (в том числе на другом экземпляре) очищает кэш: пользователя
+    могли добавить.
+    """
+
+    def __init__(self, max_size: int = RBAC_REJECT_CACHE_SIZE, window: float = RBAC_REJECT_WINDOW_SEC):
+        self.max_size = max_size
+        self.window = window
+        # telegram_id -> время последнего ответа отказом (time.monotonic())
+        self._replied: "OrderedDict[int, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.replied = 0
+        self.dropped = 0
+        self.evictions = 0
+        events.subscribe(events.Event, self._on_event)
+
+    def should_drop(self, telegram_id: int) -> bool:
+        """True — отказ уже отправлен недавно, обновление отбрасывается молча"""
+        with self._lock:
+            replied_at = self._replied.get(telegram_id)
+            if replied_at is None or time.monotonic() - replied_at >= self.window:
+                return False
+            self.dropped += 1
+            return True
+
+    def mark_replied(self, telegram_id: int) -> None:
+        with self._lock:
+            self._replied[telegram_id] = time.monotonic()
+            self._replied.move_to_end(telegram_id)
+            self.replied += 1
+            while len(self._replied) > self.max_size:
+                self._replied.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._replied.clear()
+
+    def _on_event(self, event: events.Event) -> None:
+        if event.tags & {"whitelist", events.ALL_TAGS}:
+            self.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'replied': self.replied,
+                'dropped': self.dropped,
+                'tracked_ids': len(self._replied),
+                'evictions': self.evictions,
+                'max_size': self.max_size,
+                'window_sec': self.window,
+            }
+
+
+_rejected_users: Optional[RejectedUsers] = None
+
+
+def get_rejected_users() -> RejectedUsers:
+    """Общий негативный кэш всех RBACMiddleware (сообщения и колбеки)"""
+    global _rejected_users
+    if _rejected_users is None:
+        _rejected_users = RejectedUsers()
+    return _rejected_users
+
 
 class RBACMiddleware(BaseMiddleware):
-    def __init__(self, store: WhitelistStore):
+    def __init__(self, store: WhitelistStore, rejected: Optional[RejectedUsers] = None):
         super().__init__()
         self.store = store
+        self.rejected = rejected if rejected is not None else get_rejected_users()
 
     async def __call__(
         self,
@@ -20,9 +98,14 @@ class RBACMiddleware(BaseMiddleware):
         if telegram_id is None:
             return await handler(event, data)
 
+        # уже получившим отказ не отвечаем повторно (дешёвая проверка до whitelist)
+        if self.rejected.should_drop(telegram_id):
+            return None
+
         entry: Optional[UserEntry] = self.store.get(telegram_id)
         if not entry or not entry.is_active:
             # мягко откажем и не пропустим дальше
+            self.rejected.mark_replied(telegram_id)
             answer = getattr(event, "answer", None)
             if callable(answer):
                 await answer("Доступ только для сотрудников. Обратитесь к администратору.")
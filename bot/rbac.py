@@ -4,6 +4,7 @@ from pathlib import Path
 import csv
 from typing import Dict, Optional
 import time
+from bot.services import events
 from bot.services.cache import get_cache_service
 
 class Role(str, Enum):
@@ -124,13 +125,20 @@ class WhitelistStore:
         self.users: Dict[int, UserEntry] = {}
         self.cache = get_cache_service()
         self.last_reload = 0
+        self._listening = False
         self.reload()
         # Сохраняем как глобальный экземпляр
         global _global_store
         _global_store = self
 
-    def reload(self) -> int:
-        """Перезагружает whitelist с принудительной очисткой кэша"""
+    def reload(self, notify: bool = True) -> int:
+        """
+        Перезагружает whitelist с принудительной очисткой кэша
+
+        notify=False — не публиковать WhitelistReloaded (перезагрузка по
+        сообщению другого экземпляра, которое уже разослано)
+        """
+        reloading = self.last_reload > 0 and notify
         # Очищаем кэш принудительно
         cache_key = f"whitelist:{self.path}"
         self.cache.delete(cache_key)
@@ -155,8 +163,29 @@ class WhitelistStore:
             'last_modified': self.last_reload
         }, ttl=600)  # 10 минут
         
+        # Повторная загрузка сбрасывает зависящие от whitelist записи кэша
+        if reloading:
+            events.publish(events.WhitelistReloaded(str(self.path)))
+        
         return len(self.users)
 
+    def listen_remote_reloads(self) -> None:
+        """
+        Перезагружать whitelist по сбросам с других экземпляров (coherence)
+
+        Подписывается только общий store процесса (см. main.setup_rbac):
+        шина держит обработчик до конца работы, а обработчики сами создают
+        WhitelistStore на каждый запрос.
+        """
+        if self._listening:
+            return
+        self._listening = True
+        events.subscribe(events.RemoteInvalidation, self._on_remote_invalidation)
+
+    def _on_remote_invalidation(self, event: events.Event) -> None:
+        if event.tags & {"whitelist", events.ALL_TAGS}:
+            self.reload(notify=False)
+
     def get(self, telegram_id: int) -> Optional[UserEntry]:
         """Получает пользователя с кэшированием"""
         # Проверяем кэш пользователя
@@ -171,7 +200,7 @@ class WhitelistStore:
         
         if user:
             # Кэшируем пользователя отдельно
-            self.cache.set(user_cache_key, user, ttl=300)  # 5 минут
+            self.cache.set(user_cache_key, user, ttl=300, tags=["whitelist"])  # 5 минут
         
         return user
 
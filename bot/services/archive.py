@@ -1,11 +1,25 @@
 """
 Сервис архивации документов
 """
-from typing import List, Dict, Optional
+from dataclasses import dataclass, field, asdict
+from typing import Callable, List, Dict, Optional
 from datetime import datetime, timedelta
-from uuid import uuid4
 from sqlalchemy import text
-from bot.db.session import engine
+from bot.config import AUTO_ARCHIVE_BATCH_SIZE
+from bot.db.ids import new_id
+from bot.db.session import engine, get_read_engine, run_in_transaction
+from bot.services import events
+
+
+@dataclass
+class ArchiveStats:
+    """Сводка по архиву, собранная одним запросом"""
+    total_archived: int = 0
+    by_kind: Dict[str, int] = field(default_factory=dict)
+    by_month: List[Dict] = field(default_factory=list)
+
+    def as_dict(self) -> Dict:
+        return asdict(self)
 
 
 class ArchiveService:
@@ -38,12 +52,15 @@ class ArchiveService:
                 if not user or (user_id != doc_owner and user.role.value != "admin"):
                     return False
                 
-                # Архивируем документ
+                reason = reason or "Документ отправлен в архив"
+                
+                # Архивируем документ: сведения об архивации хранятся в нём же
                 conn.execute(text("""
                     UPDATE documents 
-                    SET status = 'archived', updated_at = now()
+                    SET status = 'archived', updated_at = now(),
+                        archived_at = now(), archived_by = :user_id, archive_reason = :reason
                     WHERE id = :doc_id
-                """), {"doc_id": document_id})
+                """), {"doc_id": document_id, "user_id": user_id, "reason": reason})
                 
                 # Записываем в историю архивации
                 conn.execute(text("""
@@ -51,13 +68,14 @@ class ArchiveService:
                     (id, document_id, approver_tg_id, action, comment)
                     VALUES (:id, :doc_id, :user_id, 'archived', :reason)
                 """), {
-                    "id": str(uuid4()),
+                    "id": new_id(),
                     "doc_id": document_id,
                     "user_id": user_id,
-                    "reason": reason or "Документ отправлен в архив"
+                    "reason": reason
                 })
-                
-                return True
+            
+            events.publish(events.DocumentsArchived((str(document_id),), (doc_owner,)))
+            return True
                 
         except Exception as e:
             print(f"Ошибка архивации документа: {e}")
@@ -82,13 +100,17 @@ class ArchiveService:
                     return False
                 
                 # Разархивируем документ
-                conn.execute(text("""
+                doc_owner = conn.execute(text("""
                     UPDATE documents 
-                    SET status = 'approved', updated_at = now()
+                    SET status = 'approved', updated_at = now(),
+                        archived_at = NULL, archived_by = NULL, archive_reason = NULL
                     WHERE id = :doc_id AND status = 'archived'
-                """), {"doc_id": document_id})
-                
-                return True
+                    RETURNING owner_tg_id
+                """), {"doc_id": document_id}).scalar()
+            
+            if doc_owner is not None:
+                events.publish(events.DocumentUnarchived(str(document_id), doc_owner))
+            return True
                 
         except Exception as e:
             print(f"Ошибка разархивации документа: {e}")
@@ -112,15 +134,14 @@ class ArchiveService:
                     d.updated_at,
                     dv.version_no,
                     dv.id as version_id,
-                    ah.created_at as archived_at,
-                    ah.comment as archive_reason
+                    d.archived_at,
+                    d.archived_by,
+                    d.archive_reason
                 FROM documents d
                 LEFT JOIN document_versions dv ON d.current_version_id = dv.id
-                LEFT JOIN approval_history ah ON d.id = ah.document_id 
-                    AND ah.action = 'archived'
                 WHERE d.owner_tg_id = :user_id 
                   AND d.status = 'archived'
-                ORDER BY ah.created_at DESC
+                ORDER BY d.archived_at DESC
                 LIMIT :limit
             """
             
@@ -145,111 +166,143 @@ class ArchiveService:
                     d.updated_at,
                     dv.version_no,
                     dv.id as version_id,
-                    ah.created_at as archived_at,
-                    ah.comment as archive_reason
+                    d.archived_at,
+                    d.archived_by,
+                    d.archive_reason
                 FROM documents d
                 LEFT JOIN document_versions dv ON d.current_version_id = dv.id
-                LEFT JOIN approval_history ah ON d.id = ah.document_id 
-                    AND ah.action = 'archived'
                 WHERE d.status = 'archived'
-                ORDER BY ah.created_at DESC
+                ORDER BY d.archived_at DESC
                 LIMIT :limit
             """
             
             result = conn.execute(text(sql), {"limit": limit})
             return [dict(row) for row in result.mappings()]
     
-    def get_archive_stats(self) -> Dict:
-        """Получает статистику архива"""
-        with engine.connect() as conn:
-            # Общее количество архивных документов
-            total_archived = conn.execute(text("""
-                SELECT COUNT(*) FROM documents WHERE status = 'archived'
-            """)).scalar()
-            
-            # Архивные документы по типам
-            archived_by_kind = conn.execute(text("""
-                SELECT kind, COUNT(*) as count
-                FROM documents 
+    def get_archive_summary(self) -> ArchiveStats:
+        """Получает сводку по архиву одним запросом по роллапам"""
+        with get_read_engine().connect() as conn:
+            rows = conn.execute(text("""
+                SELECT 
+                    'kind' AS section,
+                    kind::text AS bucket,
+                    GROUPING(kind) AS grp,
+                    SUM(doc_count)::bigint AS count
+                FROM stats_document_counts 
                 WHERE status = 'archived'
-                GROUP BY kind
-            """)).fetchall()
-            
-            # Архивные документы по месяцам
-            archived_by_month = conn.execute(text("""
+                GROUP BY GROUPING SETS ((kind), ())
+                UNION ALL
                 SELECT 
-                    DATE_TRUNC('month', ah.created_at) as month,
-                    COUNT(*) as count
-                FROM documents d
-                JOIN approval_history ah ON d.id = ah.document_id
-                WHERE d.status = 'archived' 
-                  AND ah.action = 'archived'
-                  AND ah.created_at >= NOW() - INTERVAL '12 months'
-                GROUP BY DATE_TRUNC('month', ah.created_at)
-                ORDER BY month
+                    'month',
+                    to_char(month, 'YYYY-MM'),
+                    0,
+                    archived_count
+                FROM stats_archive_monthly
+                WHERE month >= date_trunc('month', NOW() AT TIME ZONE 'UTC')::date - INTERVAL '12 months'
+                  AND archived_count > 0
+                ORDER BY section, bucket
             """)).fetchall()
-            
-            return {
-                "total_archived": total_archived,
-                "by_kind": {row[0]: row[1] for row in archived_by_kind},
-                "by_month": [
-                    {
-                        "month": row[0].strftime("%Y-%m"),
-                        "count": row[1]
-                    }
-                    for row in archived_by_month
-                ]
-            }
+        
+        stats = ArchiveStats()
+        for section, bucket, grp, count in rows:
+            if section == "month":
+                stats.by_month.append({"month": bucket, "count": count})
+            elif grp == 1:
+                stats.total_archived = count or 0
+            elif count:
+                stats.by_kind[bucket] = count
+        
+        return stats
+    
+    def get_archive_stats(self) -> Dict:
+        """Получает статистику архива"""
+        return self.get_archive_summary().as_dict()
     
-    def auto_archive_old_documents(self, days_threshold: int = 365) -> int:
+    def auto_archive_old_documents(
+        self,
+        days_threshold: int = 365,
+        batch_size: Optional[int] = None,
+        max_batches: Optional[int] = None,
+        progress_callback: Optional[Callable[[int, int], None]] = None
+    ) -> int:
         """
-        Автоматически архивирует старые документы
+        Автоматически архивирует старые документы пачками
+        
+        Каждая пачка — отдельная короткая транзакция: UPDATE ... RETURNING
+        по пачке кандидатов (FOR UPDATE SKIP LOCKED) и одна многострочная
+        вставка истории. Уже закоммиченные пачки больше не подходят под
+        условие отбора, поэтому прерванный запуск продолжается повторным
+        вызовом с тем же порогом. Пачка, прерванная взаимоблокировкой,
+        повторяется (run_in_transaction).
         
         Args:
             days_threshold: Количество дней для автоматической архивации
+            batch_size: Размер пачки (по умолчанию AUTO_ARCHIVE_BATCH_SIZE)
+            max_batches: Ограничение числа пачек за вызов (None — до конца)
+            progress_callback: Вызывается после каждой пачки с
+                (всего заархивировано, номер пачки)
             
         Returns:
             Количество заархивированных документов
         """
-        try:
-            cutoff_date = datetime.now() - timedelta(days=days_threshold)
-            
-            with engine.begin() as conn:
-                # Находим старые одобренные документы
-                old_docs = conn.execute(text("""
+        cutoff_date = datetime.now() - timedelta(days=days_threshold)
+        batch_size = batch_size or AUTO_ARCHIVE_BATCH_SIZE
+        reason = f"Автоматическая архивация (старше {days_threshold} дней)"
+        archived_count = 0
+        batch_no = 0
+        
+        def archive_batch(conn) -> list:
+            rows = conn.execute(text("""
+                WITH batch AS (
                     SELECT id FROM documents 
                     WHERE status = 'approved' 
                       AND created_at < :cutoff_date
-                """), {"cutoff_date": cutoff_date}).fetchall()
+                    ORDER BY created_at, id
+                    LIMIT :batch_size
+                    FOR UPDATE SKIP LOCKED
+                )
+                UPDATE documents d
+                SET status = 'archived', updated_at = now(),
+                    archived_at = now(), archived_by = 0, archive_reason = :reason
+                FROM batch
+                WHERE d.id = batch.id
+                RETURNING d.id, d.owner_tg_id
+            """), {"cutoff_date": cutoff_date, "batch_size": batch_size, "reason": reason}).fetchall()
+            
+            if rows:
+                # История — одной многострочной вставкой на пачку
+                conn.execute(text("""
+                    INSERT INTO approval_history 
+                    (id, document_id, approver_tg_id, action, comment)
+                    SELECT h.id, h.document_id, 0, 'archived', :reason
+                    FROM unnest(CAST(:ids AS uuid[]), CAST(:doc_ids AS uuid[])) AS h(id, document_id)
+                """), {
+                    "ids": [new_id() for _ in rows],
+                    "doc_ids": [str(row[0]) for row in rows],
+                    "reason": reason
+                })
+            return rows
+        
+        try:
+            while max_batches is None or batch_no < max_batches:
+                rows = run_in_transaction(archive_batch)
+                if not rows:
+                    break
                 
-                archived_count = 0
+                archived_count += len(rows)
+                batch_no += 1
+                events.publish(events.DocumentsArchived(
+                    tuple(str(row[0]) for row in rows), tuple({row[1] for row in rows})
+                ))
                 
-                for doc in old_docs:
-                    doc_id = doc[0]
-                    
-                    # Архивируем документ
-                    conn.execute(text("""
-                        UPDATE documents 
-                        SET status = 'archived', updated_at = now()
-                        WHERE id = :doc_id
-                    """), {"doc_id": doc_id})
-                    
-                    # Записываем в историю
-                    conn.execute(text("""
-                        INSERT INTO approval_history 
-                        (id, document_id, approver_tg_id, action, comment)
-                        VALUES (:id, :doc_id, :user_id, 'archived', :reason)
-                    """), {
-                        "id": str(uuid4()),
-                        "doc_id": doc_id,
-                        "user_id": 0,  # Системная архивация
-                        "reason": f"Автоматическая архивация (старше {days_threshold} дней)"
-                    })
-                    
-                    archived_count += 1
+                if progress_callback:
+                    progress_callback(archived_count, batch_no)
                 
-                return archived_count
+                if len(rows) < batch_size:
+                    break
+            
+            return archived_count
                 
         except Exception as e:
             print(f"Ошибка автоматической архивации: {e}")
-            return 0
+            return archived_count
@@ -2,32 +2,92 @@
 Сервис кэширования для DocuBot
 """
 import asyncio
+import hashlib
+import inspect
+import threading
 import time
-from typing import Any, Dict, Optional, Callable, Union
+import uuid
+from typing import Any, Awaitable, Dict, Iterable, Optional, Callable, Set, Tuple, Union
 from functools import wraps
 import logging
 
+from bot.config import STATS_CACHE_TTL, CACHE_REFRESH_INTERVAL, CACHE_REFRESH_AHEAD, CACHE_HOT_SEC, CACHE_STATS_LOG_SEC
+from bot.services import events
+from bot.services.cache_backends import CacheBackend, MemoryBackend, create_backend, key_namespace
+
+
+class _NamespaceCounters:
+    """Обращения и загрузки одного пространства имён ключей"""
+    __slots__ = ("hits", "stale_hits", "misses", "loads", "load_seconds", "load_max_seconds", "invalidations")
+
+    def __init__(self):
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.load_seconds = 0.0
+        self.load_max_seconds = 0.0
+        self.invalidations = 0
+
+
+# Ключи токенов версий тегов
+TAG_VERSION_PREFIX = "tagver:"
+
+
+class _Tagged:
+    """Значение записи с тегами и токенами тегов на момент загрузки"""
+    __slots__ = ("value", "tags", "tokens")
+
+    def __init__(self, value: Any, tags: Tuple[str, ...], tokens: Tuple[str, ...]):
+        self.value = value
+        self.tags = tags
+        self.tokens = tokens
+
 
 class CacheService:
-    """Сервис для кэширования данных"""
+    """
+    Сервис для кэширования данных
+
+    Данные лежат в подключаемом хранилище (bot/services/cache_backends.py):
+    в памяти процесса, в общем Redis или в памяти поверх Redis.
+    
+    Записи можно пометить тегами (см. bot/services/events.py): сервис
+    подписан на шину событий и по событию сбрасывает записи с его тегами,
+    поэтому TTL ограничивает лишь данные, меняющиеся без событий.
+    
+    Версия тега — случайный токен в том же хранилище (ключ tagver:<тег>),
+    а запись хранит токены своих тегов на момент загрузки. Сброс тега
+    меняет токен, и записи со старым токеном читаются как промах. Индекс
+    тег -> ключи не нужен, а при общем хранилище (redis/near) сброс виден
+    всем экземплярам, в том числе прочитавшим запись, которую записал
+    другой процесс.
     
-    def __init__(self, default_ttl: int = 300):
+    Попадания, промахи и загрузки считаются по пространствам имён ключей
+    (user:, stats:, whitelist: ...), см. get_namespace_stats.
+    """
+    
+    def __init__(self, default_ttl: int = 300, backend: Optional[CacheBackend] = None):
         """
         Инициализация сервиса кэширования
         
         Args:
             default_ttl: Время жизни кэша по умолчанию в секундах
+            backend: Хранилище (по умолчанию — из CACHE_BACKEND)
         """
-        self._cache: Dict[str, Dict[str, Any]] = {}
+        self.backend = backend if backend is not None else create_backend()
         self.default_ttl = default_ttl
         self.logger = logging.getLogger(__name__)
+        self._counters: Dict[str, _NamespaceCounters] = {}
+        self._counters_lock = threading.Lock()
+        events.subscribe(events.Event, self._on_event)
     
-    def _is_expired(self, cache_entry: Dict[str, Any]) -> bool:
-        """Проверяет, истек ли срок действия кэша"""
-        if 'expires_at' not in cache_entry:
-            return True
-        
-        return time.time() > cache_entry['expires_at']
+    def _ns_counters(self, key: str) -> _NamespaceCounters:
+        """Счётчики пространства имён ключа (вызывается под _counters_lock)"""
+        namespace = key_namespace(key)
+        counters = self._counters.get(namespace)
+        if counters is None:
+            counters = self._counters[namespace] = _NamespaceCounters()
+        return counters
     
     def get(self, key: str) -> Optional[Any]:
         """
@@ -39,18 +99,42 @@ class CacheService:
         Returns:
             Значение из кэша или None если не найдено/истекло
         """
-        if key not in self._cache:
-            return None
-        
-        cache_entry = self._cache[key]
-        
-        if self._is_expired(cache_entry):
-            del self._cache[key]
-            return None
-        
-        return cache_entry['value']
+        value = self.backend.get(key)
+        invalidated = isinstance(value, _Tagged) and value.tokens != self._current_tokens(value.tags)
+        if invalidated:
+            # Тег сброшен после загрузки: запись устарела во всех процессах
+            self.backend.delete_local(key)
+            value = None
+        with self._counters_lock:
+            counters = self._ns_counters(key)
+            if value is None:
+                counters.misses += 1
+                counters.invalidations += invalidated
+            else:
+                counters.hits += 1
+        return value.value if isinstance(value, _Tagged) else value
+    
+    def record_load(self, key: str, seconds: float) -> None:
+        """Учитывает вычисление значения для ключа (промах, который загрузили)"""
+        with self._counters_lock:
+            counters = self._ns_counters(key)
+            counters.loads += 1
+            counters.load_seconds += seconds
+            counters.load_max_seconds = max(counters.load_max_seconds, seconds)
     
-    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+    def record_stale_hit(self, key: str) -> None:
+        """Учитывает отдачу устаревшего значения (stale-while-revalidate)"""
+        with self._counters_lock:
+            self._ns_counters(key).stale_hits += 1
+    
+    def set(
+        self,
+        key: str,
+        value: Any,
+        ttl: Optional[int] = None,
+        tags: Iterable[str] = (),
+        since: Optional[Tuple[str, ...]] = None,
+    ) -> None:
         """
         Сохраняет значение в кэш
         
@@ -58,18 +142,60 @@ class CacheService:
             key: Ключ кэша
             value: Значение для сохранения
             ttl: Время жизни в секундах (по умолчанию используется default_ttl)
+            tags: Теги, по которым запись сбрасывается событиями
+            since: tag_versions(tags), снятые до чтения данных: если теги
+                с тех пор сбрасывались, значение могло устареть и не сохраняется
         """
         ttl = ttl or self.default_ttl
-        expires_at = time.time() + ttl
-        
-        self._cache[key] = {
-            'value': value,
-            'expires_at': expires_at,
-            'created_at': time.time()
-        }
-        
+        tags = tuple(tags)
+        if tags:
+            if since is None:
+                since = self.tag_versions(tags)
+            elif since != self._current_tokens(tags):
+                self.logger.debug(f"Skip caching '{key}': invalidated while loading")
+                return
+            # Токены — снятые до загрузки: сброс, случившийся между проверкой
+            # и записью, всё равно сделает запись промахом
+            value = _Tagged(value, tags, since)
+        self.backend.set(key, value, ttl)
         self.logger.debug(f"Cached key '{key}' with TTL {ttl}s")
     
+    def _current_tokens(self, tags: Tuple[str, ...]) -> Tuple[Optional[str], ...]:
+        """Токены тегов из хранилища (None — тег не создан или вытеснен)"""
+        return tuple(self.backend.get(TAG_VERSION_PREFIX + tag) for tag in tags)
+    
+    def tag_versions(self, tags: Iterable[str]) -> Tuple[str, ...]:
+        """Текущие версии тегов (для параметра since метода set)"""
+        tags = tuple(tags)
+        tokens = list(self._current_tokens(tags))
+        for i, tag in enumerate(tags):
+            if tokens[i] is None:
+                # Одновременная инициализация в двух процессах оставит один
+                # из токенов; записи с другим станут лишь лишним промахом
+                tokens[i] = uuid.uuid4().hex
+                self.backend.set(TAG_VERSION_PREFIX + tag, tokens[i], float("inf"))
+        return tuple(tokens)
+    
+    def invalidate_tags(self, *tags: str) -> None:
+        """Сбрасывает записи с любым из тегов (во всех процессах общего хранилища)"""
+        for tag in tags:
+            self.backend.set(TAG_VERSION_PREFIX + tag, uuid.uuid4().hex, float("inf"))
+        self.logger.debug(f"Invalidated tags {sorted(tags)}")
+    
+    def _on_event(self, event: events.Event) -> None:
+        if events.ALL_TAGS in event.tags:
+            # Полная пересинхронизация: общие данные уже согласованы,
+            # сбрасываются только копии этого процесса
+            self.backend.clear_local()
+            self.logger.info("Local cache resynchronized")
+        elif isinstance(event, events.RemoteInvalidation):
+            # Токены уже сменил экземпляр-источник; убираем только их
+            # локальные копии, чтобы не сбрасывать теги повторно
+            for tag in event.tags:
+                self.backend.delete_local(TAG_VERSION_PREFIX + tag)
+        elif event.tags:
+            self.invalidate_tags(*event.tags)
+    
     def delete(self, key: str) -> bool:
         """
         Удаляет значение из кэша
@@ -80,14 +206,11 @@ class CacheService:
         Returns:
             True если ключ был удален, False если не найден
         """
-        if key in self._cache:
-            del self._cache[key]
-            return True
-        return False
+        return self.backend.delete(key)
     
     def clear(self) -> None:
         """Очищает весь кэш"""
-        self._cache.clear()
+        self.backend.clear()
         self.logger.info("Cache cleared")
     
     def cleanup_expired(self) -> int:
@@ -97,36 +220,71 @@ class CacheService:
         Returns:
             Количество удаленных записей
         """
-        expired_keys = []
-        for key, cache_entry in self._cache.items():
-            if self._is_expired(cache_entry):
-                expired_keys.append(key)
-        
-        for key in expired_keys:
-            del self._cache[key]
-        
-        if expired_keys:
-            self.logger.debug(f"Cleaned up {len(expired_keys)} expired cache entries")
-        
-        return len(expired_keys)
+        removed = self.backend.cleanup_expired()
+        if removed:
+            self.logger.debug(f"Cleaned up {removed} expired cache entries")
+        return removed
     
     def get_stats(self) -> Dict[str, Any]:
         """
-        Возвращает статистику кэша
+        Возвращает статистику кэша (без обхода записей)
         
         Returns:
             Словарь со статистикой
         """
-        total_entries = len(self._cache)
-        expired_entries = sum(1 for entry in self._cache.values() if self._is_expired(entry))
-        active_entries = total_entries - expired_entries
+        return {'backend': self.backend.name, **self.backend.get_stats()}
+    
+    def export_entries(self, namespaces: Iterable[str]) -> list:
+        """
+        Записи пространств имён для снимка (bot/services/snapshot.py):
+        (ключ, значение, оставшийся TTL) вместе с токенами тегов. Пусто,
+        если хранилище не локальное — общий Redis переживает перезапуск и сам.
+        """
+        if not isinstance(self.backend, MemoryBackend):
+            return []
+        return self.backend.export_entries([*namespaces, key_namespace(TAG_VERSION_PREFIX)])
+    
+    def import_entries(self, entries: Iterable[tuple], elapsed: float = 0.0) -> int:
+        """Восстанавливает записи export_entries; elapsed — сколько прошло с экспорта"""
+        restored = 0
+        for key, value, ttl in entries:
+            ttl -= elapsed
+            if ttl <= 0:
+                continue
+            # Уже созданный токен не заменяется: записи снимка с этим тегом
+            # станут промахом, но свежие записи процесса не устареют
+            if key.startswith(TAG_VERSION_PREFIX) and self.backend.get(key) is not None:
+                continue
+            self.backend.set(key, value, ttl)
+            restored += 1
+        return restored
+    
+    def get_namespace_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Статистика по пространствам имён ключей
         
-        return {
-            'total_entries': total_entries,
-            'active_entries': active_entries,
-            'expired_entries': expired_entries,
-            'memory_usage': len(str(self._cache))
-        }
+        Returns:
+            Пространство имён -> hits, stale_hits, misses, hit_rate, loads,
+            load_avg_ms, load_max_ms, invalidations, а для локального
+            хранилища ещё entries, bytes и evictions (по причинам)
+        """
+        with self._counters_lock:
+            result = {
+                namespace: {
+                    'hits': c.hits,
+                    'stale_hits': c.stale_hits,
+                    'misses': c.misses,
+                    'hit_rate': c.hits / (c.hits + c.misses) if c.hits + c.misses else 0.0,
+                    'loads': c.loads,
+                    'load_avg_ms': c.load_seconds * 1000 / c.loads if c.loads else 0.0,
+                    'load_max_ms': c.load_max_seconds * 1000,
+                    'invalidations': c.invalidations,
+                }
+                for namespace, c in self._counters.items()
+            }
+        for namespace, usage in self.backend.get_stats().get('namespaces', {}).items():
+            result.setdefault(namespace, {}).update(usage)
+        return result
     
     def get_or_set(self, key: str, factory: Callable[[], Any], ttl: Optional[int] = None) -> Any:
         """
@@ -144,60 +302,285 @@ class CacheService:
         if cached_value is not None:
             return cached_value
         
+        started = time.perf_counter()
         value = factory()
+        self.record_load(key, time.perf_counter() - started)
         self.set(key, value, ttl)
         return value
 
 
-def cached(ttl: int = 300, key_prefix: str = ""):
+# Ключи длиннее этого заменяются хэшем аргументов
+MAX_KEY_ARGS_LEN = 64
+
+
+def make_cache_key(key_prefix: str, func: Callable, args: tuple, kwargs: dict) -> str:
+    """
+    Стабильный ключ кэша: префикс, имя функции и repr аргументов
+    (длинные — в виде blake2b). Ключ не зависит от PYTHONHASHSEED и
+    одинаков во всех процессах.
+    """
+    name = f"{key_prefix}{func.__qualname__}"
+    if not args and not kwargs:
+        return name
+    part = repr(args) if not kwargs else repr((args, sorted(kwargs.items())))
+    if len(part) > MAX_KEY_ARGS_LEN:
+        part = hashlib.blake2b(part.encode("utf-8"), digest_size=16).hexdigest()
+    return f"{name}:{part}"
+
+
+def _is_method(func: Callable) -> bool:
+    """Первый параметр — self/cls: он не участвует в ключе"""
+    params = list(inspect.signature(func).parameters)
+    return bool(params) and params[0] in ("self", "cls")
+
+
+class _Flight:
+    """Вычисление, которое ждут параллельные потоки с тем же ключом"""
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+_sync_flights: Dict[str, _Flight] = {}
+_sync_flights_lock = threading.Lock()
+_async_flights: Dict[str, "asyncio.Future"] = {}
+
+
+def _single_flight_sync(key: str, load: Callable[[], Any]) -> Any:
+    """Выполняет load один раз на ключ; остальные потоки ждут его результата"""
+    with _sync_flights_lock:
+        flight = _sync_flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _sync_flights[key] = _Flight()
+    
+    if not leader:
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+    
+    try:
+        flight.result = load()
+        return flight.result
+    except BaseException as e:
+        flight.error = e
+        raise
+    finally:
+        with _sync_flights_lock:
+            del _sync_flights[key]
+        flight.done.set()
+
+
+async def _single_flight_async(key: str, load: Callable[[], Awaitable[Any]]) -> Any:
+    """Асинхронный вариант: параллельные корутины ждут одну загрузку"""
+    future = _async_flights.get(key)
+    if future is not None:
+        # shield: отмена ожидающего не отменяет общую загрузку
+        return await asyncio.shield(future)
+    
+    future = asyncio.get_running_loop().create_future()
+    _async_flights[key] = future
+    try:
+        result = await load()
+        future.set_result(result)
+        return result
+    except BaseException as e:
+        future.set_exception(e)
+        # ошибку получат ожидающие; для самого future она уже «прочитана»
+        future.exception()
+        raise
+    finally:
+        del _async_flights[key]
+
+
+class _Stale:
+    """
+    Значение записи stale-while-revalidate: после fresh_until (time.time(),
+    одинаковое для всех процессов общего кэша) оно ещё отдаётся, но
+    запускает фоновое обновление
+    """
+    __slots__ = ("value", "fresh_until")
+
+    def __init__(self, value: Any, fresh_until: float):
+        self.value = value
+        self.fresh_until = fresh_until
+
+
+class _HotKey:
+    """Ключ stale-while-revalidate, который обновляет планировщик"""
+    __slots__ = ("load", "is_async", "last_used")
+
+    def __init__(self, load: Callable[[], Any], is_async: bool):
+        self.load = load
+        self.is_async = is_async
+        self.last_used = time.monotonic()
+
+
+_hot_keys: Dict[str, _HotKey] = {}
+_hot_keys_lock = threading.Lock()
+# Ключи, обновляемые в фоне прямо сейчас
+_refreshing: Set[str] = set()
+_background_tasks: Set["asyncio.Task"] = set()
+
+
+def _touch_hot_key(key: str, load: Callable[[], Any], is_async: bool) -> None:
+    """Запоминает последнее обращение к ключу и способ его пересчитать"""
+    hot = _HotKey(load, is_async)
+    with _hot_keys_lock:
+        _hot_keys[key] = hot
+
+
+def _start_refresh(key: str) -> bool:
+    with _hot_keys_lock:
+        if key in _refreshing:
+            return False
+        _refreshing.add(key)
+        return True
+
+
+def _finish_refresh(key: str) -> None:
+    with _hot_keys_lock:
+        _refreshing.discard(key)
+
+
+def _refresh_in_thread(key: str, load: Callable[[], Any]) -> None:
+    """Обновляет устаревшую запись в фоновом потоке (не больше одного на ключ)"""
+    if not _start_refresh(key):
+        return
+    
+    def run():
+        try:
+            _single_flight_sync(key, load)
+        except Exception as e:
+            logging.error(f"Фоновое обновление кэша '{key}' не удалось: {e}")
+        finally:
+            _finish_refresh(key)
+    
+    threading.Thread(target=run, name="cache-refresh", daemon=True).start()
+
+
+def _refresh_in_task(key: str, load: Callable[[], Awaitable[Any]]) -> None:
+    """Асинхронный вариант: обновление в задаче текущего цикла событий"""
+    if not _start_refresh(key):
+        return
+    
+    async def run():
+        try:
+            await _single_flight_async(key, load)
+        except Exception as e:
+            logging.error(f"Фоновое обновление кэша '{key}' не удалось: {e}")
+        finally:
+            _finish_refresh(key)
+    
+    task = asyncio.get_running_loop().create_task(run())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+def cached(
+    ttl: int = 300,
+    key_prefix: str = "",
+    key_builder: Optional[Callable[..., str]] = None,
+    offload: bool = False,
+    tags: Iterable[str] = (),
+    stale_ttl: int = 0,
+):
     """
     Декоратор для кэширования результатов функций
     
+    Ключ строится из аргументов без self/cls, поэтому новый экземпляр
+    сервиса попадает в тот же кэш. Одновременные промахи по одному ключу
+    выполняют функцию один раз (single-flight), остальные вызовы ждут
+    её результата.
+    
     Args:
         ttl: Время жизни кэша в секундах
         key_prefix: Префикс для ключа кэша
+        key_builder: Своя функция ключа (получает аргументы без self/cls)
+        offload: Для синхронной функции: обёртка становится корутиной,
+            а сама функция выполняется в пуле потоков, не блокируя цикл событий
+        tags: Теги записи: событие с любым из них сбрасывает результат
+        stale_ttl: Stale-while-revalidate: ещё столько секунд после ttl
+            устаревший результат отдаётся сразу, а пересчёт идёт в фоне
+            (один на ключ). Такие ключи, пока к ним обращаются, заранее
+            обновляет refresh_hot_keys_periodically.
     """
+    tags = tuple(tags)
+    
     def decorator(func: Callable) -> Callable:
+        skip = 1 if _is_method(func) else 0
+        
+        def build_key(args: tuple, kwargs: dict) -> str:
+            if key_builder is not None:
+                return f"{key_prefix}{key_builder(*args[skip:], **kwargs)}"
+            return make_cache_key(key_prefix, func, args[skip:], kwargs)
+        
+        def store(cache: CacheService, cache_key: str, result: Any, since: Tuple[str, ...]) -> None:
+            if stale_ttl:
+                value = _Stale(result, time.time() + ttl)
+                cache.set(cache_key, value, ttl + stale_ttl, tags=tags, since=since)
+            else:
+                cache.set(cache_key, result, ttl, tags=tags, since=since)
+        
+        def unwrap(cache: CacheService, cache_key: str, cached_result: Any, refresh: Callable[[], None]) -> Any:
+            if not isinstance(cached_result, _Stale):
+                return cached_result
+            if cached_result.fresh_until <= time.time():
+                cache.record_stale_hit(cache_key)
+                refresh()
+            return cached_result.value
+        
         @wraps(func)
         async def async_wrapper(*args, **kwargs):
-            # Создаем ключ кэша на основе аргументов функции
-            cache_key = f"{key_prefix}{func.__name__}:{hash(str(args) + str(sorted(kwargs.items())))}"
-            
-            # Получаем глобальный экземпляр кэша
+            cache_key = build_key(args, kwargs)
             cache = get_cache_service()
             
-            # Проверяем кэш
+            async def load():
+                since = cache.tag_versions(tags)
+                started = time.perf_counter()
+                if asyncio.iscoroutinefunction(func):
+                    result = await func(*args, **kwargs)
+                else:
+                    result = await asyncio.to_thread(func, *args, **kwargs)
+                cache.record_load(cache_key, time.perf_counter() - started)
+                store(cache, cache_key, result, since)
+                return result
+            
+            if stale_ttl:
+                _touch_hot_key(cache_key, load, is_async=True)
             cached_result = cache.get(cache_key)
             if cached_result is not None:
-                return cached_result
+                return unwrap(cache, cache_key, cached_result, lambda: _refresh_in_task(cache_key, load))
             
-            # Выполняем функцию и кэшируем результат
-            result = await func(*args, **kwargs)
-            cache.set(cache_key, result, ttl)
-            
-            return result
+            return await _single_flight_async(cache_key, load)
         
         @wraps(func)
         def sync_wrapper(*args, **kwargs):
-            # Создаем ключ кэша на основе аргументов функции
-            cache_key = f"{key_prefix}{func.__name__}:{hash(str(args) + str(sorted(kwargs.items())))}"
-            
-            # Получаем глобальный экземпляр кэша
+            cache_key = build_key(args, kwargs)
             cache = get_cache_service()
             
-            # Проверяем кэш
+            def load():
+                since = cache.tag_versions(tags)
+                started = time.perf_counter()
+                result = func(*args, **kwargs)
+                cache.record_load(cache_key, time.perf_counter() - started)
+                store(cache, cache_key, result, since)
+                return result
+            
+            if stale_ttl:
+                _touch_hot_key(cache_key, load, is_async=False)
             cached_result = cache.get(cache_key)
             if cached_result is not None:
-                return cached_result
+                return unwrap(cache, cache_key, cached_result, lambda: _refresh_in_thread(cache_key, load))
             
-            # Выполняем функцию и кэшируем результат
-            result = func(*args, **kwargs)
-            cache.set(cache_key, result, ttl)
-            
-            return result
+            return _single_flight_sync(cache_key, load)
         
         # Возвращаем правильную обертку в зависимости от типа функции
-        if asyncio.iscoroutinefunction(func):
+        if asyncio.iscoroutinefunction(func) or offload:
             return async_wrapper
         else:
             return sync_wrapper
@@ -221,6 +604,10 @@ def init_cache_service(default_ttl: int = 300) -> CacheService:
     """
     Инициализирует глобальный сервис кэширования
     
+    Уже созданный экземпляр (например, при загрузке whitelist) сохраняется,
+    меняется только TTL по умолчанию: иначе ранние пользователи кэша
+    остались бы со своим отдельным хранилищем.
+    
     Args:
         default_ttl: Время жизни кэша по умолчанию в секундах
         
@@ -228,7 +615,10 @@ def init_cache_service(default_ttl: int = 300) -> CacheService:
         Экземпляр сервиса кэширования
     """
     global _cache_service
-    _cache_service = CacheService(default_ttl)
+    if _cache_service is None:
+        _cache_service = CacheService(default_ttl)
+    else:
+        _cache_service.default_ttl = default_ttl
     return _cache_service
 
 
@@ -249,6 +639,83 @@ async def cleanup_cache_periodically(interval: int = 60):
             logging.error(f"Error during cache cleanup: {e}")
 
 
+async def refresh_hot_keys() -> int:
+    """
+    Пересчитывает востребованные ключи stale-while-revalidate до того, как
+    они устареют: запись отсутствует (сброшена событием, вытеснена) или
+    свежей ей осталось меньше CACHE_REFRESH_AHEAD секунд. Ключи, к которым
+    не обращались дольше CACHE_HOT_SEC, забываются.
+    
+    Returns:
+        Количество обновлённых ключей
+    """
+    cache = get_cache_service()
+    now = time.monotonic()
+    with _hot_keys_lock:
+        for key in [key for key, hot in _hot_keys.items() if now - hot.last_used > CACHE_HOT_SEC]:
+            del _hot_keys[key]
+        hot_keys = list(_hot_keys.items())
+    
+    refreshed = 0
+    for key, hot in hot_keys:
+        entry = cache.get(key)
+        if isinstance(entry, _Stale) and entry.fresh_until - time.time() > CACHE_REFRESH_AHEAD:
+            continue
+        if not _start_refresh(key):
+            continue
+        # Пересчёт по очереди: планировщик не должен сам создавать пик нагрузки на базу
+        try:
+            if hot.is_async:
+                await _single_flight_async(key, hot.load)
+            else:
+                await asyncio.to_thread(_single_flight_sync, key, hot.load)
+            refreshed += 1
+        except Exception as e:
+            logging.error(f"Обновление кэша '{key}' не удалось: {e}")
+        finally:
+            _finish_refresh(key)
+    return refreshed
+
+
+async def refresh_hot_keys_periodically(interval: float = CACHE_REFRESH_INTERVAL):
+    """Планировщик обновления востребованных ключей (см. refresh_hot_keys)"""
+    while True:
+        try:
+            await asyncio.sleep(interval)
+            refreshed = await refresh_hot_keys()
+            if refreshed:
+                logging.debug(f"Refreshed {refreshed} hot cache keys")
+        except Exception as e:
+            logging.error(f"Error during cache refresh: {e}")
+
+
+def format_namespace_stats(namespaces: Dict[str, Dict[str, Any]]) -> str:
+    """Статистика пространств имён одной строкой (для лога)"""
+    parts = []
+    for namespace, s in sorted(namespaces.items()):
+        part = f"{namespace}: hit {s.get('hit_rate', 0):.0%} ({s.get('hits', 0)}/{s.get('hits', 0) + s.get('misses', 0)})"
+        if s.get('loads'):
+            part += f" loads {s['loads']} avg {s['load_avg_ms']:.1f}ms max {s['load_max_ms']:.0f}ms"
+        if 'bytes' in s:
+            part += f" {s.get('entries', 0)} keys {s['bytes'] / 1024:.0f}KB"
+        evictions = {reason: n for reason, n in s.get('evictions', {}).items() if n}
+        if evictions:
+            part += " evicted " + ",".join(f"{reason}={n}" for reason, n in sorted(evictions.items()))
+        parts.append(part)
+    return "; ".join(parts)
+
+
+async def log_cache_stats_periodically(interval: float = CACHE_STATS_LOG_SEC):
+    """Периодически пишет в лог статистику кэша по пространствам имён"""
+    cache = get_cache_service()
+    while True:
+        try:
+            await asyncio.sleep(interval)
+            logging.info("Cache stats: " + format_namespace_stats(cache.get_namespace_stats()))
+        except Exception as e:
+            logging.error(f"Error during cache stats logging: {e}")
+
+
 # Специализированные кэши для разных типов данных
 class UserCache:
     """Кэш для данных пользователей"""
@@ -272,6 +739,22 @@ class UserCache:
     def set_user_info(self, user_id: int, user_info: Dict[str, Any]) -> None:
         """Сохраняет информацию о пользователе в кэш"""
         self.cache.set(f"user_info:{user_id}", user_info, self.user_ttl)
+    
+    def get_approval_selection(self, user_id: int) -> Optional[Dict[str, frozenset]]:
+        """
+        Выборка для массовых действий: shown — этапы показанного списка
+        /pending, selected — отмеченные из них. None — список не открывался
+        или выборка истекла (вытеснена из кэша)
+        """
+        return self.cache.get(f"user_selection:{user_id}")
+    
+    def set_approval_selection(self, user_id: int, shown: Iterable[str], selected: Iterable[str] = ()) -> None:
+        """Сохраняет показанные этапы и отмеченные среди них"""
+        shown = frozenset(shown)
+        self.cache.set(f"user_selection:{user_id}", {"shown": shown, "selected": frozenset(selected) & shown}, 3600)
+    
+    def clear_approval_selection(self, user_id: int) -> None:
+        self.cache.delete(f"user_selection:{user_id}")
 
 
 class StatsCache:
@@ -279,7 +762,8 @@ class StatsCache:
     
     def __init__(self, cache_service: CacheService):
         self.cache = cache_service
-        self.stats_ttl = 300  # 5 минут
+        # Сбрасывается событиями об изменениях, TTL — страховка
+        self.stats_ttl = STATS_CACHE_TTL
     
     def get_total_documents(self) -> Optional[int]:
         """Получает общее количество документов из кэша"""
@@ -304,3 +788,18 @@ class StatsCache:
     def set_storage_usage(self, usage: Dict[str, Any]) -> None:
         """Сохраняет статистику использования хранилища в кэш"""
         self.cache.set("storage_usage", usage, self.stats_ttl)
+    
+    def get_owner_stats(self, owner_tg_id: int) -> Optional[Any]:
+        """Получает персональную статистику владельца из кэша"""
+        return self.cache.get(f"stats:owner:{owner_tg_id}")
+    
+    def owner_stats_versions(self, owner_tg_id: int) -> Tuple[str, ...]:
+        """Версия тега владельца до чтения статистики (см. CacheService.set)"""
+        return self.cache.tag_versions([events.owner_tag(owner_tg_id)])
+    
+    def set_owner_stats(self, owner_tg_id: int, stats: Any, since: Optional[Tuple[str, ...]] = None) -> None:
+        """Сохраняет персональную статистику владельца (сбрасывается событиями владельца)"""
+        self.cache.set(
+            f"stats:owner:{owner_tg_id}", stats, self.stats_ttl,
+            tags=[events.owner_tag(owner_tg_id)], since=since
+        )
@@ -0,0 +1,487 @@
+"""
+Хранилища для CacheService
+
+- MemoryBackend — ограниченный LRU-кэш в памяти процесса;
+- RedisBackend — общий кэш всех экземпляров бота в Redis (или любом
+  сервере с протоколом Redis); значения сериализуются pickle;
+- NearCacheBackend — локальный L1 (MemoryBackend с коротким TTL) поверх
+  общего L2: горячие ключи читаются без сетевого запроса.
+
+Выбор — переменная CACHE_BACKEND (memory | redis | near), см. create_backend.
+
+Статистика ведётся и по пространствам имён ключей — части ключа до первого
+двоеточия (user:, stats:, whitelist:), см. key_namespace.
+"""
+import heapq
+import logging
+import math
+import pickle
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from bot.config import (
+    CACHE_BACKEND, CACHE_MAX_ENTRIES, CACHE_MAX_MB, CACHE_NAMESPACE, CACHE_NEAR_TTL, CACHE_REDIS_URL
+)
+
+# Глубина обхода вложенных объектов при оценке размера значения
+SIZE_DEPTH = 4
+# Сколько секунд не обращаться к недоступному Redis после ошибки
+REDIS_RETRY_SEC = 5.0
+REDIS_TIMEOUT_SEC = 0.5
+# Ключей за одну команду UNLINK при очистке пространства имён
+REDIS_CLEAR_BATCH = 500
+
+
+# Пространство имён для ключей без двоеточия
+DEFAULT_NAMESPACE = "other"
+
+# Причины удаления записей из MemoryBackend
+EVICT_EXPIRED = "expired"
+EVICT_ENTRIES = "max_entries"
+EVICT_BYTES = "max_bytes"
+EVICT_TOO_LARGE = "too_large"
+EVICT_DELETED = "deleted"
+
+
+def key_namespace(key: str) -> str:
+    """Пространство имён ключа: "stats:owner:1" -> "stats" """
+    head, sep, _ = key.partition(":")
+    return head if sep else DEFAULT_NAMESPACE
+
+
+def estimate_size(value: Any, depth: int = SIZE_DEPTH) -> int:
+    """
+    Примерный размер значения в байтах (sys.getsizeof с обходом вложенных
+    контейнеров и атрибутов объектов на depth уровней). Считается один раз
+    при записи в кэш.
+    """
+    size = sys.getsizeof(value)
+    if depth <= 0 or isinstance(value, (str, bytes, int, float, bool)) or value is None:
+        return size
+    if isinstance(value, dict):
+        return size + sum(estimate_size(k, depth - 1) + estimate_size(v, depth - 1) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return size + sum(estimate_size(item, depth - 1) for item in value)
+    if hasattr(value, "__dict__"):
+        return size + estimate_size(vars(value), depth - 1)
+    slots = getattr(type(value), "__slots__", ())
+    if slots:
+        return size + sum(estimate_size(getattr(value, name, None), depth - 1) for name in slots)
+    return size
+
+
+class CacheBackend(ABC):
+    """Интерфейс хранилища кэша"""
+
+    name = "base"
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        """Значение или None, если ключа нет или срок истёк"""
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        """Сохраняет значение на ttl секунд"""
+
+    @abstractmethod
+    def delete(self, key: str) -> bool:
+        """Удаляет ключ; True, если он был"""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Удаляет все ключи этого кэша"""
+
+    def clear_local(self) -> None:
+        """Удаляет копии, хранящиеся в этом процессе (общие данные не трогает)"""
+        self.clear()
+
+    def delete_local(self, key: str) -> bool:
+        """Удаляет копию ключа в этом процессе (общие данные не трогает)"""
+        return self.delete(key)
+
+    def cleanup_expired(self) -> int:
+        """Удаляет истёкшие записи (если хранилище не делает этого само)"""
+        return 0
+
+    @abstractmethod
+    def get_stats(self) -> Dict[str, Any]:
+        """Дешёвая статистика без обхода записей"""
+
+
+class _Entry:
+    """Запись кэша"""
+    __slots__ = ("key", "value", "expires_at", "size", "namespace")
+
+    def __init__(self, key: str, value: Any, expires_at: float, size: int, namespace: str):
+        self.key = key
+        self.value = value
+        self.expires_at = expires_at
+        self.size = size
+        self.namespace = namespace
+
+
+class _NamespaceUsage:
+    """Занятость и удаления записей одного пространства имён"""
+    __slots__ = ("entries", "bytes", "evictions")
+
+    def __init__(self):
+        self.entries = 0
+        self.bytes = 0
+        self.evictions: Counter = Counter()
+
+
+class MemoryBackend(CacheBackend):
+    """
+    Кэш в памяти процесса
+
+    Записи хранятся в OrderedDict в порядке использования: чтение
+    переносит запись в конец, при превышении max_entries или max_bytes
+    вытесняются записи из начала (LRU). Сроки жизни лежат в куче, поэтому
+    истёкшие записи снимаются с её вершины без полного обхода кэша.
+    Объём записей считается при записи и хранится готовой суммой — общей
+    и по пространствам имён, вместе с причинами удаления записей.
+    """
+
+    name = "memory"
+
+    def __init__(
+        self,
+        max_entries: int = CACHE_MAX_ENTRIES,
+        max_bytes: int = CACHE_MAX_MB * 1024 * 1024,
+        stats_namespace: Optional[str] = None,
+    ):
+        """stats_namespace — учитывать все ключи в одном пространстве имён"""
+        self._cache: "OrderedDict[str, _Entry]" = OrderedDict()
+        # (expires_at, порядковый номер, запись); перезаписанные и удалённые
+        # записи остаются в куче и пропускаются при извлечении
+        self._expiry: List[Tuple[float, int, _Entry]] = []
+        self._seq = 0
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.stats_namespace = stats_namespace
+        self._usage: Dict[str, _NamespaceUsage] = {}
+        self.logger = logging.getLogger(__name__)
+
+    def _namespace(self, key: str) -> str:
+        return self.stats_namespace or key_namespace(key)
+
+    def _ns_usage(self, namespace: str) -> _NamespaceUsage:
+        usage = self._usage.get(namespace)
+        if usage is None:
+            usage = self._usage[namespace] = _NamespaceUsage()
+        return usage
+
+    def _remove(self, entry: _Entry, reason: Optional[str] = None) -> None:
+        """Удаляет запись (вызывается под блокировкой); reason — причина для статистики"""
+        del self._cache[entry.key]
+        self._bytes -= entry.size
+        usage = self._ns_usage(entry.namespace)
+        usage.entries -= 1
+        usage.bytes -= entry.size
+        if reason is not None:
+            usage.evictions[reason] += 1
+
+    def _expire(self, now: float) -> int:
+        """Снимает истёкшие записи с вершины кучи (под блокировкой)"""
+        removed = 0
+        while self._expiry and self._expiry[0][0] <= now:
+            _, _, entry = heapq.heappop(self._expiry)
+            if self._cache.get(entry.key) is entry:
+                self._remove(entry, EVICT_EXPIRED)
+                removed += 1
+        self.expirations += removed
+        return removed
+
+    def _compact_expiry(self) -> None:
+        """Перестраивает кучу, если в ней накопилось много устаревших элементов"""
+        if len(self._expiry) > 2 * len(self._cache) + 1024:
+            self._expiry = [item for item in self._expiry if self._cache.get(item[2].key) is item[2]]
+            heapq.heapify(self._expiry)
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            if entry.expires_at <= time.monotonic():
+                self._remove(entry, EVICT_EXPIRED)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return entry.value
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        size = estimate_size(key) + estimate_size(value)
+        namespace = self._namespace(key)
+        if size > self.max_bytes:
+            self.logger.debug(f"Value for key '{key}' is too large to cache ({size} bytes)")
+            self.delete(key)
+            with self._lock:
+                self._ns_usage(namespace).evictions[EVICT_TOO_LARGE] += 1
+            return
+
+        now = time.monotonic()
+        entry = _Entry(key, value, now + ttl, size, namespace)
+        with self._lock:
+            old = self._cache.get(key)
+            if old is not None:
+                self._remove(old)
+            self._cache[key] = entry
+            self._bytes += size
+            usage = self._ns_usage(namespace)
+            usage.entries += 1
+            usage.bytes += size
+            self._seq += 1
+            heapq.heappush(self._expiry, (entry.expires_at, self._seq, entry))
+
+            self._expire(now)
+            while len(self._cache) > self.max_entries or self._bytes > self.max_bytes:
+                reason = EVICT_ENTRIES if len(self._cache) > self.max_entries else EVICT_BYTES
+                self._remove(next(iter(self._cache.values())), reason)
+                self.evictions += 1
+            self._compact_expiry()
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return False
+            self._remove(entry, EVICT_DELETED)
+            return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+            self._expiry.clear()
+            self._bytes = 0
+            for usage in self._usage.values():
+                usage.entries = 0
+                usage.bytes = 0
+
+    def export_entries(self, namespaces: Iterable[str]) -> List[Tuple[str, Any, float]]:
+        """Живые записи пространств имён: (ключ, значение, оставшийся TTL)"""
+        namespaces = set(namespaces)
+        now = time.monotonic()
+        with self._lock:
+            return [
+                (entry.key, entry.value, entry.expires_at - now)
+                for entry in self._cache.values()
+                if entry.namespace in namespaces and entry.expires_at > now
+            ]
+
+    def cleanup_expired(self) -> int:
+        with self._lock:
+            removed = self._expire(time.monotonic())
+            self._compact_expiry()
+        return removed
+
+    def get_stats(self) -> Dict[str, Any]:
+        expired_entries = self.cleanup_expired()
+        with self._lock:
+            total_entries = len(self._cache)
+            memory_usage = self._bytes
+            namespaces = {
+                namespace: {'entries': usage.entries, 'bytes': usage.bytes, 'evictions': dict(usage.evictions)}
+                for namespace, usage in self._usage.items()
+            }
+
+        return {
+            'total_entries': total_entries,
+            'active_entries': total_entries,
+            'expired_entries': expired_entries,
+            'memory_usage': memory_usage,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'namespaces': namespaces,
+        }
+
+
+class RedisBackend(CacheBackend):
+    """
+    Общий кэш в Redis
+
+    Ключи хранятся с префиксом namespace, срок жизни — PX. Ошибка связи
+    не ломает бота: запрос считается промахом, и REDIS_RETRY_SEC секунд
+    Redis не опрашивается вовсе.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str = CACHE_REDIS_URL, namespace: str = CACHE_NAMESPACE):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("Для CACHE_BACKEND=redis/near нужен пакет redis (pip install redis)") from e
+
+        self._errors = (redis.RedisError, OSError)
+        # Соединение открывается при первой команде
+        self.client = redis.Redis.from_url(
+            url,
+            socket_timeout=REDIS_TIMEOUT_SEC,
+            socket_connect_timeout=REDIS_TIMEOUT_SEC,
+        )
+        self.namespace = namespace
+        self._down_until = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.logger = logging.getLogger(__name__)
+
+    def _available(self) -> bool:
+        return time.monotonic() >= self._down_until
+
+    def _failed(self, action: str, error: Exception) -> None:
+        self.errors += 1
+        self._down_until = time.monotonic() + REDIS_RETRY_SEC
+        self.logger.warning(f"Redis cache {action} failed, skipping it for {REDIS_RETRY_SEC:.0f}s: {error}")
+
+    def get(self, key: str) -> Optional[Any]:
+        if not self._available():
+            self.misses += 1
+            return None
+        try:
+            raw = self.client.get(self.namespace + key)
+        except self._errors as e:
+            self._failed("get", e)
+            self.misses += 1
+            return None
+
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return pickle.loads(raw)
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        if not self._available():
+            return
+        # Бесконечный TTL — ключ без срока (вытесняется только политикой Redis)
+        px = None if math.isinf(ttl) else max(1, int(ttl * 1000))
+        try:
+            self.client.set(self.namespace + key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), px=px)
+        except self._errors as e:
+            self._failed("set", e)
+
+    def delete(self, key: str) -> bool:
+        # Удаление не пропускается даже после ошибки: устаревшее значение
+        # в общем кэше хуже лишнего сетевого запроса
+        try:
+            return bool(self.client.delete(self.namespace + key))
+        except self._errors as e:
+            self._failed("delete", e)
+            return False
+
+    def clear(self) -> None:
+        """Удаляет только ключи своего пространства имён (SCAN + UNLINK пачками)"""
+        try:
+            batch = []
+            for key in self.client.scan_iter(match=self.namespace + "*", count=REDIS_CLEAR_BATCH):
+                batch.append(key)
+                if len(batch) >= REDIS_CLEAR_BATCH:
+                    self.client.unlink(*batch)
+                    batch.clear()
+            if batch:
+                self.client.unlink(*batch)
+        except self._errors as e:
+            self._failed("clear", e)
+
+    def clear_local(self) -> None:
+        # Локальных копий нет: общий кэш уже согласован
+        pass
+
+    def delete_local(self, key: str) -> bool:
+        return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {'hits': self.hits, 'misses': self.misses, 'errors': self.errors}
+        if self._available():
+            try:
+                memory = self.client.info("memory")
+                stats['memory_usage'] = memory.get("used_memory", 0)
+                stats['total_entries'] = self.client.dbsize()
+            except self._errors as e:
+                # INFO поддерживают не все совместимые серверы; на работу кэша это не влияет
+                self.logger.debug(f"Redis cache stats unavailable: {e}")
+        return stats
+
+
+class NearCacheBackend(CacheBackend):
+    """
+    Локальный L1 поверх общего L2
+
+    Чтение сначала идёт в L1; промах читается из L2 и кладётся в L1 на
+    l1_ttl секунд. Запись и удаление идут в оба уровня. Удаление на другом
+    экземпляре доходит до L1 этого процесса не позже чем через l1_ttl.
+    """
+
+    name = "near"
+
+    def __init__(self, l1: CacheBackend, l2: CacheBackend, l1_ttl: float = CACHE_NEAR_TTL):
+        self.l1 = l1
+        self.l2 = l2
+        self.l1_ttl = l1_ttl
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.l1.get(key)
+        if value is not None:
+            return value
+        value = self.l2.get(key)
+        if value is not None:
+            self.l1.set(key, value, self.l1_ttl)
+        return value
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        self.l2.set(key, value, ttl)
+        self.l1.set(key, value, min(ttl, self.l1_ttl))
+
+    def delete(self, key: str) -> bool:
+        in_l1 = self.l1.delete(key)
+        return self.l2.delete(key) or in_l1
+
+    def clear(self) -> None:
+        self.l1.clear()
+        self.l2.clear()
+
+    def clear_local(self) -> None:
+        self.l1.clear()
+
+    def delete_local(self, key: str) -> bool:
+        return self.l1.delete(key)
+
+    def cleanup_expired(self) -> int:
+        return self.l1.cleanup_expired()
+
+    def get_stats(self) -> Dict[str, Any]:
+        l1 = self.l1.get_stats()
+        # Занятость по пространствам имён известна только для локального L1
+        return {'l1': l1, 'l2': self.l2.get_stats(), 'l1_ttl': self.l1_ttl, 'namespaces': l1.get('namespaces', {})}
+
+
+def create_backend(kind: str = CACHE_BACKEND) -> CacheBackend:
+    """Хранилище по имени: memory, redis или near (memory поверх redis)"""
+    if kind == "memory":
+        return MemoryBackend()
+    if kind == "redis":
+        return RedisBackend()
+    if kind == "near":
+        return NearCacheBackend(MemoryBackend(), RedisBackend())
+    raise ValueError(f"Неизвестный CACHE_BACKEND: {kind}")
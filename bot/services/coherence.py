@@ -0,0 +1,200 @@
+"""
+Согласованность кэшей нескольких экземпляров бота через PostgreSQL
+
+Каждый экземпляр держит локальные копии (кэш в памяти, L1 near-кэша,
+whitelist). Событие об изменении данных (bot/services/events.py) сбрасывает
+их только в своём процессе; этот модуль рассылает теги события остальным
+экземплярам через LISTEN/NOTIFY той же базы.
+
+Публикация: подписчик шины кладёт теги в очередь, фоновый поток склеивает
+накопившиеся теги в одно сообщение и в одной транзакции увеличивает
+cache_epoch и вызывает pg_notify. Блокировка единственной строки
+cache_epoch упорядочивает сообщения: номера идут подряд в порядке коммита.
+
+Приём: поток слушает канал на отдельном соединении и публикует у себя
+RemoteInvalidation с полученными тегами. Пропуск номера (соединение
+рвалось, очередь уведомлений переполнилась) или отставание от cache_epoch
+при периодической сверке означает потерянные сообщения — тогда локальные
+копии сбрасываются целиком (тег "*").
+"""
+import json
+import logging
+import queue
+import threading
+import time
+import uuid
+from typing import Optional, Set
+
+from sqlalchemy import text
+
+from bot.config import CACHE_COHERENCE_CHECK_SEC
+from bot.db.session import engine
+from bot.services import events
+
+CHANNEL = "docubot_cache"
+# Предел полезной нагрузки NOTIFY — 8000 байт; длинный список тегов
+# заменяется полным сбросом
+MAX_PAYLOAD_BYTES = 7900
+# Пауза перед переподключением слушателя после ошибки
+RECONNECT_DELAY_SEC = 5.0
+# Сколько ждать следующих событий, чтобы отправить их одним сообщением
+PUBLISH_COALESCE_SEC = 0.05
+
+NOTIFY_SQL = text("""
+    WITH bumped AS (
+        UPDATE cache_epoch SET epoch = epoch + 1 WHERE id = 1 RETURNING epoch
+    )
+    SELECT epoch, pg_notify(:channel, json_build_object('i', CAST(:instance AS text), 'e', epoch, 't', CAST(:tags AS json))::text)
+    FROM bumped
+""")
+
+EPOCH_SQL = "SELECT epoch FROM cache_epoch WHERE id = 1"
+
+
+class CacheCoherence:
+    """Рассылка и приём сбросов кэша между экземплярами бота"""
+
+    def __init__(self, check_interval: float = CACHE_COHERENCE_CHECK_SEC):
+        self.instance = uuid.uuid4().hex[:12]
+        self.check_interval = check_interval
+        self.last_epoch: Optional[int] = None
+        self.sent = 0
+        self.received = 0
+        self.resyncs = 0
+        self._outbox: "queue.Queue[frozenset]" = queue.Queue()
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self.logger = logging.getLogger(__name__)
+
+    # --- публикация ---
+
+    def _on_event(self, event: events.Event) -> None:
+        # Сбросы, пришедшие от других экземпляров, обратно не рассылаются
+        if event.tags and not isinstance(event, events.RemoteInvalidation):
+            self._outbox.put(event.tags)
+
+    def _publish_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                tags: Set[str] = set(self._outbox.get(timeout=1.0))
+            except queue.Empty:
+                continue
+            time.sleep(PUBLISH_COALESCE_SEC)
+            while True:
+                try:
+                    tags |= self._outbox.get_nowait()
+                except queue.Empty:
+                    break
+            self._notify(tags)
+
+    def _notify(self, tags: Set[str]) -> None:
+        payload = json.dumps(sorted(tags), separators=(",", ":"))
+        if len(payload.encode()) > MAX_PAYLOAD_BYTES:
+            payload = json.dumps([events.ALL_TAGS])
+        try:
+            with engine.begin() as conn:
+                conn.execute(NOTIFY_SQL, {"channel": CHANNEL, "instance": self.instance, "tags": payload})
+            self.sent += 1
+        except Exception as e:
+            # Запись уже закоммичена; другие экземпляры догонят по epoch
+            self.logger.error(f"Не удалось разослать сброс кэша {sorted(tags)}: {e}")
+
+    # --- приём ---
+
+    def _conninfo(self) -> str:
+        return engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+
+    def _resync(self, reason: str) -> None:
+        self.resyncs += 1
+        self.logger.warning(f"Кэш пересинхронизирован: {reason}")
+        events.publish(events.RemoteInvalidation(frozenset({events.ALL_TAGS})))
+
+    def _check_epoch(self, conn) -> None:
+        """Сверяет номер последнего сообщения с cache_epoch"""
+        epoch = conn.execute(EPOCH_SQL).fetchone()[0]
+        if self.last_epoch is None:
+            self.last_epoch = epoch
+        elif epoch > self.last_epoch:
+            self._resync(f"epoch {self.last_epoch} -> {epoch} без уведомлений")
+            self.last_epoch = epoch
+
+    def _handle(self, payload: str) -> None:
+        try:
+            message = json.loads(payload)
+            instance, epoch, tags = message["i"], int(message["e"]), frozenset(message["t"])
+        except (ValueError, KeyError, TypeError) as e:
+            self.logger.warning(f"Некорректное сообщение в канале {CHANNEL}: {e}")
+            return
+
+        gap = self.last_epoch is not None and epoch > self.last_epoch + 1
+        if self.last_epoch is None or epoch > self.last_epoch:
+            self.last_epoch = epoch
+        if gap:
+            self._resync(f"пропущены сообщения до epoch {epoch}")
+        elif instance != self.instance:
+            self.received += 1
+            events.publish(events.RemoteInvalidation(tags))
+
+    def _listen_loop(self) -> None:
+        import psycopg
+
+        while not self._stop.is_set():
+            try:
+                with psycopg.connect(self._conninfo(), autocommit=True) as conn:
+                    conn.execute(f"LISTEN {CHANNEL}")
+                    # После переподключения сообщения за время простоя потеряны:
+                    # сверка с cache_epoch покажет, были ли они
+                    self._check_epoch(conn)
+                    self.logger.info(f"Слушаю сбросы кэша (экземпляр {self.instance}, epoch {self.last_epoch})")
+                    while not self._stop.is_set():
+                        idle = True
+                        for notify in conn.notifies(timeout=self.check_interval):
+                            idle = False
+                            self._handle(notify.payload)
+                        if idle:
+                            self._check_epoch(conn)
+            except Exception as e:
+                if self._stop.is_set():
+                    break
+                self.logger.error(f"Слушатель сбросов кэша: {e}; переподключение через {RECONNECT_DELAY_SEC:.0f} с")
+                self._stop.wait(RECONNECT_DELAY_SEC)
+
+    # --- управление ---
+
+    def start(self) -> None:
+        if self._threads:
+            return
+        events.subscribe(events.Event, self._on_event)
+        for name, target in (("cache-notify", self._publish_loop), ("cache-listen", self._listen_loop)):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self) -> None:
+        events.unsubscribe(events.Event, self._on_event)
+        self._stop.set()
+
+    def get_stats(self) -> dict:
+        return {
+            'instance': self.instance,
+            'epoch': self.last_epoch,
+            'sent': self.sent,
+            'received': self.received,
+            'resyncs': self.resyncs,
+        }
+
+
+_coherence: Optional[CacheCoherence] = None
+
+
+def start_cache_coherence() -> CacheCoherence:
+    """Запускает рассылку и приём сбросов кэша (один раз на процесс)"""
+    global _coherence
+    if _coherence is None:
+        _coherence = CacheCoherence()
+        _coherence.start()
+    return _coherence
+
+
+def get_cache_coherence() -> Optional[CacheCoherence]:
+    return _coherence
@@ -0,0 +1,167 @@
+"""
+Шина событий об изменении данных (внутри процесса)
+
+Сервисы публикуют типизированные события после коммита своих записей,
+подписчики (в первую очередь кэш) реагируют на них синхронно. У каждого
+события есть набор тегов — каких данных оно касается; кэш сбрасывает
+записи с этими тегами (CacheService.invalidate_tags).
+
+Теги:
+    documents  — число и статусы документов, версии
+    workflows  — этапы согласования
+    storage    — файлы и объём хранилища
+    users      — пользователи (whitelist, активные авторы)
+    whitelist  — записи whitelist
+    owner:<id> — персональные данные владельца документов
+    *          — всё (полная пересинхронизация)
+"""
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, FrozenSet, Iterable, List, Tuple, Type
+
+
+def owner_tag(owner_tg_id: int) -> str:
+    return f"owner:{owner_tg_id}"
+
+
+def _owner_tags(owner_tg_ids: Iterable[int]) -> FrozenSet[str]:
+    return frozenset(owner_tag(owner) for owner in owner_tg_ids if owner is not None)
+
+
+@dataclass(frozen=True)
+class Event:
+    """Базовое событие; подписка на Event получает все события"""
+
+    @property
+    def tags(self) -> FrozenSet[str]:
+        return frozenset()
+
+
+@dataclass(frozen=True)
+class FileStored(Event):
+    """В files добавлен новый файл"""
+    file_id: str
+
+    @property
+    def tags(self) -> FrozenSet[str]:
+        return frozenset({"storage"})
+
+
+@dataclass(frozen=True)
+class DocumentCreated(Event):
+    document_id: str
+    owner_tg_id: int
+
+    @property
+    def tags(self) -> FrozenSet[str]:
+        return frozenset({"documents", "users", owner_tag(self.owner_tg_id)})
+
+
+@dataclass(frozen=True)
+class VersionAdded(Event):
+    document_id: str
+    version_no: int
+
+    @property
+    def tags(self) -> FrozenSet[str]:
+        return frozenset({"documents"})
+
+
+@dataclass(frozen=True)
+class WorkflowStarted(Event):
+    document_id: str
+
+    @property
+    def tags(self) -> FrozenSet[str]:
+        return frozenset({"workflows"})
+
+
+@dataclass(frozen=True)
+class WorkflowDecided(Event):
+    """Этапы согласования закрыты решением approved/rejected"""
+    document_ids: Tuple[str, ...]
+    owner_tg_ids: Tuple[int, ...]
+    decision: str
+
+    @property
+    def tags(self) -> FrozenSet[str]:
+        return frozenset({"documents", "workflows"}) | _owner_tags(self.owner_tg_ids)
+
+
+@dataclass(frozen=True)
+class DocumentsArchived(Event):
+    document_ids: Tuple[str, ...]
+    owner_tg_ids: Tuple[int, ...]
+
+    @property
+    def tags(self) -> FrozenSet[str]:
+        return frozenset({"documents"}) | _owner_tags(self.owner_tg_ids)
+
+
+@dataclass(frozen=True)
+class DocumentUnarchived(Event):
+    document_id: str
+    owner_tg_id: int
+
+    @property
+    def tags(self) -> FrozenSet[str]:
+        return frozenset({"documents", owner_tag(self.owner_tg_id)})
+
+
+@dataclass(frozen=True)
+class WhitelistReloaded(Event):
+    path: str
+
+    @property
+    def tags(self) -> FrozenSet[str]:
+        return frozenset({"users", "whitelist"})
+
+
+@dataclass(frozen=True)
+class RemoteInvalidation(Event):
+    """
+    Сброс, полученный от другого экземпляра бота (bot/services/coherence.py);
+    применяется только локально и дальше не пересылается
+    """
+    tag_set: FrozenSet[str]
+
+    @property
+    def tags(self) -> FrozenSet[str]:
+        return self.tag_set
+
+
+ALL_TAGS = "*"
+
+Handler = Callable[[Event], None]
+
+_subscribers: Dict[Type[Event], List[Handler]] = {}
+_lock = threading.Lock()
+
+
+def subscribe(event_type: Type[Event], handler: Handler) -> None:
+    """Подписывает handler на события типа event_type и его наследников"""
+    with _lock:
+        _subscribers.setdefault(event_type, []).append(handler)
+
+
+def unsubscribe(event_type: Type[Event], handler: Handler) -> None:
+    with _lock:
+        handlers = _subscribers.get(event_type, [])
+        if handler in handlers:
+            handlers.remove(handler)
+
+
+def publish(event: Event) -> None:
+    """
+    Передаёт событие подписчикам. Вызывать после коммита: подписчик может
+    сразу перечитать данные. Ошибка подписчика записывается в лог и не
+    прерывает ни остальных подписчиков, ни саму запись.
+    """
+    with _lock:
+        handlers = [h for cls in type(event).__mro__ for h in _subscribers.get(cls, ())]
+    for handler in handlers:
+        try:
+            handler(event)
+        except Exception as e:
+            logging.error(f"Ошибка обработчика события {type(event).__name__}: {e}")
@@ -0,0 +1,80 @@
+"""
+Обслуживание секций истории согласований
+
+approval_history секционирована по месяцам created_at. Сервис заранее
+создаёт секции будущих месяцев и применяет политику хранения: секции
+старше HISTORY_RETENTION_MONTHS отсоединяются (и по желанию удаляются).
+Счётчики действий владельцев (stats_owner_actions) при этом не
+уменьшаются: вклад секции сохраняется в stats_owner_actions_detached и
+учитывается полным пересчётом роллапов.
+"""
+import asyncio
+import logging
+from typing import List, Optional
+
+from sqlalchemy import text
+
+from bot.config import HISTORY_PARTITIONS_AHEAD, HISTORY_RETENTION_MONTHS, HISTORY_DROP_DETACHED
+from bot.db.session import engine
+
+
+def ensure_history_partitions(months_ahead: Optional[int] = None) -> int:
+    """
+    Создаёт недостающие месячные секции до текущего месяца + months_ahead
+    
+    Returns:
+        Количество созданных секций
+    """
+    months = HISTORY_PARTITIONS_AHEAD if months_ahead is None else months_ahead
+    with engine.begin() as conn:
+        return conn.execute(
+            text("SELECT approval_history_ensure_partitions(now(), :months)"),
+            {"months": months}
+        ).scalar_one()
+
+
+def apply_history_retention(keep_months: Optional[int] = None, drop: Optional[bool] = None) -> List[str]:
+    """
+    Отсоединяет секции истории старше keep_months месяцев
+    
+    Args:
+        keep_months: Сколько месяцев хранить (0 — политика отключена)
+        drop: Удалять ли отсоединённые секции
+        
+    Returns:
+        Имена отсоединённых секций
+    """
+    keep = HISTORY_RETENTION_MONTHS if keep_months is None else keep_months
+    if keep <= 0:
+        return []
+    
+    with engine.begin() as conn:
+        return list(conn.execute(
+            text("SELECT approval_history_detach_partitions(:keep, :drop)"),
+            {"keep": keep, "drop": HISTORY_DROP_DETACHED if drop is None else drop}
+        ).scalars().all())
+
+
+def maintain_history_partitions() -> None:
+    """Один проход обслуживания: будущие секции и политика хранения"""
+    created = ensure_history_partitions()
+    if created:
+        logging.info(f"approval_history: создано секций: {created}")
+    detached = apply_history_retention()
+    if detached:
+        logging.info(f"approval_history: отсоединены секции: {', '.join(detached)}")
+
+
+async def maintain_history_partitions_periodically(interval: int = 24 * 3600):
+    """
+    Периодически обслуживает секции истории согласований
+    
+    Args:
+        interval: Интервал в секундах
+    """
+    while True:
+        try:
+            await asyncio.to_thread(maintain_history_partitions)
+        except Exception as e:
+            logging.error(f"Error during history partition maintenance: {e}")
+        await asyncio.sleep(interval)
@@ -1,17 +1,37 @@
 """
 Сервис уведомлений о просрочках и напоминаний
 """
+from dataclasses import dataclass, asdict
 from typing import List, Dict, Optional
 from datetime import datetime, timedelta
 from sqlalchemy import text
+from bot.config import STATS_STALE_TTL, STATS_TIME_TTL
 from bot.db.session import engine
+from bot.services.cache import cached
+
+
+@dataclass
+class ReminderStats:
+    """Сводка по дедлайнам, собранная одним проходом по approval_workflows"""
+    overdue_count: int = 0
+    approaching_24h: int = 0
+    approaching_7d: int = 0
+    avg_overdue_hours: float = 0
+
+    def as_dict(self) -> Dict:
+        return asdict(self)
 
 
 class ReminderService:
     """Сервис для работы с напоминаниями и уведомлениями"""
     
-    def get_overdue_documents(self) -> List[Dict]:
-        """Получает все просроченные документы"""
+    def get_overdue_documents(self, limit: Optional[int] = None) -> List[Dict]:
+        """
+        Получает просроченные документы, самые давние первыми
+        
+        Args:
+            limit: Ограничение числа строк (None — все)
+        """
         with engine.connect() as conn:
             sql = """
                 SELECT 
@@ -28,9 +48,10 @@ class ReminderService:
                 WHERE aw.status = 'pending'
                   AND aw.deadline < NOW()
                 ORDER BY aw.deadline ASC
+                LIMIT :limit
             """
             
-            result = conn.execute(text(sql))
+            result = conn.execute(text(sql), {"limit": limit})
             return [dict(row) for row in result.mappings()]
     
     def get_documents_approaching_deadline(self, hours_before: int = 24) -> List[Dict]:
@@ -107,78 +128,54 @@ class ReminderService:
             })
             return [dict(row) for row in result.mappings()]
     
+    def get_reminder_summary(self, user_id: Optional[int] = None) -> ReminderStats:
+        """
+        Получает сводку по дедлайнам одним запросом (COUNT ... FILTER)
+        по частичному индексу idx_workflows_deadline
+        
+        Args:
+            user_id: ID согласующего (None — по всей системе)
+        """
+        sql = """
+            SELECT 
+                COUNT(*) FILTER (WHERE deadline < NOW()) AS overdue_count,
+                COUNT(*) FILTER (
+                    WHERE deadline BETWEEN NOW() AND NOW() + INTERVAL '24 hours'
+                ) AS approaching_24h,
+                COUNT(*) FILTER (
+                    WHERE deadline BETWEEN NOW() AND NOW() + INTERVAL '7 days'
+                ) AS approaching_7d,
+                AVG(EXTRACT(EPOCH FROM (NOW() - deadline)) / 3600)
+                    FILTER (WHERE deadline < NOW()) AS avg_overdue_hours
+            FROM approval_workflows 
+            WHERE status = 'pending'
+              AND deadline IS NOT NULL
+        """
+        params = {}
+        if user_id is not None:
+            sql += " AND approver_tg_id = :user_id"
+            params["user_id"] = user_id
+        
+        with engine.connect() as conn:
+            row = conn.execute(text(sql), params).fetchone()
+        
+        return ReminderStats(
+            overdue_count=row[0],
+            approaching_24h=row[1],
+            approaching_7d=row[2],
+            avg_overdue_hours=float(row[3]) if row[3] else 0
+        )
+    
+    @cached(ttl=STATS_TIME_TTL, key_prefix="stats:", tags=("workflows",), stale_ttl=STATS_STALE_TTL)
     def get_reminder_stats(self) -> Dict:
         """Получает статистику по напоминаниям"""
-        with engine.connect() as conn:
-            # Просроченные документы
-            overdue_count = conn.execute(text("""
-                SELECT COUNT(*) 
-                FROM approval_workflows 
-                WHERE status = 'pending' AND deadline < NOW()
-            """)).scalar()
-            
-            # Документы, приближающиеся к дедлайну (24 часа)
-            approaching_count = conn.execute(text("""
-                SELECT COUNT(*) 
-                FROM approval_workflows 
-                WHERE status = 'pending' 
-                  AND deadline BETWEEN NOW() AND NOW() + INTERVAL '24 hours'
-            """)).scalar()
-            
-            # Документы, приближающиеся к дедлайну (7 дней)
-            week_approaching_count = conn.execute(text("""
-                SELECT COUNT(*) 
-                FROM approval_workflows 
-                WHERE status = 'pending' 
-                  AND deadline BETWEEN NOW() AND NOW() + INTERVAL '7 days'
-            """)).scalar()
-            
-            # Среднее время просрочки
-            avg_overdue_hours = conn.execute(text("""
-                SELECT AVG(EXTRACT(EPOCH FROM (NOW() - deadline)) / 3600)
-                FROM approval_workflows 
-                WHERE status = 'pending' AND deadline < NOW()
-            """)).scalar()
-            
-            return {
-                "overdue_count": overdue_count,
-                "approaching_24h": approaching_count,
-                "approaching_7d": week_approaching_count,
-                "avg_overdue_hours": avg_overdue_hours if avg_overdue_hours else 0
-            }
+        return self.get_reminder_summary().as_dict()
     
     def get_user_reminder_stats(self, user_id: int) -> Dict:
         """Получает статистику напоминаний для пользователя"""
-        with engine.connect() as conn:
-            # Просроченные документы пользователя
-            user_overdue = conn.execute(text("""
-                SELECT COUNT(*) 
-                FROM approval_workflows 
-                WHERE approver_tg_id = :user_id 
-                  AND status = 'pending' 
-                  AND deadline < NOW()
-            """), {"user_id": user_id}).scalar()
-            
-            # Документы пользователя, приближающиеся к дедлайну
-            user_approaching = conn.execute(text("""
-                SELECT COUNT(*) 
-                FROM approval_workflows 
-                WHERE approver_tg_id = :user_id 
-                  AND status = 'pending' 
-                  AND deadline BETWEEN NOW() AND NOW() + INTERVAL '24 hours'
-            """), {"user_id": user_id}).scalar()
-            
-            # Среднее время просрочки для пользователя
-            user_avg_overdue = conn.execute(text("""
-                SELECT AVG(EXTRACT(EPOCH FROM (NOW() - deadline)) / 3600)
-                FROM approval_workflows 
-                WHERE approver_tg_id = :user_id 
-                  AND status = 'pending' 
-                  AND deadline < NOW()
-            """), {"user_id": user_id}).scalar()
-            
-            return {
-                "overdue_count": user_overdue,
-                "approaching_count": user_approaching,
-                "avg_overdue_hours": user_avg_overdue if user_avg_overdue else 0
-            }
+        stats = self.get_reminder_summary(user_id)
+        return {
+            "overdue_count": stats.overdue_count,
+            "approaching_count": stats.approaching_24h,
+            "avg_overdue_hours": stats.avg_overdue_hours
+        }
@@ -1,7 +1,10 @@
-from uuid import uuid4
+import re
+import uuid
+from bot.db.ids import new_id
 from typing import Optional
 from sqlalchemy import text
 from bot.db.session import engine
+from bot.services import events
 
 
 def ensure_file(*, minio_key: str, sha256: str, mime: str, ext: str, size_bytes: int) -> str:
@@ -9,51 +12,73 @@ def ensure_file(*, minio_key: str, sha256: str, mime: str, ext: str, size_bytes:
         row = conn.execute(text("SELECT id FROM files WHERE sha256=:h"), {"h": sha256}).fetchone()
         if row:
             return row[0]
-        fid = str(uuid4())
+        fid = new_id()
         conn.execute(text("""
             INSERT INTO files (id, minio_key, sha256, mime, ext, size_bytes)
             VALUES (:id, :k, :h, :m, :e, :s)
         """), {"id": fid, "k": minio_key, "h": sha256, "m": mime, "e": ext, "s": size_bytes})
-        return fid
+    events.publish(events.FileStored(fid))
+    return fid
 
 def create_document(*, title: str, kind: str, owner_tg_id: int) -> str:
-    did = str(uuid4())
+    did = new_id()
     with engine.begin() as conn:
         conn.execute(text("""
             INSERT INTO documents (id, title, kind, owner_tg_id)
             VALUES (:id, :t, :k, :o)
         """), {"id": did, "t": title, "k": kind, "o": owner_tg_id})
+    events.publish(events.DocumentCreated(did, owner_tg_id))
     return did
 
 def add_version(*, document_id: str, file_id: str, author_tg_id: int, note: Optional[str] = None) -> tuple[str, int]:
+    vid = new_id()
     with engine.begin() as conn:
-        last = conn.execute(text(
-            "SELECT COALESCE(MAX(version_no), 0) FROM document_versions WHERE document_id=:d"
-        ), {"d": document_id}).scalar_one()
-        next_no = int(last) + 1
-        vid = str(uuid4())
-        conn.execute(text("""
+        # Номер версии берём из счётчика документа: блокировка строки
+        # сериализует параллельные загрузки, MAX по версиям не нужен
+        next_no = conn.execute(text("""
+            WITH bump AS (
+                UPDATE documents SET last_version_no = last_version_no + 1
+                WHERE id = :d
+                RETURNING last_version_no
+            )
             INSERT INTO document_versions (id, document_id, file_id, version_no, author_tg_id, note)
-            VALUES (:id, :d, :f, :n, :a, :note)
-        """), {"id": vid, "d": document_id, "f": file_id, "n": next_no, "a": author_tg_id, "note": note})
+            SELECT :id, :d, :f, bump.last_version_no, :a, :note FROM bump
+            RETURNING version_no
+        """), {"id": vid, "d": document_id, "f": file_id, "a": author_tg_id, "note": note}).scalar_one()
         conn.execute(text("UPDATE documents SET current_version_id=:v WHERE id=:d"),
                      {"v": vid, "d": document_id})
-        return vid, next_no
+    events.publish(events.VersionAdded(str(document_id), int(next_no)))
+    return vid, int(next_no)
+
+
+VERSION_INFO_SQL = """
+    SELECT
+      v.id,
+      v.version_no,
+      v.document_id,
+      d.title,
+      f.minio_key,
+      f.mime   AS mime_type,
+      f.ext,
+      f.size_bytes
+    FROM document_versions v
+    JOIN documents d ON d.id = v.document_id
+    JOIN files     f ON f.id = v.file_id
+"""
+
+
+def get_version_infos_by_ids(version_ids: list[str]) -> list[dict]:
+    """Метаданные нескольких версий одним запросом (без кэша, см. version_cache)"""
+    if not version_ids:
+        return []
+    sql = text(VERSION_INFO_SQL + "WHERE v.id = ANY(CAST(:vids AS UUID[]))")
+    with engine.connect() as conn:
+        rows = conn.execute(sql, {"vids": list(version_ids)}).mappings().all()
+        return [dict(r) for r in rows]
+
 
 def get_version_info_by_id(version_id: str) -> dict | None:
-    sql = text("""
-        SELECT
-          v.id,
-          v.version_no,
-          v.document_id,
-          d.title,
-          f.minio_key,
-          f.mime   AS mime_type,
-          f.ext,
-          f.size_bytes
-        FROM document_versions v
-        JOIN documents d ON d.id = v.document_id
-        JOIN files     f ON f.id = v.file_id
+    sql = text(VERSION_INFO_SQL + """
         WHERE v.id = CAST(:vid AS UUID)               -- <-- важный каст
         LIMIT 1
     """)
@@ -89,3 +114,34 @@ def list_user_documents(tg_id: int, limit: int = 10) -> list[dict]:
         rows = conn.execute(sql, {"tg_id": tg_id, "limit": limit}).mappings().all()
         return [dict(r) for r in rows]
 
+
+SHORT_ID_RE = re.compile(r"^[0-9a-f]{4,32}$")
+
+def find_document_ids(ref: str, limit: int = 2) -> list[str]:
+    """
+    Документы по ID, введённому пользователем: полный UUID или префикс
+    короткого ID (не короче 4 символов)
+
+    Префикс ищется одним проходом по idx_documents_short_key. По умолчанию
+    возвращается не больше двух ID — этого достаточно, чтобы отличить
+    однозначный префикс от неоднозначного.
+    """
+    ref = ref.strip().lower()
+    try:
+        full_id = str(uuid.UUID(ref))
+    except ValueError:
+        full_id = None
+
+    with engine.connect() as conn:
+        if full_id:
+            row = conn.execute(text("SELECT id FROM documents WHERE id = :id"), {"id": full_id}).fetchone()
+            return [str(row[0])] if row else []
+        if not SHORT_ID_RE.match(ref):
+            return []
+        rows = conn.execute(text("""
+            SELECT id FROM documents
+            WHERE document_short_key(id) COLLATE "C" LIKE :prefix
+            ORDER BY document_short_key(id) COLLATE "C"
+            LIMIT :limit
+        """), {"prefix": ref + "%", "limit": limit}).scalars().all()
+        return [str(doc_id) for doc_id in rows]
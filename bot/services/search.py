@@ -4,7 +4,7 @@
 from typing import List, Dict, Optional
 from datetime import datetime, timedelta
 from sqlalchemy import text
-from bot.db.session import engine
+from bot.db.session import engine, get_read_engine
 
 
 class SearchService:
@@ -130,7 +130,7 @@ class SearchService:
         """
         Глобальный поиск по всем документам (только для админов)
         """
-        with engine.connect() as conn:
+        with get_read_engine().connect() as conn:
             sql = """
                 SELECT 
                     d.id,
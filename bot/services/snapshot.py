@@ -0,0 +1,127 @@
+"""
+Снимок прогретых кэшей между перезапусками
+
+При штатной остановке выбранные пространства имён кэша (по умолчанию
+статистика и метаданные версий) сохраняются в локальный файл, при запуске
+восстанавливаются — первые минуты после деплоя не бьют по базе холодными
+запросами.
+
+Снимок годен, только если данные с момента сохранения не менялись. Эпоха
+данных считается за O(1): версия схемы, cache_epoch (сбросы от других
+экземпляров, см. coherence), время запуска сервера и счётчики изменённых
+строк таблиц документов из pg_stat_user_tables. Счётчики попадают в
+статистику с задержкой до секунды, поэтому перед чтением эпохи при
+остановке соединения пула закрываются; ошибка в сторону «изменилось»
+просто отбрасывает снимок.
+"""
+import logging
+import os
+import pickle
+import time
+import zlib
+from pathlib import Path
+from typing import Optional, Tuple
+
+from sqlalchemy import text
+
+from bot.config import CACHE_SNAPSHOT_PATH, CACHE_SNAPSHOT_NAMESPACES, CACHE_SNAPSHOT_MAX_AGE_SEC
+from bot.db.session import engine
+from bot.services.cache import get_cache_service
+from bot.services.version_cache import get_version_cache
+
+SNAPSHOT_FORMAT = 2
+# Пространство имён метаданных версий (отдельный VersionInfoCache)
+VERSION_NAMESPACE = "version"
+
+DATA_EPOCH_SQL = text("""
+    SELECT
+        (SELECT COALESCE(MAX(version), 0) FROM schema_migrations),
+        (SELECT epoch FROM cache_epoch WHERE id = 1),
+        pg_postmaster_start_time(),
+        (SELECT COALESCE(SUM(n_tup_ins + n_tup_upd + n_tup_del), 0)
+           FROM pg_stat_user_tables
+          WHERE relname IN ('documents', 'document_versions', 'files', 'approval_workflows')
+             OR relname LIKE 'approval\\_history%')
+""")
+
+
+def data_epoch() -> Tuple[str, ...]:
+    """Эпоха данных: меняется при любой записи в таблицы документов"""
+    with engine.connect() as conn:
+        return tuple(str(value) for value in conn.execute(DATA_EPOCH_SQL).one())
+
+
+def save_cache_snapshot(path: Optional[str] = None) -> int:
+    """
+    Сохраняет выбранные пространства имён кэша в файл (вызывать при остановке)
+
+    Returns:
+        Количество сохранённых записей
+    """
+    path = Path(path or CACHE_SNAPSHOT_PATH)
+    namespaces = [ns for ns in CACHE_SNAPSHOT_NAMESPACES if ns != VERSION_NAMESPACE]
+    entries = get_cache_service().export_entries(namespaces)
+    versions = get_version_cache().export_infos() if VERSION_NAMESPACE in CACHE_SNAPSHOT_NAMESPACES else []
+
+    # Закрытые соединения сбрасывают свои счётчики в pg_stat: эпоха
+    # учтёт последние записи этого процесса
+    engine.dispose()
+    snapshot = {
+        'format': SNAPSHOT_FORMAT,
+        'epoch': data_epoch(),
+        'created_at': time.time(),
+        'entries': entries,
+        'versions': versions,
+    }
+
+    data = zlib.compress(pickle.dumps(snapshot, pickle.HIGHEST_PROTOCOL))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    # Файл читает только сам бот (pickle): права только владельцу
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+    count = len(entries) + len(versions)
+    logging.info(f"Снимок кэша сохранён: {count} записей, {len(data) / 1024:.0f} КБ ({path})")
+    return count
+
+
+def restore_cache_snapshot(path: Optional[str] = None) -> int:
+    """
+    Восстанавливает кэш из снимка, если эпоха данных не изменилась
+
+    Снимок удаляется после чтения: повторный запуск после сбоя не должен
+    поднять ещё более старое состояние.
+
+    Returns:
+        Количество восстановленных записей (0 — снимка нет или он устарел)
+    """
+    path = Path(path or CACHE_SNAPSHOT_PATH)
+    try:
+        data = path.read_bytes()
+    except FileNotFoundError:
+        return 0
+    finally:
+        path.unlink(missing_ok=True)
+
+    try:
+        snapshot = pickle.loads(zlib.decompress(data))
+    except Exception as e:
+        logging.warning(f"Снимок кэша повреждён, пропускаю: {e}")
+        return 0
+
+    age = time.time() - snapshot.get('created_at', 0)
+    if snapshot.get('format') != SNAPSHOT_FORMAT or age > CACHE_SNAPSHOT_MAX_AGE_SEC:
+        logging.info(f"Снимок кэша устарел ({age:.0f} с), пропускаю")
+        return 0
+    epoch = data_epoch()
+    if snapshot.get('epoch') != epoch:
+        logging.info("Данные изменились после снимка кэша, пропускаю")
+        return 0
+
+    restored = get_cache_service().import_entries(snapshot['entries'], elapsed=age)
+    restored += get_version_cache().import_infos(snapshot['versions'])
+    logging.info(f"Кэш восстановлен из снимка: {restored} записей")
+    return restored
@@ -1,64 +1,137 @@
 """
 Сервис статистики и аналитики для DocuBot
 """
-from typing import Dict, List, Optional
+import asyncio
+import logging
+from dataclasses import dataclass, field, asdict
+from typing import Callable, Dict, List, Optional
 from datetime import datetime, timedelta
 from sqlalchemy import text
+from bot.config import STATS_DEADLINE_SEC, STATS_CACHE_TTL, STATS_STALE_TTL, STATS_TIME_TTL
 from bot.db.session import engine
 from bot.services.cache import cached, StatsCache, get_cache_service
 
+# Сколько хранится последнее удачное значение секции для отдачи «устаревшим»
+SECTION_LAST_GOOD_TTL = 24 * 3600
+
+
+@dataclass
+class DocumentStats:
+    """Сводка по документам, собранная одним запросом"""
+    total_documents: int = 0
+    status_distribution: Dict[str, int] = field(default_factory=dict)
+    kind_distribution: Dict[str, int] = field(default_factory=dict)
+    recent_documents: int = 0
+    total_versions: int = 0
+
+    def as_dict(self) -> Dict:
+        return asdict(self)
+
+
+@dataclass
+class WorkflowStats:
+    """Сводка по этапам согласования, собранная одним запросом"""
+    total_workflows: int = 0
+    status_distribution: Dict[str, int] = field(default_factory=dict)
+    average_approval_time_hours: float = 0
+    overdue_documents: int = 0
+
+    def as_dict(self) -> Dict:
+        return asdict(self)
+
+
+@dataclass
+class StorageStats:
+    """Сводка по хранилищу, собранная одним запросом"""
+    total_files: int = 0
+    total_size_bytes: int = 0
+    file_types: List[Dict] = field(default_factory=list)
+    monthly_growth: List[Dict] = field(default_factory=list)
+
+    @property
+    def total_size_mb(self) -> float:
+        return self.total_size_bytes / (1024 * 1024) if self.total_size_bytes else 0
+
+    def as_dict(self) -> Dict:
+        data = asdict(self)
+        data["total_size_mb"] = self.total_size_mb
+        return data
+
+
+@dataclass
+class OwnerStats:
+    """Персональная статистика владельца документов"""
+    total_documents: int = 0
+    status_counts: Dict[str, int] = field(default_factory=dict)
+    total_actions: int = 0
+    action_counts: Dict[str, int] = field(default_factory=dict)
+
+    def as_dict(self) -> Dict:
+        return asdict(self)
+
 
 class StatisticsService:
-    """Сервис для получения статистики по документам и пользователям"""
+    """
+    Сервис для получения статистики по документам и пользователям
+
+    Сводки кэшируются и сбрасываются событиями сразу после коммита записи,
+    поэтому читаются из основной базы: реплика с допустимым отставанием
+    (REPLICA_MAX_LAG_SEC) вернула бы в кэш данные до записи на весь TTL.
+    Запросы идут по роллапам и основную базу почти не нагружают.
+    """
     
     def __init__(self):
         self.cache = StatsCache(get_cache_service())
     
-    @cached(ttl=300, key_prefix="stats:")
-    def get_document_stats(self) -> Dict:
-        """Получает общую статистику по документам"""
+    def get_document_summary(self) -> DocumentStats:
+        """
+        Получает сводку по документам за один проход по роллапам:
+        GROUPING SETS даёт итог, разбивку по статусам и по типам,
+        скалярные подзапросы — документы за 30 дней и число версий.
+        """
         with engine.connect() as conn:
-            # Общее количество документов
-            total_docs = conn.execute(text("""
-                SELECT COUNT(*) as count FROM documents
-            """)).scalar()
-            
-            # Документы по статусам
-            status_stats = conn.execute(text("""
-                SELECT status, COUNT(*) as count 
-                FROM documents 
-                GROUP BY status
-            """)).fetchall()
-            
-            # Документы по типам
-            kind_stats = conn.execute(text("""
-                SELECT kind, COUNT(*) as count 
-                FROM documents 
-                GROUP BY kind
+            rows = conn.execute(text("""
+                SELECT 
+                    status,
+                    kind,
+                    GROUPING(status, kind) AS grp,
+                    SUM(doc_count)::bigint AS count,
+                    (SELECT COALESCE(SUM(doc_count), 0)::bigint
+                       FROM stats_document_daily
+                      WHERE day >= (NOW() AT TIME ZONE 'UTC')::date - 30) AS recent,
+                    (SELECT COALESCE(SUM(version_count), 0)::bigint
+                       FROM stats_version_monthly) AS versions
+                FROM stats_document_counts
+                GROUP BY GROUPING SETS ((status), (kind), ())
             """)).fetchall()
-            
-            # Документы за последние 30 дней
-            recent_docs = conn.execute(text("""
-                SELECT COUNT(*) as count 
-                FROM documents 
-                WHERE created_at >= NOW() - INTERVAL '30 days'
-            """)).scalar()
-            
-            return {
-                "total_documents": total_docs,
-                "status_distribution": {row[0]: row[1] for row in status_stats},
-                "kind_distribution": {row[0]: row[1] for row in kind_stats},
-                "recent_documents": recent_docs
-            }
+        
+        stats = DocumentStats()
+        for status, kind, grp, count, recent, versions in rows:
+            stats.recent_documents = recent
+            stats.total_versions = versions
+            if grp == 3:
+                stats.total_documents = count or 0
+            elif grp == 1 and count:
+                stats.status_distribution[status] = count
+            elif grp == 2 and count:
+                stats.kind_distribution[kind] = count
+        
+        return stats
+    
+    @cached(ttl=STATS_CACHE_TTL, key_prefix="stats:", tags=("documents",), stale_ttl=STATS_STALE_TTL)
+    def get_document_stats(self) -> Dict:
+        """Получает общую статистику по документам"""
+        return self.get_document_summary().as_dict()
     
-    @cached(ttl=300, key_prefix="stats:")
+    @cached(ttl=STATS_CACHE_TTL, key_prefix="stats:", tags=("users",), stale_ttl=STATS_STALE_TTL)
     def get_user_stats(self) -> Dict:
         """Получает статистику по пользователям"""
         with engine.connect() as conn:
             # Активные пользователи (загружали документы)
             active_users = conn.execute(text("""
-                SELECT COUNT(DISTINCT owner_tg_id) as count 
-                FROM documents
+                SELECT COUNT(*) as count 
+                FROM stats_owner_counts
+                WHERE doc_count > 0
             """)).scalar()
             
             # Пользователи по ролям (из whitelist)
@@ -72,9 +145,9 @@ class StatisticsService:
             
             # Топ пользователей по количеству документов
             top_users = conn.execute(text("""
-                SELECT owner_tg_id, COUNT(*) as doc_count
-                FROM documents 
-                GROUP BY owner_tg_id 
+                SELECT owner_tg_id, doc_count
+                FROM stats_owner_counts 
+                WHERE doc_count > 0
                 ORDER BY doc_count DESC 
                 LIMIT 10
             """)).fetchall()
@@ -85,97 +158,149 @@ class StatisticsService:
                 "top_users": [{"user_id": row[0], "doc_count": row[1]} for row in top_users]
             }
     
+    def get_workflow_summary(self) -> WorkflowStats:
+        """
+        Получает сводку по workflow за один проход по роллапу этапов;
+        просрочка зависит от NOW() и считается подзапросом по частичному
+        индексу idx_workflows_deadline.
+        """
+        with engine.connect() as conn:
+            rows = conn.execute(text("""
+                SELECT 
+                    status,
+                    GROUPING(status) AS grp,
+                    SUM(step_count)::bigint AS steps,
+                    SUM(first_step_count)::bigint AS workflows,
+                    SUM(completed_seconds) / NULLIF(SUM(completed_count), 0) AS avg_seconds,
+                    (SELECT COUNT(*)
+                       FROM approval_workflows
+                      WHERE status = 'pending'
+                        AND deadline < NOW()) AS overdue
+                FROM stats_workflow_counts
+                GROUP BY GROUPING SETS ((status), ())
+            """)).fetchall()
+        
+        stats = WorkflowStats()
+        for status, grp, steps, workflows, avg_seconds, overdue in rows:
+            stats.overdue_documents = overdue
+            if grp == 1:
+                stats.total_workflows = workflows or 0
+                stats.average_approval_time_hours = avg_seconds / 3600 if avg_seconds else 0
+            elif steps:
+                stats.status_distribution[status] = steps
+        
+        return stats
+    
+    @cached(ttl=STATS_TIME_TTL, key_prefix="stats:", tags=("workflows",), stale_ttl=STATS_STALE_TTL)
     def get_workflow_stats(self) -> Dict:
         """Получает статистику по workflow согласования"""
+        return self.get_workflow_summary().as_dict()
+    
+    def get_storage_summary(self) -> StorageStats:
+        """
+        Получает сводку по хранилищу за один запрос: итог и разбивка
+        по MIME через GROUPING SETS, рост по месяцам — в том же ответе.
+        """
         with engine.connect() as conn:
-            # Общее количество workflow
-            total_workflows = conn.execute(text("""
-                SELECT COUNT(DISTINCT document_id) as count 
-                FROM approval_workflows
-            """)).scalar()
-            
-            # Workflow по статусам
-            workflow_status = conn.execute(text("""
-                SELECT status, COUNT(*) as count 
-                FROM approval_workflows 
-                GROUP BY status
+            rows = conn.execute(text("""
+                SELECT 
+                    'mime' AS section,
+                    mime,
+                    NULL::date AS month,
+                    GROUPING(mime) AS grp,
+                    SUM(file_count)::bigint AS file_count,
+                    SUM(total_bytes)::bigint AS total_bytes
+                FROM stats_file_mime
+                GROUP BY GROUPING SETS ((mime), ())
+                UNION ALL
+                SELECT 
+                    'month',
+                    NULL,
+                    month,
+                    0,
+                    file_count,
+                    total_bytes
+                FROM stats_file_monthly
+                WHERE month >= date_trunc('month', NOW() AT TIME ZONE 'UTC')::date - INTERVAL '12 months'
+                  AND file_count > 0
+                ORDER BY section, mime, month
             """)).fetchall()
-            
-            # Среднее время согласования
-            avg_approval_time = conn.execute(text("""
-                SELECT AVG(EXTRACT(EPOCH FROM (completed_at - created_at))) as avg_seconds
-                FROM approval_workflows 
-                WHERE completed_at IS NOT NULL
-            """)).scalar()
-            
-            # Просроченные документы
-            overdue_docs = conn.execute(text("""
-                SELECT COUNT(*) as count 
-                FROM approval_workflows 
-                WHERE status = 'pending' 
-                  AND deadline < NOW()
-            """)).scalar()
-            
-            return {
-                "total_workflows": total_workflows,
-                "status_distribution": {row[0]: row[1] for row in workflow_status},
-                "average_approval_time_hours": avg_approval_time / 3600 if avg_approval_time else 0,
-                "overdue_documents": overdue_docs
-            }
+        
+        stats = StorageStats()
+        for section, mime, month, grp, file_count, total_bytes in rows:
+            if section == "month":
+                stats.monthly_growth.append({
+                    "month": month.strftime("%Y-%m"),
+                    "file_count": file_count,
+                    "size_mb": total_bytes / (1024 * 1024) if total_bytes else 0
+                })
+            elif grp == 1:
+                stats.total_files = file_count or 0
+                stats.total_size_bytes = total_bytes or 0
+            elif file_count:
+                stats.file_types.append({
+                    "mime": mime,
+                    "count": file_count,
+                    "size_mb": total_bytes / (1024 * 1024) if total_bytes else 0
+                })
+        
+        return stats
     
+    @cached(ttl=STATS_CACHE_TTL, key_prefix="stats:", tags=("storage",), stale_ttl=STATS_STALE_TTL)
     def get_storage_stats(self) -> Dict:
         """Получает статистику по хранилищу"""
+        return self.get_storage_summary().as_dict()
+    
+    def get_owner_stats(self, owner_tg_id: int) -> OwnerStats:
+        """
+        Получает персональную статистику владельца одним запросом:
+        документы по статусам и действия согласования по его документам
+        (из роллапа stats_owner_actions, без обхода секций истории).
+        Результат кэшируется на пользователя и сбрасывается событиями о его
+        документах (тег owner:<id>, bot/services/events.py), поэтому
+        читается из основной базы: реплика могла бы вернуть в кэш данные
+        до только что сделанной записи.
+        """
+        cached_stats = self.cache.get_owner_stats(owner_tg_id)
+        if cached_stats is not None:
+            return cached_stats
+        
+        since = self.cache.owner_stats_versions(owner_tg_id)
         with engine.connect() as conn:
-            # Общее количество файлов
-            total_files = conn.execute(text("""
-                SELECT COUNT(*) as count FROM files
-            """)).scalar()
-            
-            # Общий размер файлов
-            total_size = conn.execute(text("""
-                SELECT SUM(size_bytes) as total_bytes FROM files
-            """)).scalar()
-            
-            # Файлы по типам
-            file_types = conn.execute(text("""
-                SELECT mime, COUNT(*) as count, SUM(size_bytes) as total_size
-                FROM files 
-                GROUP BY mime
-            """)).fetchall()
-            
-            # Размер по месяцам
-            monthly_size = conn.execute(text("""
-                SELECT 
-                    DATE_TRUNC('month', created_at) as month,
-                    COUNT(*) as file_count,
-                    SUM(size_bytes) as total_size
-                FROM files 
-                WHERE created_at >= NOW() - INTERVAL '12 months'
-                GROUP BY DATE_TRUNC('month', created_at)
-                ORDER BY month
-            """)).fetchall()
-            
-            return {
-                "total_files": total_files,
-                "total_size_bytes": total_size,
-                "total_size_mb": total_size / (1024 * 1024) if total_size else 0,
-                "file_types": [
-                    {
-                        "mime": row[0], 
-                        "count": row[1], 
-                        "size_mb": row[2] / (1024 * 1024) if row[2] else 0
-                    } 
-                    for row in file_types
-                ],
-                "monthly_growth": [
-                    {
-                        "month": row[0].strftime("%Y-%m"),
-                        "file_count": row[1],
-                        "size_mb": row[2] / (1024 * 1024) if row[2] else 0
-                    }
-                    for row in monthly_size
-                ]
-            }
+            rows = conn.execute(text("""
+                SELECT 'status' AS section, d.status::text AS bucket, COUNT(*) AS count
+                FROM documents d
+                WHERE d.owner_tg_id = :owner
+                GROUP BY d.status
+                UNION ALL
+                SELECT 'action', action, action_count
+                FROM stats_owner_actions
+                WHERE owner_tg_id = :owner AND action_count > 0
+            """), {"owner": owner_tg_id}).fetchall()
+        
+        stats = OwnerStats()
+        for section, bucket, count in rows:
+            if section == "status":
+                stats.status_counts[bucket] = count
+                stats.total_documents += count
+            else:
+                stats.action_counts[bucket] = count
+                stats.total_actions += count
+        
+        self.cache.set_owner_stats(owner_tg_id, stats, since=since)
+        return stats
+    
+    def rebuild_rollups(self) -> None:
+        """
+        Пересчитывает роллап-таблицы статистики из исходных таблиц
+        
+        Действия владельцев считаются за всё время: к присоединённой истории
+        добавляются счётчики секций, отсоединённых политикой хранения
+        (stats_owner_actions_detached).
+        """
+        with engine.begin() as conn:
+            conn.execute(text("SELECT stats_rebuild_rollups()"))
+        get_cache_service().clear()
     
     def get_comprehensive_stats(self) -> Dict:
         """Получает комплексную статистику"""
@@ -186,3 +311,86 @@ class StatisticsService:
             "storage": self.get_storage_stats(),
             "generated_at": datetime.now().isoformat()
         }
+    
+    def _stats_sections(self, include_reminders: bool) -> Dict[str, tuple[Callable[[], Dict], Dict]]:
+        """Независимые секции статистики: загрузчик и пустое значение"""
+        sections = {
+            "documents": (self.get_document_stats, DocumentStats().as_dict()),
+            "users": (self.get_user_stats, {"active_users": 0, "role_distribution": {}, "top_users": []}),
+            "workflows": (self.get_workflow_stats, WorkflowStats().as_dict()),
+            "storage": (self.get_storage_stats, StorageStats().as_dict()),
+        }
+        if include_reminders:
+            from bot.services.reminders import ReminderService, ReminderStats
+            sections["reminders"] = (ReminderService().get_reminder_stats, ReminderStats().as_dict())
+        return sections
+    
+    @staticmethod
+    def _load_section(name: str, loader: Callable[[], Dict]) -> Dict:
+        """Загружает секцию (в отдельном потоке) и запоминает удачное значение"""
+        value = loader()
+        get_cache_service().set(f"stats:last:{name}", value, SECTION_LAST_GOOD_TTL)
+        return value
+    
+    async def gather_comprehensive_stats(
+        self,
+        deadline: Optional[float] = None,
+        include_reminders: bool = False
+    ) -> Dict:
+        """
+        Собирает комплексную статистику, выполняя секции параллельно
+        
+        Каждая секция выполняется в своём потоке на отдельном соединении из
+        пула. Секции, не уложившиеся в общий дедлайн или упавшие с ошибкой,
+        возвращаются последним удачным значением (или пустым) и попадают в
+        stale_sections; досчитавшись в фоне, они обновят значение для
+        следующего запроса.
+        
+        Args:
+            deadline: Общий дедлайн в секундах (по умолчанию STATS_DEADLINE_SEC)
+            include_reminders: Добавить секцию статистики напоминаний
+        """
+        deadline = STATS_DEADLINE_SEC if deadline is None else deadline
+        sections = self._stats_sections(include_reminders)
+        
+        tasks = {
+            name: asyncio.ensure_future(asyncio.to_thread(self._load_section, name, loader))
+            for name, (loader, _) in sections.items()
+        }
+        done, pending = await asyncio.wait(tasks.values(), timeout=deadline)
+        
+        # Незавершённые секции досчитываются в фоне; ошибку забираем, чтобы
+        # не получить "exception was never retrieved"
+        for task in pending:
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        
+        cache = get_cache_service()
+        result: Dict = {"stale_sections": []}
+        for name, task in tasks.items():
+            if task in done and task.exception() is None:
+                result[name] = task.result()
+                continue
+            
+            if task in done:
+                logging.error(f"Ошибка секции статистики '{name}': {task.exception()}")
+            else:
+                logging.warning(f"Секция статистики '{name}' не уложилась в {deadline} с")
+            
+            last_good = cache.get(f"stats:last:{name}")
+            result[name] = last_good if last_good is not None else sections[name][1]
+            result["stale_sections"].append(name)
+        
+        result["generated_at"] = datetime.now().isoformat()
+        return result
+    
+    async def warm_up(self, deadline: Optional[float] = None) -> List[str]:
+        """
+        Заранее считает секции админ-панели (включая хранилище и
+        напоминания), чтобы первый запрос после запуска не ждал холодных
+        агрегатов. Не уложившиеся в дедлайн секции досчитываются в фоне.
+        
+        Returns:
+            Секции, не готовые к концу прогрева
+        """
+        stats = await self.gather_comprehensive_stats(deadline=deadline, include_reminders=True)
+        return stats["stale_sections"]
@@ -2,25 +2,42 @@ from bot import config
 from minio import Minio
 from io import BytesIO
 import hashlib
+import threading
 from datetime import timedelta
+from typing import Optional
 
-_client = Minio(
-    config.MINIO_ENDPOINT,
-    access_key=config.MINIO_ACCESS_KEY,
-    secret_key=config.MINIO_SECRET_KEY,
-    secure=config.MINIO_SECURE,
-)
 MINIO_BUCKET = config.MINIO_BUCKET
 
+# Клиент создаётся при первом обращении, а не при импорте модуля
+_client: Optional[Minio] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> Minio:
+    """Клиент MinIO (создаётся лениво, один на процесс)"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = Minio(
+                    config.MINIO_ENDPOINT,
+                    access_key=config.MINIO_ACCESS_KEY,
+                    secret_key=config.MINIO_SECRET_KEY,
+                    secure=config.MINIO_SECURE,
+                )
+    return _client
+
 
 def ensure_bucket() -> None:
-    if not _client.bucket_exists(MINIO_BUCKET):
-        _client.make_bucket(MINIO_BUCKET)
+    """Создаёт bucket при отсутствии; заодно открывает соединение с MinIO"""
+    client = get_client()
+    if not client.bucket_exists(MINIO_BUCKET):
+        client.make_bucket(MINIO_BUCKET)
 
 def put_object_bytes(key: str, data: bytes, content_type: str) -> None:
     """Новая базовая функция: кладёт байты в MinIO по ключу."""
     bio = BytesIO(data)
-    _client.put_object(
+    get_client().put_object(
         MINIO_BUCKET,
         key,
         data=bio,
@@ -29,7 +46,7 @@ def put_object_bytes(key: str, data: bytes, content_type: str) -> None:
     )
 
 def get_object_bytes(key: str) -> bytes:
-    resp = _client.get_object(MINIO_BUCKET, key)
+    resp = get_client().get_object(MINIO_BUCKET, key)
     try:
         return resp.read()
     finally:
@@ -40,7 +57,7 @@ def presigned_get_url(key: str, expires_seconds: int | float = 3600) -> str:
     # MinIO ограничивает TTL 1..7 дней
     secs = int(expires_seconds)
     secs = max(1, min(secs, 7 * 24 * 3600))
-    return _client.presigned_get_object(
+    return get_client().presigned_get_object(
         MINIO_BUCKET,
         key,
         expires=timedelta(seconds=secs),  # <-- важно: timedelta
@@ -55,7 +72,7 @@ def migrate_old_files():
         print("Начинаем миграцию старых файлов...")
         
         # Получаем список всех объектов в папке files/
-        objects = _client.list_objects(MINIO_BUCKET, prefix="files/", recursive=True)
+        objects = get_client().list_objects(MINIO_BUCKET, prefix="files/", recursive=True)
         
         migrated_count = 0
         for obj in objects:
@@ -0,0 +1,157 @@
+"""
+Кэш метаданных версий документов
+
+Строка document_versions и её файл после записи не меняются, поэтому
+метаданные версии (название документа, ключ MinIO, тип, размер) хранятся
+без TTL: кнопка «скачать» обращается к базе не чаще одного раза на версию.
+Размер кэша ограничен (LRU, см. MemoryBackend).
+
+Название принадлежит документу, но ни один путь записи не переименовывает
+и не удаляет документы, поэтому записи сбрасываются только полным сбросом
+"*". Появится такая запись — ей понадобится своё событие и сброс здесь.
+"""
+import logging
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Optional
+
+from bot.config import VERSION_CACHE_MAX_ENTRIES, VERSION_CACHE_MAX_MB
+from bot.services import events
+from bot.services.cache_backends import MemoryBackend
+from bot.services.repo import get_version_infos_by_ids
+
+# Поля, без которых строку списка нельзя положить в кэш
+VERSION_FIELDS = ("version_id", "version_no", "id", "title", "minio_key", "mime_type", "ext", "size_bytes")
+
+
+def _normalize(version_id: Any) -> Optional[str]:
+    try:
+        return str(uuid.UUID(str(version_id)))
+    except ValueError:
+        return None
+
+
+class VersionInfoCache:
+    """Неистекающий кэш version_id -> метаданные версии"""
+
+    def __init__(self, max_entries: int = VERSION_CACHE_MAX_ENTRIES, max_bytes: int = VERSION_CACHE_MAX_MB * 1024 * 1024):
+        self.backend = MemoryBackend(max_entries=max_entries, max_bytes=max_bytes, stats_namespace="version")
+        # растёт при любом сбросе: загрузка, начавшаяся до сброса, не кэшируется
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.load_seconds = 0.0
+        self.logger = logging.getLogger(__name__)
+        events.subscribe(events.Event, self._on_event)
+
+    def _store(self, info: dict, since: int) -> None:
+        with self._lock:
+            if since != self._generation:
+                return
+        self.backend.set(str(info["id"]), info, float("inf"))
+
+    def get_many(self, version_ids: Iterable[Any]) -> Dict[str, dict]:
+        """
+        Метаданные версий; недостающие загружаются одним запросом
+
+        Returns:
+            version_id (строка UUID) -> метаданные; неизвестные и
+            некорректные ID в результат не попадают
+        """
+        result: Dict[str, dict] = {}
+        missing: List[str] = []
+        for version_id in version_ids:
+            key = _normalize(version_id)
+            if key is None or key in result:
+                continue
+            info = self.backend.get(key)
+            if info is None:
+                missing.append(key)
+            else:
+                result[key] = info
+
+        if missing:
+            since = self._generation
+            started = time.perf_counter()
+            infos = get_version_infos_by_ids(missing)
+            self.loads += 1
+            self.load_seconds += time.perf_counter() - started
+            for info in infos:
+                self._store(info, since)
+                result[str(info["id"])] = info
+        return result
+
+    def get(self, version_id: Any) -> Optional[dict]:
+        return self.get_many([version_id]).get(_normalize(version_id))
+
+    def prime(self, rows: Iterable[dict]) -> None:
+        """
+        Кладёт в кэш метаданные из строк списков документов
+        (list_user_documents: id документа, version_id, файл)
+        """
+        since = self._generation
+        for row in rows:
+            if row.get("version_id") is None or any(field not in row for field in VERSION_FIELDS):
+                continue
+            self._store({
+                "id": row["version_id"],
+                "version_no": row["version_no"],
+                "document_id": row["id"],
+                "title": row["title"],
+                "minio_key": row["minio_key"],
+                "mime_type": row["mime_type"],
+                "ext": row["ext"],
+                "size_bytes": row["size_bytes"],
+            }, since)
+
+    def export_infos(self) -> List[dict]:
+        """Метаданные всех версий в кэше (для снимка)"""
+        return [info for _, info, _ in self.backend.export_entries(["version"])]
+
+    def import_infos(self, infos: Iterable[dict]) -> int:
+        since = self._generation
+        count = 0
+        for info in infos:
+            self._store(info, since)
+            count += 1
+        return count
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self.backend.clear()
+
+    def _on_event(self, event: events.Event) -> None:
+        if events.ALL_TAGS in event.tags:
+            self.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.backend.get_stats(),
+            'loads': self.loads,
+            'load_avg_ms': self.load_seconds * 1000 / self.loads if self.loads else 0.0,
+        }
+
+
+_version_cache: Optional[VersionInfoCache] = None
+_version_cache_lock = threading.Lock()
+
+
+def get_version_cache() -> VersionInfoCache:
+    global _version_cache
+    if _version_cache is None:
+        with _version_cache_lock:
+            if _version_cache is None:
+                _version_cache = VersionInfoCache()
+    return _version_cache
+
+
+def get_version_info(version_id: Any) -> Optional[dict]:
+    """Метаданные версии для скачивания (кэшируются без TTL)"""
+    return get_version_cache().get(version_id)
+
+
+def get_version_infos(version_ids: Iterable[Any]) -> Dict[str, dict]:
+    """Метаданные нескольких версий (для списков)"""
+    return get_version_cache().get_many(version_ids)
@@ -1,11 +1,12 @@
 """
 Сервис для работы с workflow согласования документов
 """
-from uuid import uuid4
 from typing import List, Dict, Optional, Tuple
 from datetime import datetime, timedelta
 from sqlalchemy import text
-from bot.db.session import engine
+from bot.db.ids import new_id, short_id
+from bot.db.session import engine, run_in_transaction
+from bot.services import events
 
 
 def create_approval_workflow(
@@ -24,25 +25,35 @@ def create_approval_workflow(
     Returns:
         ID созданного workflow
     """
-    workflow_id = str(uuid4())
+    workflow_id = new_id()
+    
+    if not approvers:
+        return workflow_id
     
     with engine.begin() as conn:
-        # Создаем этапы согласования
-        for i, approver_tg_id in enumerate(approvers):
-            deadline = deadlines[i] if deadlines and i < len(deadlines) else None
-            
-            conn.execute(text("""
-                INSERT INTO approval_workflows 
-                (id, document_id, step_order, approver_tg_id, deadline)
-                VALUES (:id, :doc_id, :order, :approver, :deadline)
-            """), {
-                "id": str(uuid4()),
-                "doc_id": document_id,
-                "order": i + 1,
-                "approver": approver_tg_id,
-                "deadline": deadline
-            })
+        # Создаем все этапы согласования одной многострочной вставкой
+        conn.execute(text("""
+            INSERT INTO approval_workflows 
+            (id, document_id, step_order, approver_tg_id, deadline)
+            SELECT s.id, :doc_id, s.step_order, s.approver, s.deadline
+            FROM unnest(
+                CAST(:ids AS uuid[]),
+                CAST(:orders AS integer[]),
+                CAST(:approvers AS bigint[]),
+                CAST(:deadlines AS timestamptz[])
+            ) AS s(id, step_order, approver, deadline)
+        """), {
+            "doc_id": document_id,
+            "ids": [new_id() for _ in approvers],
+            "orders": list(range(1, len(approvers) + 1)),
+            "approvers": list(approvers),
+            "deadlines": [
+                deadlines[i] if deadlines and i < len(deadlines) else None
+                for i in range(len(approvers))
+            ]
+        })
     
+    events.publish(events.WorkflowStarted(str(document_id)))
     return workflow_id
 
 
@@ -149,16 +160,17 @@ async def approve_document(
         document_id, step_order = row
         
         # Записываем в историю
-        conn.execute(text("""
+        owner_tg_id = conn.execute(text("""
             INSERT INTO approval_history 
             (id, document_id, approver_tg_id, action, comment)
             VALUES (:id, :doc_id, :approver, 'approved', :comment)
+            RETURNING (SELECT owner_tg_id FROM documents WHERE id = :doc_id)
         """), {
-            "id": str(uuid4()),
+            "id": new_id(),
             "doc_id": document_id,
             "approver": approver_tg_id,
             "comment": comment
-        })
+        }).scalar()
         
         # Проверяем, есть ли следующие этапы
         next_step = conn.execute(text("""
@@ -191,7 +203,7 @@ async def approve_document(
                     
                     # Отправляем уведомление автору документа
                     try:
-                        doc_id_str = str(document_id)[:8]
+                        doc_id_str = short_id(document_id)
                         await bot.send_message(
                             owner_tg_id,
                             f"✅ <b>Документ согласован!</b>\n\n"
@@ -202,8 +214,10 @@ async def approve_document(
                         )
                     except Exception as e:
                         print(f"Ошибка отправки уведомления: {e}")
-        
-        return True
+    
+    # Сбрасываем кэш статистики после коммита
+    events.publish(events.WorkflowDecided((str(document_id),), (owner_tg_id,), "approved"))
+    return True
 
 
 async def reject_document(
@@ -243,16 +257,17 @@ async def reject_document(
         document_id = row[0]
         
         # Записываем в историю
-        conn.execute(text("""
+        owner_tg_id = conn.execute(text("""
             INSERT INTO approval_history 
             (id, document_id, approver_tg_id, action, comment)
             VALUES (:id, :doc_id, :approver, 'rejected', :comment)
+            RETURNING (SELECT owner_tg_id FROM documents WHERE id = :doc_id)
         """), {
-            "id": str(uuid4()),
+            "id": new_id(),
             "doc_id": document_id,
             "approver": approver_tg_id,
             "comment": comment
-        })
+        }).scalar()
         
         # Обновляем статус документа
         conn.execute(text("""
@@ -275,7 +290,7 @@ async def reject_document(
                 
                 # Отправляем уведомление автору документа
                 try:
-                    doc_id_str = str(document_id)[:8]
+                    doc_id_str = short_id(document_id)
                     await bot.send_message(
                         owner_tg_id,
                         f"❌ <b>Документ отклонен</b>\n\n"
@@ -287,8 +302,137 @@ async def reject_document(
                     )
                 except Exception as e:
                     print(f"Ошибка отправки уведомления: {e}")
+    
+    # Сбрасываем кэш статистики после коммита
+    events.publish(events.WorkflowDecided((str(document_id),), (owner_tg_id,), "rejected"))
+    return True
+
+
+async def decide_documents_bulk(
+    workflow_ids: List[str],
+    approver_tg_id: int,
+    decision: str,
+    comment: Optional[str] = None,
+    bot=None,
+    whitelist_store=None
+) -> int:
+    """
+    Согласовывает или отклоняет несколько этапов одной транзакцией
+    
+    Этапы, документы и история обновляются набором (по одному запросу на
+    шаг), а уведомления авторам объединяются в одно сообщение на владельца.
+    Транзакция, прерванная взаимоблокировкой, повторяется (run_in_transaction).
+    
+    Args:
+        workflow_ids: ID этапов согласования
+        approver_tg_id: Telegram ID согласующего
+        decision: 'approved' или 'rejected'
+        comment: Комментарий к решению
+    
+    Returns:
+        Количество обработанных этапов
+    """
+    if decision not in ("approved", "rejected"):
+        raise ValueError(f"Неизвестное решение: {decision}")
+    if not workflow_ids:
+        return 0
+    
+    def decide(conn):
+        # Закрываем все ожидающие этапы согласующего
+        steps = conn.execute(text("""
+            UPDATE approval_workflows 
+            SET status = :decision, 
+                comment = :comment,
+                completed_at = now()
+            WHERE id = ANY(CAST(:workflow_ids AS uuid[]))
+              AND approver_tg_id = :approver_id
+              AND status = 'pending'
+            RETURNING document_id, step_order
+        """), {
+            "decision": decision,
+            "comment": comment,
+            "workflow_ids": list(workflow_ids),
+            "approver_id": approver_tg_id
+        }).fetchall()
         
-        return True
+        if not steps:
+            return steps, [], []
+        
+        doc_ids = [str(row[0]) for row in steps]
+        
+        # История — одной многострочной вставкой
+        conn.execute(text("""
+            INSERT INTO approval_history 
+            (id, document_id, approver_tg_id, action, comment)
+            SELECT h.id, h.document_id, :approver, :decision, :comment
+            FROM unnest(CAST(:ids AS uuid[]), CAST(:doc_ids AS uuid[])) AS h(id, document_id)
+        """), {
+            "ids": [new_id() for _ in steps],
+            "doc_ids": doc_ids,
+            "approver": approver_tg_id,
+            "decision": decision,
+            "comment": comment
+        })
+        
+        if decision == "approved":
+            # Документ согласован полностью, если после этапа нет следующих
+            finished = conn.execute(text("""
+                UPDATE documents d
+                SET status = 'approved'
+                FROM unnest(CAST(:doc_ids AS uuid[]), CAST(:orders AS integer[])) AS s(document_id, step_order)
+                WHERE d.id = s.document_id
+                  AND NOT EXISTS (
+                      SELECT 1 FROM approval_workflows w
+                      WHERE w.document_id = s.document_id
+                        AND w.step_order = s.step_order + 1
+                  )
+                RETURNING d.id, d.title, d.owner_tg_id
+            """), {"doc_ids": doc_ids, "orders": [row[1] for row in steps]}).fetchall()
+        else:
+            finished = conn.execute(text("""
+                UPDATE documents 
+                SET status = 'rejected' 
+                WHERE id = ANY(CAST(:doc_ids AS uuid[]))
+                RETURNING id, title, owner_tg_id
+            """), {"doc_ids": doc_ids}).fetchall()
+        
+        owners = conn.execute(text("""
+            SELECT DISTINCT owner_tg_id FROM documents WHERE id = ANY(CAST(:doc_ids AS uuid[]))
+        """), {"doc_ids": doc_ids}).scalars().all()
+        return steps, finished, owners
+    
+    # Пачка, прерванная взаимоблокировкой, повторяется целиком
+    steps, finished, owners = run_in_transaction(decide)
+    if not steps:
+        return 0
+    doc_ids = [str(row[0]) for row in steps]
+    
+    events.publish(events.WorkflowDecided(tuple(doc_ids), tuple(owners), decision))
+    
+    # Одно уведомление на владельца со списком документов
+    if bot and whitelist_store and finished:
+        by_owner: Dict[int, List[Tuple[str, str]]] = {}
+        for document_id, title, owner_tg_id in finished:
+            by_owner.setdefault(owner_tg_id, []).append((short_id(document_id), title))
+        
+        approver = whitelist_store.get(approver_tg_id)
+        approver_name = approver.full_name if approver else f"Пользователь {approver_tg_id}"
+        if decision == "approved":
+            header, actor = "✅ <b>Документы согласованы!</b>", "Согласовал"
+        else:
+            header, actor = "❌ <b>Документы отклонены</b>", "Отклонил"
+        
+        for owner_tg_id, docs in by_owner.items():
+            lines = "\n".join(f"📄 {title} (<code>{doc_id_str}</code>)" for doc_id_str, title in docs)
+            text_msg = f"{header}\n\n{lines}\n\n👤 <b>{actor}:</b> {approver_name}"
+            if comment and decision == "rejected":
+                text_msg += f"\n💬 <b>Причина:</b> {comment}"
+            try:
+                await bot.send_message(owner_tg_id, text_msg, parse_mode="HTML")
+            except Exception as e:
+                print(f"Ошибка отправки уведомления: {e}")
+    
+    return len(steps)
 
 
 def get_approval_history(document_id: str) -> List[Dict]:
@@ -323,9 +467,12 @@ def get_approval_history(document_id: str) -> List[Dict]:
         return rows
 
 
-def get_overdue_approvals() -> List[Dict]:
+def get_overdue_approvals(limit: Optional[int] = None) -> List[Dict]:
     """
-    Получает просроченные согласования
+    Получает просроченные согласования, самые давние первыми
+    
+    Args:
+        limit: Ограничение числа строк (None — все)
     
     Returns:
         Список просроченных документов
@@ -343,7 +490,8 @@ def get_overdue_approvals() -> List[Dict]:
             WHERE w.status = 'pending'
               AND w.deadline < now()
             ORDER BY w.deadline ASC
-        """))
+            LIMIT :limit
+        """), {"limit": limit})
         
         return [dict(row) for row in result.mappings()]
 
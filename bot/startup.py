@@ -0,0 +1,72 @@
+"""
+Замер фаз запуска бота
+
+Запуск разбит на явные фазы (импорт, whitelist, прогрев соединений,
+сервисы); длительность каждой попадает в итоговый отчёт в логе.
+Независимые фазы выполняются параллельно через run_parallel.
+"""
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Dict, Iterator, List, Tuple
+
+
+class StartupTimer:
+    """Собирает длительности фаз запуска"""
+
+    def __init__(self, started: float | None = None):
+        # started — time.perf_counter() в начале импорта, чтобы учесть и его
+        self.started = started if started is not None else time.perf_counter()
+        self.phases: List[Tuple[str, float]] = []
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Замеряет синхронную фазу"""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, (time.perf_counter() - t0) * 1000))
+
+    def mark(self, name: str, since: float) -> None:
+        """Записывает фазу, начавшуюся в момент since (time.perf_counter())"""
+        self.phases.append((name, (time.perf_counter() - since) * 1000))
+
+    async def run_parallel(self, name: str, jobs: Dict[str, Awaitable[Any]]) -> Dict[str, Any]:
+        """
+        Выполняет независимые фазы одновременно
+
+        Args:
+            name: Имя группы в отчёте
+            jobs: Имя фазы -> корутина (синхронную работу оборачивать в asyncio.to_thread)
+
+        Returns:
+            Имя фазы -> результат. Исключение любой фазы пробрасывается.
+        """
+        timings: Dict[str, float] = {}
+
+        async def timed(job_name: str, job: Awaitable[Any]) -> Any:
+            t0 = time.perf_counter()
+            try:
+                return await job
+            finally:
+                timings[job_name] = (time.perf_counter() - t0) * 1000
+
+        t0 = time.perf_counter()
+        results = await asyncio.gather(*(timed(job_name, job) for job_name, job in jobs.items()))
+        self.phases.append((name, (time.perf_counter() - t0) * 1000))
+        self.phases.extend((f"{name}.{job_name}", timings[job_name]) for job_name in jobs)
+        return dict(zip(jobs, results))
+
+    @property
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def report(self) -> str:
+        """Отчёт вида «Запуск за 412 ms: import 250 ms, ...»"""
+        parts = [f"{name} {ms:.0f} ms" for name, ms in self.phases]
+        return f"Запуск за {self.total_ms:.0f} ms: " + ", ".join(parts)
+
+    def log(self) -> None:
+        logging.info(self.report())
@@ -0,0 +1 @@
+# Developer tools: synthetic datasets, benchmarks, query plan checks
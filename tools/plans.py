@@ -0,0 +1,107 @@
+"""
+Общие помощники для работы с планами запросов: перехват SQL, который
+выполняют сервисы, и разбор вывода EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)
+"""
+import json
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Узлы плана, которые читают таблицу или индекс
+SCAN_NODES = {
+    "Seq Scan",
+    "Index Scan",
+    "Index Only Scan",
+    "Bitmap Heap Scan",
+    "Tid Scan",
+}
+
+
+@dataclass
+class CapturedQuery:
+    statement: str
+    parameters: Any
+    duration_ms: float = 0.0  # фактическое время выполнения при перехвате
+
+
+@dataclass
+class PlanSummary:
+    """Выжимка из плана одного запроса"""
+    execution_ms: float = 0.0
+    shared_buffers: int = 0
+    scans: List[Tuple[str, str]] = field(default_factory=list)  # (узел, таблица)
+    shape: List[str] = field(default_factory=list)
+    plan: Dict = field(default_factory=dict)
+
+    @property
+    def scan_count(self) -> int:
+        return len(self.scans)
+
+
+@contextmanager
+def capture_queries(engine: Engine) -> Iterator[List[CapturedQuery]]:
+    """Собирает все SQL-запросы, выполненные через engine внутри блока"""
+    captured: List[CapturedQuery] = []
+    started: Dict[int, float] = {}
+    
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        captured.append(CapturedQuery(statement, parameters))
+        started[id(cursor)] = time.perf_counter()
+    
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        began = started.pop(id(cursor), None)
+        if began is not None and captured:
+            captured[-1].duration_ms = (time.perf_counter() - began) * 1000
+    
+    event.listen(engine, "before_cursor_execute", _before)
+    event.listen(engine, "after_cursor_execute", _after)
+    try:
+        yield captured
+    finally:
+        event.remove(engine, "before_cursor_execute", _before)
+        event.remove(engine, "after_cursor_execute", _after)
+
+
+def _walk(node: Dict, depth: int, summary: PlanSummary) -> None:
+    node_type = node.get("Node Type", "?")
+    relation = node.get("Relation Name")
+    label = node_type if not relation else f"{node_type}:{relation}"
+    if node.get("Index Name"):
+        label += f"[{node['Index Name']}]"
+    summary.shape.append("  " * depth + label)
+    if node_type in SCAN_NODES and relation:
+        summary.scans.append((node_type, relation))
+    for child in node.get("Plans", []):
+        _walk(child, depth + 1, summary)
+
+
+def explain(engine: Engine, statement: str, parameters: Any = None, analyze: bool = True) -> PlanSummary:
+    """
+    Выполняет EXPLAIN для запроса в «сыром» виде драйвера (как его
+    перехватил capture_queries) и возвращает выжимку плана
+    """
+    options = "ANALYZE, BUFFERS, FORMAT JSON" if analyze else "FORMAT JSON"
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        cursor.execute(f"EXPLAIN ({options}) {statement}", parameters or None)
+        document = cursor.fetchone()[0]
+        raw.rollback()
+    finally:
+        raw.close()
+    
+    if isinstance(document, str):
+        document = json.loads(document)
+    root = document[0]
+    summary = PlanSummary(
+        execution_ms=float(root.get("Execution Time", 0.0)),
+        plan=root["Plan"],
+    )
+    # Счётчики буферов в корне плана уже включают все дочерние узлы
+    summary.shared_buffers = root["Plan"].get("Shared Hit Blocks", 0) + root["Plan"].get("Shared Read Blocks", 0)
+    _walk(root["Plan"], 0, summary)
+    return summary